@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import abc
+from typing import TYPE_CHECKING, NamedTuple
+
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    DEFAULT_RATE_LIMITS,
+    LookupStore,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    RateLimitStore,
+    WindowCounts,
+    within_limits,
+)
+
+if TYPE_CHECKING:
+    from .api_rate_limiter import ApiData
+    from .limit_config import LimitConfig
+
+MICROSECONDS_PER_SECOND = 1_000_000
+
+# How often GcraAlgorithm drops keys whose TAT has passed. Such a key behaves
+# exactly like one never seen, so dropping it only frees memory.
+GCRA_EVICTION_INTERVAL_IN_SECONDS = 60
+
+# The fixed window lets a key go up to the burst limit for a couple of seconds
+# a minute. GCRA expresses that as one pool of extra requests on top of the
+# average rate, so the default pool is the extra traffic those bursts allow.
+DEFAULT_GCRA_BURST = (
+    DEFAULT_BURST_LIMIT_PER_SECOND - DEFAULT_LIMIT_PER_SECOND
+) * DEFAULT_NUMBER_OF_BURST_PER_MINUTE
+
+
+class RateLimitDecision(NamedTuple):
+    """
+    Outcome of RateLimiter.acquire, with enough detail for the front server to
+    reply 429/503 and set rate limit headers without another lookup.
+
+    Attributes:
+        allowed (bool): Whether the request may go through.
+        remaining_per_second (int): Requests still allowed this second.
+        remaining_bursts (int): Bursting seconds still allowed in the window.
+        retry_after_seconds (int): Seconds to wait before retrying, 0 if allowed.
+    """
+
+    allowed: bool
+    remaining_per_second: int
+    remaining_bursts: int
+    retry_after_seconds: int
+
+
+def is_under_per_second_limit(data: RateLimiterData, epoch_time: int) -> bool:
+    current_count = data.api_counts_by_epoch_time.count(epoch_time)
+    return current_count <= data.limit_per_second
+
+
+def is_under_burstable_limit(data: RateLimiterData, epoch_time: int) -> bool:
+    # The store keeps a running list of bursting seconds, so this is O(1)
+    # rather than a scan over every second we have counts for.
+    bursts_count = data.bursts_in_window(epoch_time)
+    return bursts_count <= data.number_of_bursts
+
+
+def fixed_window_decision(
+    counts: WindowCounts, limits: RateLimits = DEFAULT_RATE_LIMITS
+) -> RateLimitDecision:
+    """Build the decision from the counts seen just before the request."""
+    allowed = within_limits(counts, limits)
+    count = counts.count + 1
+    bursts = counts.bursts + (counts.count < limits.burst_limit_per_second <= count)
+    return RateLimitDecision(
+        allowed=allowed,
+        remaining_per_second=max(0, limits.limit_per_second - counts.count),
+        remaining_bursts=max(0, limits.number_of_bursts - bursts),
+        # A rejection means this second is over the limit and the burst budget
+        # is spent, and the per second count starts again on the next second.
+        retry_after_seconds=0 if allowed else 1,
+    )
+
+
+class RateLimitAlgorithm(abc.ABC):
+    @abc.abstractmethod
+    def is_request_allowed(self, api_data: ApiData) -> bool:
+        """Check whether the request fits the limit, without counting it"""
+
+    @abc.abstractmethod
+    def increase_incoming_request_count(self, api_data: ApiData) -> None:
+        """Record the request against its key"""
+
+    @abc.abstractmethod
+    def acquire(self, api_data: ApiData) -> RateLimitDecision:
+        """Check and record the request in one pass over its key"""
+
+    @abc.abstractmethod
+    def is_under_per_second_limit(self, api_data: ApiData) -> bool:
+        """Check the request against the steady per second rate alone"""
+
+    @abc.abstractmethod
+    def is_under_burstable_limit(self, api_data: ApiData) -> bool:
+        """Check the request against the burst allowance alone"""
+
+
+class FixedWindowAlgorithm(RateLimitAlgorithm):
+    """
+    Per second fixed window counter with a number of bursts allowed per minute.
+
+    Keys are on the shared defaults unless a LimitConfig is given. With one,
+    each request looks up its key's override in the in-memory config and
+    hands those limits to the store with every read and increment, so bursts
+    are counted against the key's own burst limit and plan changes apply from
+    the next request.
+    """
+
+    def __init__(
+        self,
+        lookup_store: RateLimitStore | None = None,
+        limit_config: LimitConfig | None = None,
+    ):
+        self.lookup_store = LookupStore() if lookup_store is None else lookup_store
+        self.limit_config = limit_config
+
+    def _limits(self, api_data: ApiData) -> RateLimits | None:
+        if self.limit_config is None:
+            return None
+        return self.limit_config.limits_for(api_data.api_key, api_data.api_route)
+
+    def _data(self, api_data: ApiData) -> RateLimiterData:
+        return self.lookup_store.get(
+            api_data.api_key, api_data.api_route, self._limits(api_data)
+        )
+
+    def is_request_allowed(self, api_data: ApiData) -> bool:
+        data = self._data(api_data)
+        return is_under_per_second_limit(
+            data, api_data.epoch_time
+        ) or is_under_burstable_limit(data, api_data.epoch_time)
+
+    def is_under_per_second_limit(self, api_data: ApiData) -> bool:
+        return is_under_per_second_limit(self._data(api_data), api_data.epoch_time)
+
+    def is_under_burstable_limit(self, api_data: ApiData) -> bool:
+        return is_under_burstable_limit(self._data(api_data), api_data.epoch_time)
+
+    def increase_incoming_request_count(self, api_data: ApiData) -> None:
+        self.lookup_store.increment_limit_count_by_one(
+            api_data.api_key,
+            api_data.api_route,
+            api_data.epoch_time,
+            self._limits(api_data),
+        )
+
+    def acquire(self, api_data: ApiData) -> RateLimitDecision:
+        if self.limit_config is None:
+            counts = self.lookup_store.fetch_and_increment(
+                api_data.api_key, api_data.api_route, api_data.epoch_time
+            )
+            return fixed_window_decision(counts)
+
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        limits = self.limit_config.limits_for(*key)
+        (counts,) = self.lookup_store.fetch_and_increment_many(
+            [key], api_data.epoch_time, [limits]
+        )
+        return fixed_window_decision(counts, limits)
+
+
+class GcraAlgorithm(RateLimitAlgorithm):
+    """
+    Generic cell rate algorithm, the virtual scheduling form of a token bucket.
+
+    Each key stores a single int, its theoretical arrival time (TAT) in
+    microseconds. A request conforms if it does not arrive earlier than
+    `TAT - burst * emission_interval`. Conforming requests push the TAT one
+    emission interval further; non conforming ones leave it untouched, so a
+    client that keeps retrying is not locked out for longer.
+
+    Keys whose TAT has passed are dropped every
+    GCRA_EVICTION_INTERVAL_IN_SECONDS, so memory follows the keys seen
+    recently rather than every key ever seen.
+    """
+
+    def __init__(
+        self,
+        limit_per_second: int = DEFAULT_LIMIT_PER_SECOND,
+        burst: int = DEFAULT_GCRA_BURST,
+    ):
+        if limit_per_second < 1:
+            raise ValueError("limit_per_second must be at least 1")
+        self.emission_interval = MICROSECONDS_PER_SECOND // limit_per_second
+        self.tolerance = burst * self.emission_interval
+        self.theoretical_arrival_times: dict[RateLimiterKey, int] = {}
+        self._next_eviction = 0
+
+    def _evict_expired(self, now: int) -> None:
+        if now < self._next_eviction:
+            return
+        self._next_eviction = now + (
+            GCRA_EVICTION_INTERVAL_IN_SECONDS * MICROSECONDS_PER_SECOND
+        )
+        # Rebuilt rather than deleted from, a dict never shrinks on delete.
+        self.theoretical_arrival_times = {
+            key: tat for key, tat in self.theoretical_arrival_times.items() if tat > now
+        }
+
+    def _conforms(self, key: RateLimiterKey, now: int, tolerance: int) -> bool:
+        tat = self.theoretical_arrival_times.get(key, now)
+        return tat - now <= tolerance
+
+    def is_request_allowed(self, api_data: ApiData) -> bool:
+        return self.is_under_burstable_limit(api_data)
+
+    def is_under_per_second_limit(self, api_data: ApiData) -> bool:
+        """
+        Whether the request fits the average rate without any of the burst
+        pool, i.e. it would conform with a burst of 0.
+        """
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        return self._conforms(key, api_data.epoch_time * MICROSECONDS_PER_SECOND, 0)
+
+    def is_under_burstable_limit(self, api_data: ApiData) -> bool:
+        """
+        Whether the burst pool covers the request. The pool is on top of the
+        average rate, so this is the whole decision, as is_request_allowed.
+        """
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        now = api_data.epoch_time * MICROSECONDS_PER_SECOND
+        return self._conforms(key, now, self.tolerance)
+
+    def increase_incoming_request_count(self, api_data: ApiData) -> None:
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        now = api_data.epoch_time * MICROSECONDS_PER_SECOND
+        self._evict_expired(now)
+        if self._conforms(key, now, self.tolerance):
+            tat = self.theoretical_arrival_times.get(key, now)
+            self.theoretical_arrival_times[key] = max(tat, now) + self.emission_interval
+
+    def acquire(self, api_data: ApiData) -> RateLimitDecision:
+        """
+        GCRA has a single pool rather than separate bursts, so
+        `remaining_per_second` is how many more requests would conform right
+        now and `remaining_bursts` is always 0.
+        """
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        now = api_data.epoch_time * MICROSECONDS_PER_SECOND
+        self._evict_expired(now)
+        tat = max(self.theoretical_arrival_times.get(key, now), now)
+        allowed = tat - now <= self.tolerance
+        if allowed:
+            tat += self.emission_interval
+            self.theoretical_arrival_times[key] = tat
+
+        headroom = self.tolerance - (tat - now)
+        remaining = headroom // self.emission_interval + 1 if headroom >= 0 else 0
+        # Time until the TAT falls back within the tolerance, rounded up.
+        wait = tat - self.tolerance - now
+        retry_after = 0 if allowed else -(-wait // MICROSECONDS_PER_SECOND)
+        return RateLimitDecision(allowed, remaining, 0, retry_after)
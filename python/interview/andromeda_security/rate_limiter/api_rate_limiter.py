@@ -1,11 +1,9 @@
 from typing import NamedTuple
-from .lookup_store import (
-    DEFAULT_BURST_LIMIT_PER_SECOND,
-    DEFAULT_LIMIT_PER_SECOND,
-    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
-    LookupStore,
-    RateLimiterData,
-)
+from .algorithms import FixedWindowAlgorithm, RateLimitAlgorithm, RateLimitDecision
+from .audit_log import AuditContext, AuditLog
+from .limit_config import LimitConfig
+from .lookup_store import LookupStore, RateLimitStore
+from .route_normalizer import RouteNormalizer
 
 
 class ApiData(NamedTuple):
@@ -30,25 +28,81 @@ class RateLimiter:
     Features:
     - Per-second rate limiting
     - Burst limit tracking (allows bursts up to a threshold per minute)
+    - Pluggable algorithm, the fixed window counter above is the default and
+      GcraAlgorithm is a constant memory alternative
+    - Optional route normalizer, for callers that pass raw request paths
+    - Optional per key limits from a LimitConfig, used by the default algorithm;
+      an algorithm passed in brings its own limits and store
+    - Optional AuditLog, every decision is queued to it without blocking
     """
 
-    def __init__(self):
-        self.lookup_store = LookupStore()
+    def __init__(
+        self,
+        lookup_store: RateLimitStore | None = None,
+        algorithm: RateLimitAlgorithm | None = None,
+        route_normalizer: RouteNormalizer | None = None,
+        limit_config: LimitConfig | None = None,
+        audit_log: AuditLog | None = None,
+    ):
+        if algorithm is not None and limit_config is not None:
+            raise ValueError(
+                "limit_config only applies to the default algorithm, "
+                "pass it to the algorithm instead"
+            )
+        if algorithm is not None and lookup_store is not None:
+            raise ValueError(
+                "lookup_store only applies to the default algorithm, "
+                "pass it to the algorithm instead"
+            )
+        self.lookup_store = LookupStore() if lookup_store is None else lookup_store
+        if algorithm is None:
+            algorithm = FixedWindowAlgorithm(self.lookup_store, limit_config)
+        self.algorithm = algorithm
+        self.route_normalizer = route_normalizer
+        self.audit_log = audit_log
+
+    def _normalized(self, api_data: ApiData) -> ApiData:
+        if self.route_normalizer is None:
+            return api_data
+        return self.route_normalizer.normalize_api_data(api_data)
 
     def increase_incoming_request_count(self, api_data: ApiData) -> None:
-        self.lookup_store.increment_limit_count_by_one(
-            api_data.api_key, api_data.api_route, api_data.epoch_time
-        )
+        self.algorithm.increase_incoming_request_count(self._normalized(api_data))
+
+    def _audit(
+        self, api_data: ApiData, allowed: bool, audit_context: AuditContext | None
+    ) -> None:
+        if self.audit_log is not None:
+            self.audit_log.record_decision(*api_data, allowed, audit_context)
+
+    def is_request_allowed(
+        self, api_data: ApiData, audit_context: AuditContext | None = None
+    ) -> bool:
+        """`audit_context` is only used for the AuditLog record."""
+        api_data = self._normalized(api_data)
+        allowed = self.algorithm.is_request_allowed(api_data)
+        self._audit(api_data, allowed, audit_context)
+        return allowed
+
+    def acquire(
+        self, api_data: ApiData, audit_context: AuditContext | None = None
+    ) -> RateLimitDecision:
+        """
+        Check and count the request in a single lookup.
 
-    def is_request_allowed(self, api_data: ApiData) -> bool:
-        return self.is_request_under_per_second_limit(
-            api_data
-        ) or self.is_request_under_burstable_limit(api_data)
+        Same outcome as calling is_request_allowed and then
+        increase_incoming_request_count, but the key is resolved once and the
+        decision comes back with quota details for response headers.
+        `audit_context` is only used for the AuditLog record.
+        """
+        api_data = self._normalized(api_data)
+        decision = self.algorithm.acquire(api_data)
+        self._audit(api_data, decision.allowed, audit_context)
+        return decision
 
     def is_request_under_per_second_limit(self, api_data: ApiData) -> bool:
-        data = self.lookup_store.get(api_data.api_key, api_data.api_route)
-        current_count = data.api_counts_by_epoch_time.get(api_data.epoch_time, 0)
-        return current_count <= DEFAULT_LIMIT_PER_SECOND
+        api_data = self._normalized(api_data)
+        return self.algorithm.is_under_per_second_limit(api_data)
 
     def is_request_under_burstable_limit(self, api_data: ApiData) -> bool:
         """
@@ -59,19 +113,9 @@ class RateLimiter:
 
         Args:
             api_data: The API request metadata
-            lookup_data: The rate limiter data for this key/route
 
         Returns:
             True if under the burst limit, False otherwise
         """
-        data = self.lookup_store.get(api_data.api_key, api_data.api_route)
-        minute_ago = api_data.epoch_time - 60
-
-        bursts_count = sum(
-            1
-            for epoch_time, count in data.api_counts_by_epoch_time.items()
-            if minute_ago <= epoch_time <= api_data.epoch_time
-            and count >= DEFAULT_BURST_LIMIT_PER_SECOND
-        )
-
-        return bursts_count <= DEFAULT_NUMBER_OF_BURST_PER_MINUTE
+        api_data = self._normalized(api_data)
+        return self.algorithm.is_under_burstable_limit(api_data)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections.abc import Awaitable, Callable, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import CookieError, SimpleCookie
+from typing import Any
+
+from .algorithms import RateLimitDecision
+from .api_rate_limiter import ApiData, RateLimiter
+from .audit_log import AuditContext
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+DEFAULT_API_KEY_HEADER = "x-api-key"
+DEFAULT_USER_HEADER = "x-user-id"
+DEFAULT_SESSION_COOKIE = "session"
+# The design doc's front server answers 503, 429 is the HTTP status meant for it.
+DEFAULT_REJECTION_STATUS = 429
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware playing the regional front server from the design doc.
+
+    Every HTTP request is turned into ApiData: the API key comes from the
+    `api_key_header` header, or the client address when it is missing, and the
+    route is the request path (give the RateLimiter a RouteNormalizer to map
+    raw paths to templates). One RateLimiter.acquire decides the request.
+    Rejected requests get `rejection_status` with Retry-After and never reach
+    the app; allowed ones are forwarded with X-RateLimit-Remaining added to
+    the response.
+
+    When the RateLimiter has an AuditLog, each record also gets the user from
+    `user_header`, the session from the `session_cookie` cookie and the origin
+    from the Origin header, or the client address when it is missing.
+
+    Set `offload_store_calls` for stores that block on I/O, e.g.
+    RedisLookupStore, so the decision runs on a worker thread instead of
+    holding up the event loop. The middleware has a single worker, so
+    decisions still run one at a time: store clients such as RedisConnection
+    are not thread safe. Call close() to stop the worker. Other scope types
+    (websocket, lifespan) pass straight through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limiter: RateLimiter | None = None,
+        api_key_header: str = DEFAULT_API_KEY_HEADER,
+        user_header: str = DEFAULT_USER_HEADER,
+        session_cookie: str = DEFAULT_SESSION_COOKIE,
+        rejection_status: int = DEFAULT_REJECTION_STATUS,
+        offload_store_calls: bool = False,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.app = app
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.api_key_header = api_key_header.lower().encode("latin-1")
+        self.user_header = user_header.lower().encode("latin-1")
+        self.session_cookie = session_cookie
+        self.rejection_status = rejection_status
+        self.offload_store_calls = offload_store_calls
+        self.clock = clock
+        self._store_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limiter-store")
+            if offload_store_calls
+            else None
+        )
+
+    def api_data(self, scope: Scope) -> ApiData:
+        api_key = None
+        for name, value in scope.get("headers", ()):
+            if name == self.api_key_header:
+                api_key = value.decode("latin-1")
+                break
+        if not api_key:
+            client = scope.get("client")
+            api_key = f"client:{client[0] if client else 'unknown'}"
+        return ApiData(api_key, scope["path"], int(self.clock()))
+
+    def audit_context(self, scope: Scope) -> AuditContext:
+        headers = {
+            name: value.decode("latin-1") for name, value in scope.get("headers", ())
+        }
+        session = None
+        if b"cookie" in headers:
+            try:
+                cookie = SimpleCookie(headers[b"cookie"])
+            except CookieError:
+                cookie = SimpleCookie()
+            if self.session_cookie in cookie:
+                session = cookie[self.session_cookie].value
+        origin = headers.get(b"origin")
+        if not origin:
+            client = scope.get("client")
+            origin = client[0] if client else None
+        return AuditContext(headers.get(self.user_header), session, origin)
+
+    async def decide(
+        self, api_data: ApiData, audit_context: AuditContext | None = None
+    ) -> RateLimitDecision:
+        if self._store_executor is None:
+            return self.rate_limiter.acquire(api_data, audit_context)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._store_executor, self.rate_limiter.acquire, api_data, audit_context
+        )
+
+    def close(self) -> None:
+        if self._store_executor is not None:
+            self._store_executor.shutdown()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        audit_context = None
+        if self.rate_limiter.audit_log is not None:
+            audit_context = self.audit_context(scope)
+        decision = await self.decide(self.api_data(scope), audit_context)
+        if not decision.allowed:
+            await self.reject(decision, send)
+            return
+
+        remaining = str(decision.remaining_per_second).encode("latin-1")
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"x-ratelimit-remaining", remaining),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    async def reject(self, decision: RateLimitDecision, send: Send) -> None:
+        body = json.dumps(
+            {
+                "error": "rate limit exceeded",
+                "retry_after_seconds": decision.retry_after_seconds,
+            }
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.rejection_status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", str(decision.retry_after_seconds).encode()),
+                    (b"x-ratelimit-remaining", b"0"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
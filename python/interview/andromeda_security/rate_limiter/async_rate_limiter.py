@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .algorithms import is_under_burstable_limit, is_under_per_second_limit
+from .api_rate_limiter import ApiData
+from .lookup_store import LookupStore, RateLimiterKey, RateLimitStore
+
+# (key, epoch_time) -> number of increments waiting to be written
+PendingIncrements = dict[tuple[RateLimiterKey, int], int]
+
+
+class AsyncRateLimiter:
+    """
+    asyncio front end for RateLimiter.
+
+    Increments made in the same loop tick are collected and written once per
+    (key, second) on the next tick, so a hot key costs one store update per
+    tick instead of one per request. Checks for a key wait for that key's
+    pending write so they never read a stale count.
+
+    Set `offload_store_calls` for stores that block on I/O (for example
+    RedisLookupStore); store calls then run on a worker thread and the event
+    loop keeps serving other requests in the meantime. The limiter has a
+    single worker, so store calls still run one at a time: store clients such
+    as RedisConnection are not thread safe. Call close() to stop the worker.
+    """
+
+    def __init__(
+        self,
+        lookup_store: RateLimitStore | None = None,
+        offload_store_calls: bool = False,
+    ):
+        self.lookup_store = LookupStore() if lookup_store is None else lookup_store
+        self.offload_store_calls = offload_store_calls
+        self._store_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limiter-store")
+            if offload_store_calls
+            else None
+        )
+        self.store_writes = 0
+        self._pending: PendingIncrements = {}
+        self._next_flush: asyncio.Future[None] | None = None
+        # Latest flush covering each key, so checks only wait on their own key.
+        self._flush_by_key: dict[RateLimiterKey, asyncio.Future[None]] = {}
+        self._flush_tasks: set[asyncio.Task[None]] = set()
+
+    async def increase_incoming_request_count(self, api_data: ApiData) -> None:
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        pending_key = (key, api_data.epoch_time)
+        self._pending[pending_key] = self._pending.get(pending_key, 0) + 1
+
+        if self._next_flush is None:
+            loop = asyncio.get_running_loop()
+            self._next_flush = loop.create_future()
+            loop.call_soon(self._start_flush)
+        self._flush_by_key[key] = self._next_flush
+        await asyncio.shield(self._next_flush)
+
+    async def is_request_allowed(self, api_data: ApiData) -> bool:
+        key = RateLimiterKey(api_data.api_key, api_data.api_route)
+        flush = self._flush_by_key.get(key)
+        if flush is not None:
+            await asyncio.shield(flush)
+
+        data = await self._call_store(
+            self.lookup_store.get, api_data.api_key, api_data.api_route
+        )
+        return is_under_per_second_limit(
+            data, api_data.epoch_time
+        ) or is_under_burstable_limit(data, api_data.epoch_time)
+
+    def _start_flush(self) -> None:
+        pending, self._pending = self._pending, {}
+        flush, self._next_flush = self._next_flush, None
+        task = asyncio.ensure_future(self._write(pending, flush))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _write(
+        self, pending: PendingIncrements, flush: asyncio.Future[None]
+    ) -> None:
+        try:
+            await self._call_store(self._apply, pending)
+        except Exception as error:
+            flush.set_exception(error)
+        else:
+            flush.set_result(None)
+        finally:
+            for key, _ in pending:
+                if self._flush_by_key.get(key) is flush:
+                    del self._flush_by_key[key]
+
+    def _apply(self, pending: PendingIncrements) -> None:
+        for (key, epoch_time), amount in pending.items():
+            self.lookup_store.increment_limit_count(
+                key.api_key, key.api_route, epoch_time, amount
+            )
+            self.store_writes += 1
+
+    async def _call_store(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._store_executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._store_executor, func, *args
+        )
+
+    def close(self) -> None:
+        if self._store_executor is not None:
+            self._store_executor.shutdown()
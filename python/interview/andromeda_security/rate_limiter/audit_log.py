@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import NamedTuple, Protocol
+
+DEFAULT_MAX_QUEUE_SIZE = 10_000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.5
+
+# Tells the worker to write what it has and exit.
+_STOP = object()
+
+
+class AuditRecord(NamedTuple):
+    """One rate limit decision, as kept for compliance."""
+
+    api_key: str
+    api_route: str
+    epoch_time: int
+    allowed: bool
+    recorded_at: float
+    user: str | None = None
+    session: str | None = None
+    origin: str | None = None
+
+
+class AuditContext(NamedTuple):
+    """Who made the request, for the audit trail. Any part may be unknown."""
+
+    user: str | None = None
+    session: str | None = None
+    origin: str | None = None
+
+
+class AuditSink(Protocol):
+    def write_batch(self, records: Sequence[AuditRecord]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class SqliteAuditSink:
+    """Writes each batch with one executemany in one transaction."""
+
+    def __init__(self, path: str | Path):
+        # Only the audit worker thread writes, but it is not the creating one.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_audit ("
+            " api_key TEXT NOT NULL, api_route TEXT NOT NULL,"
+            " epoch_time INTEGER NOT NULL, allowed INTEGER NOT NULL,"
+            " recorded_at REAL NOT NULL, user TEXT, session TEXT, origin TEXT)"
+        )
+        self.connection.commit()
+
+    def write_batch(self, records: Sequence[AuditRecord]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO rate_limit_audit VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class JsonLinesAuditSink:
+    """Appends one JSON object per record, one write call per batch."""
+
+    def __init__(self, path: str | Path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, records: Sequence[AuditRecord]) -> None:
+        self.file.write(
+            "".join(json.dumps(record._asdict()) + "\n" for record in records)
+        )
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class AuditLog:
+    """
+    Non blocking audit trail of rate limit decisions.
+
+    `record` only puts the record on a bounded in-memory queue, so the request
+    path never waits on the datastore. A background worker drains the queue
+    and writes up to `batch_size` records per sink call, at least every
+    `flush_interval_seconds` while records are waiting.
+
+    When the sink falls behind the queue fills up, and from then on new
+    records are dropped and counted in `dropped` rather than slowing requests
+    down. `pending` shows how close the queue is to that point. Batches the
+    sink fails to write are counted in `write_errors` and `failed_records`.
+    """
+
+    def __init__(
+        self,
+        sink: AuditSink,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    ):
+        if max_queue_size < 1 or batch_size < 1:
+            raise ValueError("max_queue_size and batch_size must be at least 1")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.queue: queue.Queue[AuditRecord | object] = queue.Queue(max_queue_size)
+        self.written = 0
+        self.dropped = 0
+        # record is called from every request thread, and += is not atomic.
+        self._dropped_lock = threading.Lock()
+        self.write_errors = 0
+        self.failed_records = 0
+        self._worker: threading.Thread | None = None
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def record(self, record: AuditRecord) -> bool:
+        """Queue the record without blocking. Returns False if it was dropped."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def record_decision(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        allowed: bool,
+        context: AuditContext | None = None,
+    ) -> bool:
+        return self.record(
+            AuditRecord(
+                api_key, api_route, epoch_time, allowed, time.time(), *(context or ())
+            )
+        )
+
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """Write everything queued so far, then stop the worker and the sink."""
+        if self._worker is None:
+            return
+        # The worker is the only consumer, so this waits for room rather than
+        # dropping the stop marker.
+        self.queue.put(_STOP)
+        self._worker.join()
+        self._worker = None
+        self.sink.close()
+
+    def __enter__(self) -> AuditLog:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def _drain(self) -> None:
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval_seconds
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.sink.write_batch(batch)
+        except Exception:
+            # Auditing must not take the worker down; count it and move on.
+            self.write_errors += 1
+            self.failed_records += len(batch)
+        else:
+            self.written += len(batch)
@@ -0,0 +1,65 @@
+"""
+Compare rate limiting algorithms on memory per key and decisions per second.
+
+Run from the andromeda_security directory:
+    python -m rate_limiter.bench_algorithms
+"""
+
+import random
+import time
+import tracemalloc
+from typing import Callable
+
+from .algorithms import FixedWindowAlgorithm, GcraAlgorithm, RateLimitAlgorithm
+from .api_rate_limiter import ApiData, RateLimiter
+
+ALGORITHMS: dict[str, Callable[[], RateLimitAlgorithm]] = {
+    "fixed_window": FixedWindowAlgorithm,
+    "gcra": GcraAlgorithm,
+}
+
+
+def decide(rate_limiter: RateLimiter, api_data: ApiData) -> bool:
+    allowed = rate_limiter.is_request_allowed(api_data)
+    rate_limiter.increase_incoming_request_count(api_data)
+    return allowed
+
+
+def memory_per_key(
+    make_algorithm: Callable[[], RateLimitAlgorithm], keys: int
+) -> float:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    rate_limiter = RateLimiter(algorithm=make_algorithm())
+    for i in range(keys):
+        decide(rate_limiter, ApiData(f"key_{i}", "/users/:id", 1000))
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / keys
+
+
+def decisions_per_second(
+    make_algorithm: Callable[[], RateLimitAlgorithm], requests: int, keys: int
+) -> float:
+    randomizer = random.Random(42)
+    traffic = [
+        ApiData(f"key_{randomizer.randrange(keys)}", "/users/:id", 1000 + i // 1000)
+        for i in range(requests)
+    ]
+    rate_limiter = RateLimiter(algorithm=make_algorithm())
+    start = time.perf_counter()
+    for api_data in traffic:
+        decide(rate_limiter, api_data)
+    return requests / (time.perf_counter() - start)
+
+
+def main(keys: int = 10_000, requests: int = 200_000) -> None:
+    print(f"{'algorithm':<14}{'bytes/key':>12}{'decisions/s':>16}")
+    for name, make_algorithm in ALGORITHMS.items():
+        memory = memory_per_key(make_algorithm, keys)
+        throughput = decisions_per_second(make_algorithm, requests, keys=1_000)
+        print(f"{name:<14}{memory:>12.0f}{throughput:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
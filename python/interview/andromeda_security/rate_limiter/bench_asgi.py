@@ -0,0 +1,207 @@
+"""
+Load generator for RateLimitMiddleware: latency it adds to each request.
+
+Drives the same traffic through a bare ASGI app and through the app wrapped
+in RateLimitMiddleware, calling the ASGI interface directly from a number of
+concurrent clients, and reports P50/P99/P999 per request for both and the
+difference. No server or network is involved, so the difference is the
+middleware's own cost: building ApiData, the route lookup, the limiter
+decision and the response headers.
+
+Run from the andromeda_security directory:
+    python -m rate_limiter.bench_asgi [--requests N] [--clients N] [--json]
+
+`app` below is the wrapped demo app, for trying the middleware behind a real
+ASGI server, e.g. `uvicorn rate_limiter.bench_asgi:app`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, NamedTuple
+
+from .api_rate_limiter import RateLimiter
+from .asgi_middleware import ASGIApp, Message, RateLimitMiddleware
+from .bench_rate_limiter import percentile, zipf_cumulative_weights
+from .route_normalizer import RouteNormalizer
+
+TEMPLATES = ("/users/:id", "/users/:id/orders", "/search", "/export")
+
+
+async def hello_app(scope: Any, receive: Any, send: Any) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+class SimulatedClock:
+    """Moves one second forward every `requests_per_second` readings."""
+
+    def __init__(self, requests_per_second: int, start: int = 1000):
+        self.requests_per_second = requests_per_second
+        self.start = start
+        self.readings = 0
+
+    def __call__(self) -> float:
+        self.readings += 1
+        return self.start + self.readings // self.requests_per_second
+
+
+def rate_limited(
+    app: ASGIApp, clock: Callable[[], float] = time.time
+) -> RateLimitMiddleware:
+    return RateLimitMiddleware(
+        app, RateLimiter(route_normalizer=RouteNormalizer(TEMPLATES)), clock=clock
+    )
+
+
+app = rate_limited(hello_app)
+
+
+class LatencyStats(NamedTuple):
+    p50_us: float
+    p99_us: float
+    p999_us: float
+    requests_per_second: float
+
+
+def generate_requests(
+    requests: int, keys: int, seed: int = 42
+) -> list[tuple[str, bytes]]:
+    """(path, api key) pairs with Zipfian keys over raw, un-normalized paths."""
+    randomizer = random.Random(seed)
+    api_keys = randomizer.choices(
+        [f"key_{i}".encode() for i in range(keys)],
+        cum_weights=zipf_cumulative_weights(keys, 1.1),
+        k=requests,
+    )
+    paths = [
+        randomizer.choice(
+            (
+                f"/users/{randomizer.randrange(10_000)}",
+                f"/users/{randomizer.randrange(10_000)}/orders",
+                "/search",
+                "/export",
+            )
+        )
+        for _ in range(requests)
+    ]
+    return list(zip(paths, api_keys))
+
+
+async def call(app: ASGIApp, path: str, api_key: bytes) -> int:
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(b"x-api-key", api_key)],
+        "client": ("127.0.0.1", 50000),
+    }
+    status = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def load(
+    app: ASGIApp, requests: list[tuple[str, bytes]], clients: int
+) -> tuple[LatencyStats, dict[int, int]]:
+    latencies: list[int] = []
+    statuses: dict[int, int] = {}
+    queue = iter(requests)
+    clock = time.perf_counter_ns
+
+    async def client() -> None:
+        for path, api_key in queue:
+            before = clock()
+            status = await call(app, path, api_key)
+            latencies.append(clock() - before)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = clock()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed_ns = clock() - start
+    latencies.sort()
+    stats = LatencyStats(
+        p50_us=percentile(latencies, 0.50) / 1000,
+        p99_us=percentile(latencies, 0.99) / 1000,
+        p999_us=percentile(latencies, 0.999) / 1000,
+        requests_per_second=len(requests) / (elapsed_ns / 1e9),
+    )
+    return stats, statuses
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=1_000)
+    parser.add_argument(
+        "--requests-per-second",
+        type=int,
+        default=5_000,
+        help="simulated request rate, so the run spans many limiter seconds",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args(argv)
+
+    requests = generate_requests(args.requests, args.keys)
+    bare, _ = asyncio.run(load(hello_app, requests, args.clients))
+    limited, statuses = asyncio.run(
+        load(
+            rate_limited(hello_app, SimulatedClock(args.requests_per_second)),
+            requests,
+            args.clients,
+        )
+    )
+    added = {
+        "p50_us": limited.p50_us - bare.p50_us,
+        "p99_us": limited.p99_us - bare.p99_us,
+        "p999_us": limited.p999_us - bare.p999_us,
+    }
+
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "bare": bare._asdict(),
+                    "rate_limited": limited._asdict(),
+                    "added": added,
+                    "statuses": statuses,
+                },
+                indent=2,
+            )
+        )
+        return
+    print(f"{'':<14}{'p50 us':>10}{'p99 us':>10}{'p999 us':>10}{'requests/s':>14}")
+    for name, stats in (("bare", bare), ("rate_limited", limited)):
+        print(
+            f"{name:<14}{stats.p50_us:>10.1f}{stats.p99_us:>10.1f}"
+            f"{stats.p999_us:>10.1f}{stats.requests_per_second:>14,.0f}"
+        )
+    print(
+        f"{'added':<14}{added['p50_us']:>10.1f}{added['p99_us']:>10.1f}"
+        f"{added['p999_us']:>10.1f}"
+    )
+    print("statuses:", dict(sorted(statuses.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Report bytes per key for each LookupStore layout.
+
+Run from the andromeda_security directory:
+    python -m rate_limiter.bench_memory [number_of_keys]
+
+The default is 1M keys. The dict based LookupStore needs a little over 1 KB
+per key, so pass a smaller number on machines with less than a few GB free.
+"""
+
+import gc
+import sys
+import tracemalloc
+from typing import Any, Callable
+
+from .compact_lookup_store import CompactLookupStore
+from .count_min_sketch import SketchFilteredLookupStore
+from .lookup_store import LookupStore
+from .sharded_lookup_store import ShardedLookupStore
+
+STORES: dict[str, Callable[[], Any]] = {
+    "lookup_store": LookupStore,
+    "sharded_lookup_store": ShardedLookupStore,
+    "compact_lookup_store": CompactLookupStore,
+    # One request per key, so this shows the cost of a flood of junk keys.
+    "sketch_filtered_store": SketchFilteredLookupStore,
+}
+
+
+def bytes_per_key(make_store: Callable[[], Any], keys: int) -> float:
+    # Key strings come off the wire as fresh objects for every request, so
+    # build them inside the measured region too.
+    gc.collect()
+    tracemalloc.start()
+    store = make_store()
+    for i in range(keys):
+        store.increment_limit_count_by_one(f"key_{i}", "/users/:id", 1000)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return used / keys
+
+
+def main(keys: int = 1_000_000) -> None:
+    print(f"{'store':<24}{'keys':>12}{'bytes/key':>12}")
+    for name, make_store in STORES.items():
+        print(f"{name:<24}{keys:>12,}{bytes_per_key(make_store, keys):>12.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
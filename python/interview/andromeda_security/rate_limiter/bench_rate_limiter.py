@@ -0,0 +1,253 @@
+"""
+Latency and throughput of RateLimiter.acquire on each LookupStore variant.
+
+Replays synthetic traffic: Zipfian API keys (a few hot keys, a long tail),
+routes that burst every few seconds and time moving forward at a fixed
+request rate. For each store it reports decisions per second, P50/P99/P999
+latency per decision and memory growth per key.
+
+Run from the andromeda_security directory:
+    python -m rate_limiter.bench_rate_limiter
+    python -m rate_limiter.bench_rate_limiter --json > baseline.json
+    python -m rate_limiter.bench_rate_limiter --baseline baseline.json
+
+With --baseline the run exits non zero if any store's P99 or throughput got
+worse than the baseline by more than --max-regression (20% by default).
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import itertools
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any, Callable, NamedTuple
+
+from .api_rate_limiter import ApiData, RateLimiter
+from .compact_lookup_store import CompactLookupStore
+from .lookup_store import LookupStore
+from .redis_lookup_store import RedisLookupStore
+from .redis_stand_in import InProcessRedisServer
+from .sharded_lookup_store import ShardedLookupStore
+from .shared_memory_lookup_store import SharedMemoryLookupStore
+
+ROUTES = ("/users/:id", "/users/:id/orders", "/search", "/export")
+# Share of traffic per route normally, and during a burst of the burst route.
+ROUTE_WEIGHTS = (60, 25, 10, 5)
+BURSTING_ROUTE_WEIGHTS = (30, 10, 55, 5)
+BURST_EVERY_SECONDS = 5
+
+
+@contextmanager
+def redis_store() -> Iterator[RedisLookupStore]:
+    with InProcessRedisServer() as server:
+        store = RedisLookupStore("127.0.0.1", server.port)
+        try:
+            yield store
+        finally:
+            store.close()
+
+
+@contextmanager
+def shared_memory_store() -> Iterator[SharedMemoryLookupStore]:
+    store = SharedMemoryLookupStore(capacity=1 << 18)
+    try:
+        yield store
+    finally:
+        store.close()
+        store.unlink()
+
+
+@contextmanager
+def in_process(make_store: Callable[[], Any]) -> Iterator[Any]:
+    yield make_store()
+
+
+STORES: dict[str, Callable[[], Any]] = {
+    "lookup_store": lambda: in_process(LookupStore),
+    "sharded_lookup_store": lambda: in_process(ShardedLookupStore),
+    "compact_lookup_store": lambda: in_process(CompactLookupStore),
+    # Counters live in shared memory, so bytes/key only shows the Python side.
+    "shared_memory_lookup_store": shared_memory_store,
+    "redis_lookup_store": redis_store,
+}
+
+
+class BenchResult(NamedTuple):
+    store: str
+    requests: int
+    keys: int
+    decisions_per_second: float
+    p50_us: float
+    p99_us: float
+    p999_us: float
+    bytes_per_key: float
+    allowed_ratio: float
+
+
+def zipf_cumulative_weights(keys: int, exponent: float) -> list[float]:
+    return list(
+        itertools.accumulate(1 / (rank**exponent) for rank in range(1, keys + 1))
+    )
+
+
+def generate_traffic(
+    requests: int,
+    keys: int,
+    requests_per_second: int = 5_000,
+    zipf_exponent: float = 1.1,
+    seed: int = 42,
+) -> list[ApiData]:
+    """Zipfian keys over bursty routes, with time advancing one second at a time."""
+    randomizer = random.Random(seed)
+    key_weights = zipf_cumulative_weights(keys, zipf_exponent)
+    api_keys = [f"key_{i}" for i in range(keys)]
+    route_weights = list(itertools.accumulate(ROUTE_WEIGHTS))
+    bursting_route_weights = list(itertools.accumulate(BURSTING_ROUTE_WEIGHTS))
+
+    traffic = []
+    for start in range(0, requests, requests_per_second):
+        epoch_time = 1000 + start // requests_per_second
+        size = min(requests_per_second, requests - start)
+        bursting = epoch_time % BURST_EVERY_SECONDS == 0
+        chosen_keys = randomizer.choices(api_keys, cum_weights=key_weights, k=size)
+        chosen_routes = randomizer.choices(
+            ROUTES,
+            cum_weights=bursting_route_weights if bursting else route_weights,
+            k=size,
+        )
+        traffic.extend(
+            ApiData(api_key, api_route, epoch_time)
+            for api_key, api_route in zip(chosen_keys, chosen_routes)
+        )
+    return traffic
+
+
+def percentile(sorted_values: list[int], fraction: float) -> int:
+    """Nearest rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, int(len(sorted_values) * fraction)))
+    return sorted_values[index]
+
+
+def distinct_keys(traffic: list[ApiData]) -> int:
+    return len({(api_data.api_key, api_data.api_route) for api_data in traffic})
+
+
+def run(name: str, traffic: list[ApiData]) -> BenchResult:
+    # Timed pass, with tracemalloc off since it slows every allocation down.
+    with STORES[name]() as store:
+        rate_limiter = RateLimiter(store)
+        acquire = rate_limiter.acquire
+        clock = time.perf_counter_ns
+        latencies = []
+        allowed = 0
+        gc.collect()
+        start = clock()
+        for api_data in traffic:
+            before = clock()
+            allowed += acquire(api_data).allowed
+            latencies.append(clock() - before)
+        elapsed_ns = clock() - start
+
+    # Separate pass for memory growth of the in-process part of the store.
+    gc.collect()
+    tracemalloc.start()
+    with STORES[name]() as store:
+        baseline, _ = tracemalloc.get_traced_memory()
+        rate_limiter = RateLimiter(store)
+        for api_data in traffic:
+            rate_limiter.acquire(api_data)
+        used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    keys = distinct_keys(traffic)
+    return BenchResult(
+        store=name,
+        requests=len(traffic),
+        keys=keys,
+        decisions_per_second=len(traffic) / (elapsed_ns / 1e9),
+        p50_us=percentile(latencies, 0.50) / 1000,
+        p99_us=percentile(latencies, 0.99) / 1000,
+        p999_us=percentile(latencies, 0.999) / 1000,
+        bytes_per_key=(used - baseline) / keys,
+        allowed_ratio=allowed / len(traffic),
+    )
+
+
+def regressions(
+    results: list[BenchResult], baseline: list[dict], max_regression: float
+) -> list[str]:
+    by_store = {entry["store"]: entry for entry in baseline}
+    problems = []
+    for result in results:
+        previous = by_store.get(result.store)
+        if previous is None:
+            continue
+        if result.p99_us > previous["p99_us"] * (1 + max_regression):
+            problems.append(
+                f"{result.store}: p99 {result.p99_us:.1f}us"
+                f" vs {previous['p99_us']:.1f}us"
+            )
+        if result.decisions_per_second < previous["decisions_per_second"] * (
+            1 - max_regression
+        ):
+            problems.append(
+                f"{result.store}: {result.decisions_per_second:,.0f} decisions/s"
+                f" vs {previous['decisions_per_second']:,.0f}"
+            )
+    return problems
+
+
+def print_table(results: list[BenchResult]) -> None:
+    print(
+        f"{'store':<28}{'decisions/s':>14}{'p50 us':>10}{'p99 us':>10}"
+        f"{'p999 us':>10}{'bytes/key':>12}{'allowed':>10}"
+    )
+    for result in results:
+        print(
+            f"{result.store:<28}{result.decisions_per_second:>14,.0f}"
+            f"{result.p50_us:>10.1f}{result.p99_us:>10.1f}{result.p999_us:>10.1f}"
+            f"{result.bytes_per_key:>12.0f}{result.allowed_ratio:>10.1%}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--requests-per-second", type=int, default=5_000)
+    parser.add_argument("--zipf-exponent", type=float, default=1.1)
+    parser.add_argument("--stores", nargs="+", choices=STORES, default=list(STORES))
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    parser.add_argument("--baseline", help="JSON results of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    traffic = generate_traffic(
+        args.requests, args.keys, args.requests_per_second, args.zipf_exponent
+    )
+    results = [run(name, traffic) for name in args.stores]
+
+    if args.json:
+        print(json.dumps([result._asdict() for result in results], indent=2))
+    else:
+        print_table(results)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            problems = regressions(results, json.load(file), args.max_regression)
+        for problem in problems:
+            print(f"regression: {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from collections.abc import Iterator, Sequence
+
+from .lookup_store import (
+    BURST_WINDOW_IN_SECONDS,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    DEFAULT_RATE_LIMITS,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    WindowCounts,
+    within_limits,
+)
+
+# The decision only needs to know whether bursts went past the allowance, so
+# one more than the allowance is all we ever track.
+DEFAULT_TRACKED_BURSTS = DEFAULT_NUMBER_OF_BURST_PER_MINUTE + 1
+# Profile ids are stored as uint16.
+MAX_LIMIT_PROFILES = 1 << 16
+
+
+class CompactLookupStore:
+    """
+    LookupStore laid out for millions of keys.
+
+    Instead of an object per key, each key is a slot index into a few typed
+    arrays (slabs), so a key costs a couple of dozen bytes of counters:
+    - the second currently being counted and its count (uint32 each)
+    - the most recent bursting seconds, newest first (uint32 each)
+    - a two byte id into a shared table of up to MAX_LIMIT_PROFILES
+      RateLimits profiles
+
+    Slots are found through route -> api_key -> slot dicts, which avoids a
+    key tuple per entry, and key strings are interned so every request for a
+    key shares one string.
+
+    The trade-off is that only the current second's count is kept, not the
+    whole window, so a late increment for an earlier second is dropped. That
+    is the same forward-moving time the burst tracking already assumes. Burst
+    counts are exact up to `tracked_bursts`, which is all the decision needs.
+    """
+
+    def __init__(self, tracked_bursts: int = DEFAULT_TRACKED_BURSTS):
+        self.tracked_bursts = tracked_bursts
+        self.slots_by_route: dict[str, dict[str, int]] = {}
+        self.epoch_times = array("I")
+        self.counts = array("I")
+        self.burst_epoch_times = array("I")
+        self.limit_profile_ids = array("H")
+        self.limit_profiles: list[RateLimits] = [DEFAULT_RATE_LIMITS]
+        self._profile_ids = {DEFAULT_RATE_LIMITS: 0}
+
+    def _profile_id(self, limits: RateLimits) -> int:
+        profile_id = self._profile_ids.get(limits)
+        if profile_id is None:
+            if len(self.limit_profiles) >= MAX_LIMIT_PROFILES:
+                raise ValueError(
+                    f"more than {MAX_LIMIT_PROFILES} distinct RateLimits profiles"
+                )
+            profile_id = self._profile_ids[limits] = len(self.limit_profiles)
+            self.limit_profiles.append(limits)
+        return profile_id
+
+    def _slot(
+        self,
+        api_key: str,
+        api_route: str,
+        limits: RateLimits | None = None,
+    ) -> int:
+        """Find or create the key's slot, moving it onto `limits` if given."""
+        slots = self.slots_by_route.get(api_route)
+        if slots is None:
+            slots = self.slots_by_route[sys.intern(api_route)] = {}
+        slot = slots.get(api_key)
+        if slot is None:
+            # Resolved before any slab grows, so a failure leaves them aligned.
+            profile_id = self._profile_id(limits or DEFAULT_RATE_LIMITS)
+            slot = slots[sys.intern(api_key)] = len(self.epoch_times)
+            self.epoch_times.append(0)
+            self.counts.append(0)
+            self.burst_epoch_times.extend([0] * self.tracked_bursts)
+            self.limit_profile_ids.append(profile_id)
+        elif limits is not None:
+            self.limit_profile_ids[slot] = self._profile_id(limits)
+        return slot
+
+    def _bursts_in_window(self, slot: int, epoch_time: int) -> int:
+        window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+        start = slot * self.tracked_bursts
+        bursts = 0
+        for burst_epoch_time in self.burst_epoch_times[
+            start : start + self.tracked_bursts
+        ]:
+            if burst_epoch_time < window_start or burst_epoch_time == 0:
+                break
+            if burst_epoch_time <= epoch_time:
+                bursts += 1
+        return bursts
+
+    def _count(self, slot: int, epoch_time: int) -> int:
+        return self.counts[slot] if self.epoch_times[slot] == epoch_time else 0
+
+    def _increment(self, slot: int, epoch_time: int, amount: int) -> None:
+        current_epoch_time = self.epoch_times[slot]
+        if epoch_time < current_epoch_time:
+            return
+        if epoch_time > current_epoch_time:
+            self.epoch_times[slot] = epoch_time
+            self.counts[slot] = 0
+        count = self.counts[slot] + amount
+        self.counts[slot] = count
+
+        limits = self.limit_profiles[self.limit_profile_ids[slot]]
+        if count - amount < limits.burst_limit_per_second <= count:
+            # Newest first: shift the older bursts along and drop the oldest.
+            start = slot * self.tracked_bursts
+            end = start + self.tracked_bursts
+            self.burst_epoch_times[start + 1 : end] = self.burst_epoch_times[
+                start : end - 1
+            ]
+            self.burst_epoch_times[start] = epoch_time
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        """
+        A RateLimiterData snapshot of the key, holding the current second's
+        count and the tracked bursts. Writes to it do not reach the store.
+        """
+        slot = self._slot(api_key, api_route, limits)
+        data = RateLimiterData(self.limit_profiles[self.limit_profile_ids[slot]])
+        if self.epoch_times[slot]:
+            data.api_counts_by_epoch_time[self.epoch_times[slot]] = self.counts[slot]
+        start = slot * self.tracked_bursts
+        data.burst_epoch_times = sorted(
+            burst_epoch_time
+            for burst_epoch_time in self.burst_epoch_times[
+                start : start + self.tracked_bursts
+            ]
+            if burst_epoch_time
+        )
+        return data
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self._increment(self._slot(api_key, api_route, limits), epoch_time, 1)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self._increment(self._slot(api_key, api_route, limits), epoch_time, amount)
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        slot = self._slot(api_key, api_route)
+        counts = WindowCounts(
+            self._count(slot, epoch_time), self._bursts_in_window(slot, epoch_time)
+        )
+        self._increment(slot, epoch_time, 1)
+        return counts
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        results = []
+        for key, key_limits in zip(keys, limits):
+            slot = self._slot(key.api_key, key.api_route, key_limits)
+            results.append(
+                WindowCounts(
+                    self._count(slot, epoch_time),
+                    self._bursts_in_window(slot, epoch_time),
+                )
+            )
+            self._increment(slot, epoch_time, 1)
+        return results
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        slots = [
+            self._slot(key.api_key, key.api_route, key_limits)
+            for key, key_limits in zip(keys, limits)
+        ]
+        results = [
+            WindowCounts(
+                self._count(slot, epoch_time), self._bursts_in_window(slot, epoch_time)
+            )
+            for slot in slots
+        ]
+        if all(map(within_limits, results, limits)):
+            for slot in slots:
+                self._increment(slot, epoch_time, 1)
+        return results
+
+    def restore(self, key: RateLimiterKey, data: RateLimiterData) -> None:
+        """Load a key's latest second and its newest bursts from `data`."""
+        slot = self._slot(key.api_key, key.api_route, data.limits)
+        counts = data.api_counts_by_epoch_time
+        latest_epoch_time = max(counts, default=0)
+        self.epoch_times[slot] = latest_epoch_time
+        self.counts[slot] = counts.get(latest_epoch_time, 0)
+        newest_first = sorted(data.burst_epoch_times, reverse=True)
+        newest_first = newest_first[: self.tracked_bursts]
+        newest_first += [0] * (self.tracked_bursts - len(newest_first))
+        start = slot * self.tracked_bursts
+        self.burst_epoch_times[start : start + self.tracked_bursts] = array(
+            "I", newest_first
+        )
+
+    def __len__(self) -> int:
+        return len(self.epoch_times)
+
+    def __iter__(self) -> Iterator[RateLimiterKey]:
+        # Over copies, so a snapshot thread can list keys while others are added.
+        for api_route, slots in list(self.slots_by_route.items()):
+            for api_key in list(slots):
+                yield RateLimiterKey(api_key, api_route)
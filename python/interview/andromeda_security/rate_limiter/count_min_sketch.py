@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import math
+from array import array
+from collections.abc import Hashable, Iterator, Sequence
+
+from .lookup_store import (
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_RATE_LIMITS,
+    LookupStore,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    RateLimitStore,
+    WindowCounts,
+    within_limits,
+)
+
+# Size epsilon so that epsilon * peak requests per second stays well under the
+# promotion threshold, otherwise collisions alone promote keys. With 1e-4 a
+# second of 100k requests adds at most 10 to an estimate (with probability
+# 1 - delta) and usually far less, for ~540 KB per sketch.
+DEFAULT_EPSILON = 0.0001
+DEFAULT_DELTA = 0.01
+# The current second plus the one before it, for requests that arrive late.
+DEFAULT_SKETCH_SECONDS = 2
+_HASH_MASK = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """
+    Fixed memory frequency estimates, `depth` rows of `width` counters.
+
+    A key adds to one counter per row and its estimate is the smallest of
+    them. Collisions only ever add, so an estimate is never below the true
+    count, and with width = ceil(e / epsilon), depth = ceil(ln(1 / delta)):
+
+        true <= estimate <= true + epsilon * total    with probability 1 - delta
+
+    where `total` is the sum of everything added. Rows use double hashing
+    (h1 + row * h2) off the key's own hash, so there is one hash per update.
+    """
+
+    __slots__ = ("width", "depth", "counters", "total")
+
+    def __init__(self, width: int, depth: int):
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be at least 1")
+        self.width = width
+        self.depth = depth
+        self.counters = array("I", [0]) * (width * depth)
+        self.total = 0
+
+    @classmethod
+    def from_error_bounds(cls, epsilon: float, delta: float) -> CountMinSketch:
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _indexes(self, key: Hashable) -> Iterator[int]:
+        key_hash = hash(key) & _HASH_MASK
+        h1 = key_hash & 0xFFFFFFFF
+        h2 = (key_hash >> 32) | 1
+        width = self.width
+        for row in range(self.depth):
+            yield row * width + (h1 + row * h2) % width
+
+    def add(self, key: Hashable, amount: int = 1) -> int:
+        """Add to the key's counters and return its new estimate."""
+        counters = self.counters
+        indexes = list(self._indexes(key))
+        for index in indexes:
+            counters[index] += amount
+        self.total += amount
+        return min(counters[index] for index in indexes)
+
+    def estimate(self, key: Hashable) -> int:
+        counters = self.counters
+        return min(counters[index] for index in self._indexes(key))
+
+    def clear(self) -> None:
+        self.counters = array("I", [0]) * len(self.counters)
+        self.total = 0
+
+
+class SketchFilteredLookupStore:
+    """
+    LookupStore with a count-min sketch in front of the exact per key data.
+
+    Keys start out only in a per second sketch, which has fixed memory however
+    many keys there are. A key only gets exact RateLimiterData (is promoted)
+    once its estimate for a second goes past `promotion_threshold`, by default
+    the per second limit. Since estimates never undercount, a key that has not
+    got there is certainly under the per second limit and, with the threshold
+    below the burst limit, could not have burst, so the decision is the same
+    as the exact store would make. A flood of random API keys or unnormalized
+    routes, each sending a few requests, therefore costs sketch counters
+    rather than a dict entry per key.
+
+    The price is in the second a key is promoted: its exact count starts from
+    the sketch estimate, which can be high by up to epsilon times that
+    second's traffic (with probability 1 - delta, see CountMinSketch). The
+    rest of the window is exact from then on.
+
+    Sketches rotate with time: one per second for the last `sketch_seconds`
+    seconds. Requests for seconds older than that are let through uncounted.
+    """
+
+    def __init__(
+        self,
+        exact_store: RateLimitStore | None = None,
+        epsilon: float = DEFAULT_EPSILON,
+        delta: float = DEFAULT_DELTA,
+        promotion_threshold: int = DEFAULT_LIMIT_PER_SECOND,
+        sketch_seconds: int = DEFAULT_SKETCH_SECONDS,
+    ):
+        self.exact_store = LookupStore() if exact_store is None else exact_store
+        self.promotion_threshold = promotion_threshold
+        self.sketches = [
+            CountMinSketch.from_error_bounds(epsilon, delta)
+            for _ in range(sketch_seconds)
+        ]
+        self.sketch_epoch_times = [-1] * sketch_seconds
+        self.promotions = 0
+
+    def _sketch_for(self, epoch_time: int) -> CountMinSketch | None:
+        slot = epoch_time % len(self.sketches)
+        sketch_epoch_time = self.sketch_epoch_times[slot]
+        if sketch_epoch_time != epoch_time:
+            if sketch_epoch_time > epoch_time:
+                return None
+            self.sketches[slot].clear()
+            self.sketch_epoch_times[slot] = epoch_time
+        return self.sketches[slot]
+
+    def _filters(self, limits: RateLimits | None) -> bool:
+        """
+        Whether keys on `limits` can be counted in the sketch. Keys with a
+        per second limit below the promotion threshold go to the exact store.
+        """
+        return limits is None or limits.limit_per_second >= self.promotion_threshold
+
+    def _count_in_sketch(
+        self,
+        key: RateLimiterKey,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> int | None:
+        """
+        Count in the sketch. Returns the estimate before this update, or None
+        once the key has been promoted to the exact store.
+        """
+        sketch = self._sketch_for(epoch_time)
+        if sketch is None:
+            return 0
+        estimate = sketch.add(key, amount)
+        if estimate <= self.promotion_threshold:
+            return estimate - amount
+        self.promotions += 1
+        if estimate > amount:
+            self.exact_store.increment_limit_count(
+                key.api_key, key.api_route, epoch_time, estimate - amount, limits
+            )
+        return None
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        """
+        The exact data for promoted keys. For the rest, a snapshot holding the
+        sketch estimates for the seconds the sketches cover; writes to it do
+        not reach the store.
+        """
+        key = RateLimiterKey(api_key, api_route)
+        if key in self.exact_store:
+            return self.exact_store.get(api_key, api_route, limits)
+        data = RateLimiterData(DEFAULT_RATE_LIMITS if limits is None else limits)
+        for epoch_time, sketch in zip(self.sketch_epoch_times, self.sketches):
+            if epoch_time >= 0:
+                estimate = sketch.estimate(key)
+                if estimate:
+                    data.api_counts_by_epoch_time[epoch_time] = estimate
+        return data
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.increment_limit_count(api_key, api_route, epoch_time, 1, limits)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        key = RateLimiterKey(api_key, api_route)
+        if (
+            key in self.exact_store
+            or not self._filters(limits)
+            or self._count_in_sketch(key, epoch_time, amount, limits) is None
+        ):
+            self.exact_store.increment_limit_count(
+                api_key, api_route, epoch_time, amount, limits
+            )
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        key = RateLimiterKey(api_key, api_route)
+        if key not in self.exact_store:
+            count = self._count_in_sketch(key, epoch_time, 1)
+            if count is not None:
+                return WindowCounts(count, 0)
+        return self.exact_store.fetch_and_increment(api_key, api_route, epoch_time)
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        # Policies can have their own limits, so the sketch only filters for
+        # the store wide threshold; anything tighter goes to the exact store.
+        results = []
+        for key, key_limits in zip(keys, limits):
+            if key not in self.exact_store and self._filters(key_limits):
+                count = self._count_in_sketch(key, epoch_time, 1, key_limits)
+                if count is not None:
+                    results.append(WindowCounts(count, 0))
+                    continue
+            (counts,) = self.exact_store.fetch_and_increment_many(
+                [key], epoch_time, [key_limits]
+            )
+            results.append(counts)
+        return results
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        Reads every key's counts first and only counts them if all are within
+        their limits. Like the rest of this store, not thread safe.
+        """
+        results = [
+            self._window_counts(key, epoch_time, key_limits)
+            for key, key_limits in zip(keys, limits)
+        ]
+        if all(map(within_limits, results, limits)):
+            self.fetch_and_increment_many(keys, epoch_time, limits)
+        return results
+
+    def _window_counts(
+        self, key: RateLimiterKey, epoch_time: int, limits: RateLimits
+    ) -> WindowCounts:
+        """What fetch_and_increment_many would return for the key, read only."""
+        if key in self.exact_store:
+            return self.exact_store.get(*key, limits).window_counts(epoch_time)
+        if not self._filters(limits):
+            return WindowCounts(0, 0)
+        slot = epoch_time % len(self.sketches)
+        if self.sketch_epoch_times[slot] != epoch_time:
+            return WindowCounts(0, 0)
+        return WindowCounts(self.sketches[slot].estimate(key), 0)
+
+    def __len__(self) -> int:
+        """Number of promoted keys; the sketch does not keep keys."""
+        return len(self.exact_store)
+
+    def __iter__(self) -> Iterator[RateLimiterKey]:
+        return iter(self.exact_store)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from .algorithms import RateLimitDecision, fixed_window_decision
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    LookupStore,
+    RateLimiterKey,
+    RateLimits,
+    RateLimitStore,
+    escape_key_part,
+)
+
+# Route placeholder for scopes that are not per endpoint.
+ANY_ROUTE = "*"
+
+
+class RequestContext(NamedTuple):
+    """
+    Everything a request can be limited by.
+
+    Attributes:
+        tenant (str): The customer account the API key belongs to.
+        user (str): The end user making the request.
+        api_key (str): The API key used to authenticate the request.
+        api_route (str): The normalized route being accessed (e.g., '/user/:id').
+        epoch_time (int): The Unix timestamp (in seconds) of the request.
+    """
+
+    tenant: str
+    user: str
+    api_key: str
+    api_route: str
+    epoch_time: int
+
+
+class LimitPolicy(NamedTuple):
+    """
+    Limits for one scope of the hierarchy.
+
+    `key_fields` are the RequestContext fields that identify a counter in this
+    scope, e.g. ("tenant",) for a tenant wide limit or ("api_key", "api_route")
+    for the per endpoint limit of an API key.
+    """
+
+    scope: str
+    key_fields: tuple[str, ...]
+    limit_per_second: int = DEFAULT_LIMIT_PER_SECOND
+    burst_limit_per_second: int = DEFAULT_BURST_LIMIT_PER_SECOND
+    number_of_bursts: int = DEFAULT_NUMBER_OF_BURST_PER_MINUTE
+
+    def key_for(self, context: RequestContext) -> RateLimiterKey:
+        # Each part is escaped, so values containing ':' cannot collide.
+        identity = ":".join(
+            escape_key_part(part)
+            for part in (
+                self.scope,
+                *(
+                    getattr(context, field)
+                    for field in self.key_fields
+                    if field != "api_route"
+                ),
+            )
+        )
+        route = context.api_route if "api_route" in self.key_fields else ANY_ROUTE
+        return RateLimiterKey(identity, route)
+
+    @property
+    def limits(self) -> RateLimits:
+        return RateLimits(
+            self.limit_per_second, self.burst_limit_per_second, self.number_of_bursts
+        )
+
+
+class HierarchicalDecision(NamedTuple):
+    """
+    Outcome across all scopes. The request is allowed only if every scope
+    allows it; `rejected_by` names the first scope that did not.
+    """
+
+    allowed: bool
+    rejected_by: str | None
+    decisions: tuple[RateLimitDecision, ...]
+
+
+class HierarchicalRateLimiter:
+    """
+    Checks one request against several nested scopes (for example tenant,
+    API key, user and endpoint) in a single pass.
+
+    All the scope counters share one store and are checked and counted with a
+    single check_and_increment_many call, so adding a dimension does not add a
+    store round trip. The scopes are only counted if every one of them allows
+    the request, so a rejected request does not use up a parent's quota.
+    """
+
+    def __init__(
+        self,
+        policies: Sequence[LimitPolicy],
+        lookup_store: RateLimitStore | None = None,
+    ):
+        if not policies:
+            raise ValueError("At least one policy is required")
+        self.policies = tuple(policies)
+        self.lookup_store = LookupStore() if lookup_store is None else lookup_store
+        self._limits = [policy.limits for policy in policies]
+
+    def acquire(self, context: RequestContext) -> HierarchicalDecision:
+        keys = [policy.key_for(context) for policy in self.policies]
+        all_counts = self.lookup_store.check_and_increment_many(
+            keys, context.epoch_time, self._limits
+        )
+
+        decisions = tuple(
+            fixed_window_decision(counts, limits)
+            for limits, counts in zip(self._limits, all_counts)
+        )
+        rejected_by = next(
+            (
+                policy.scope
+                for policy, decision in zip(self.policies, decisions)
+                if not decision.allowed
+            ),
+            None,
+        )
+        return HierarchicalDecision(rejected_by is None, rejected_by, decisions)
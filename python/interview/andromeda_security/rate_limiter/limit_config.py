@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from .lookup_store import DEFAULT_RATE_LIMITS, RateLimits
+
+# Route that makes an override apply to every route of an API key.
+ALL_ROUTES = "*"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit_overrides (
+    api_key TEXT NOT NULL,
+    api_route TEXT NOT NULL DEFAULT '*',
+    limit_per_second INTEGER NOT NULL,
+    burst_limit_per_second INTEGER NOT NULL,
+    number_of_bursts INTEGER NOT NULL,
+    PRIMARY KEY (api_key, api_route)
+);
+CREATE TABLE IF NOT EXISTS rate_limit_config_version (
+    version INTEGER NOT NULL
+);
+INSERT INTO rate_limit_config_version (version)
+SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM rate_limit_config_version);
+"""
+
+# Anything that hands out a DB-API connection, e.g. lambda: sqlite3.connect(path)
+Connect = Callable[[], Any]
+
+
+def create_schema(connection: sqlite3.Connection) -> None:
+    connection.executescript(SCHEMA)
+    connection.commit()
+
+
+def set_override(
+    connection: sqlite3.Connection,
+    api_key: str,
+    limits: RateLimits,
+    api_route: str = ALL_ROUTES,
+) -> None:
+    """Write an override and bump the config version in one transaction."""
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO rate_limit_overrides VALUES (?, ?, ?, ?, ?)",
+            (api_key, api_route, *limits),
+        )
+        connection.execute("UPDATE rate_limit_config_version SET version = version + 1")
+
+
+class LimitConfig:
+    """
+    Per key limit overrides, read from SQL and served from memory.
+
+    The whole override table is held in a dict, so `limits_for` never touches
+    the database. `reload` first reads a single version number and only reloads
+    the table when that changed, so it is cheap to call on a timer. The new
+    table is swapped in with one assignment, so readers on other threads see
+    either the old config or the new one, never a half loaded one.
+
+    Lookup order: exact (api_key, api_route), then (api_key, '*'), then the
+    shared defaults.
+    """
+
+    def __init__(self, connect: Connect):
+        self.connect = connect
+        self.version = -1
+        self.reload_errors = 0
+        self.overrides: dict[tuple[str, str], RateLimits] = {}
+        self._stop_reloading = threading.Event()
+        self._reloader: threading.Thread | None = None
+
+    def limits_for(self, api_key: str, api_route: str) -> RateLimits:
+        overrides = self.overrides
+        limits = overrides.get((api_key, api_route))
+        if limits is None:
+            limits = overrides.get((api_key, ALL_ROUTES), DEFAULT_RATE_LIMITS)
+        return limits
+
+    def reload(self) -> bool:
+        """Reload the overrides if the stored version moved. Returns True if so."""
+        connection = self.connect()
+        try:
+            (version,) = connection.execute(
+                "SELECT version FROM rate_limit_config_version"
+            ).fetchone()
+            if version == self.version:
+                return False
+            rows = connection.execute(
+                "SELECT api_key, api_route, limit_per_second,"
+                " burst_limit_per_second, number_of_bursts"
+                " FROM rate_limit_overrides"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        # Equal limits share one RateLimits, like keys on the default plan do.
+        shared = {DEFAULT_RATE_LIMITS: DEFAULT_RATE_LIMITS}
+        overrides = {}
+        for api_key, api_route, *values in rows:
+            limits = RateLimits(*values)
+            overrides[(api_key, api_route)] = shared.setdefault(limits, limits)
+        self.overrides = overrides
+        self.version = version
+        return True
+
+    def start(self, interval_seconds: float = 5.0) -> None:
+        """Load now, then keep reloading in a background thread."""
+        self.reload()
+        self._stop_reloading.clear()
+        self._reloader = threading.Thread(
+            target=self._reload_until_stopped, args=(interval_seconds,), daemon=True
+        )
+        self._reloader.start()
+
+    def stop(self) -> None:
+        self._stop_reloading.set()
+        if self._reloader is not None:
+            self._reloader.join()
+            self._reloader = None
+
+    def _reload_until_stopped(self, interval_seconds: float) -> None:
+        while not self._stop_reloading.wait(interval_seconds):
+            try:
+                self.reload()
+            except Exception:
+                # Keep serving the last good config until the database is back.
+                self.reload_errors += 1
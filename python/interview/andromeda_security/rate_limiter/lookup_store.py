@@ -1,24 +1,278 @@
-from collections import UserDict, defaultdict
-from typing import NamedTuple
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import UserDict
+from collections.abc import Iterator, Mapping, MutableMapping, Sequence
+from typing import NamedTuple, Protocol
 
 DEFAULT_LIMIT_PER_SECOND = 10
 DEFAULT_BURST_LIMIT_PER_SECOND = 100
 DEFAULT_NUMBER_OF_BURST_PER_MINUTE = 2
 
+# Bursts are counted over [epoch_time - 60, epoch_time], both ends inclusive,
+# so the window has to hold one more slot than the number of seconds.
+BURST_WINDOW_IN_SECONDS = 60
+WINDOW_SLOTS = BURST_WINDOW_IN_SECONDS + 1
+
 
 class RateLimiterKey(NamedTuple):
     api_key: str
     api_route: str
 
 
-class RateLimiterData:
+class RateLimits(NamedTuple):
+    limit_per_second: int = DEFAULT_LIMIT_PER_SECOND
+    burst_limit_per_second: int = DEFAULT_BURST_LIMIT_PER_SECOND
+    number_of_bursts: int = DEFAULT_NUMBER_OF_BURST_PER_MINUTE
+
+
+# Shared by every key on the default plan rather than copied into each one.
+DEFAULT_RATE_LIMITS = RateLimits()
+
+
+class WindowCounts(NamedTuple):
+    """Per second count and bursts in the window, as seen before an increment."""
+
+    count: int
+    bursts: int
+
+
+def escape_key_part(value: str) -> str:
+    """
+    Escape ':' (and the escape character itself) so parts joined with ':'
+    cannot collide, e.g. "a:b" + "c" and "a" + "b:c".
+    """
+    return value.replace("\\", "\\\\").replace(":", "\\:")
+
+
+def within_limits(counts: WindowCounts, limits: RateLimits) -> bool:
+    """The fixed window rule, under the per second limit or bursts to spare."""
+    return (
+        counts.count <= limits.limit_per_second
+        or counts.bursts <= limits.number_of_bursts
+    )
+
+
+class SlidingWindowCounter(MutableMapping[int, int]):
+    """
+    Fixed size ring buffer of per second counts.
+
+    Each epoch second maps to slot `epoch_time % WINDOW_SLOTS`. A slot remembers
+    which second it currently holds, so a write for a newer second resets it
+    and any other second is missing from the mapping; `count` reads it as 0.
+    Memory per key stays constant no matter how long the key lives, which is
+    the in-process equivalent of the TTL the design doc puts on the Redis hash.
+
+    Slots are typed arrays rather than lists, so a key costs a few hundred
+    bytes instead of a boxed int per slot.
+    """
+
+    __slots__ = ("_epoch_times", "_counts")
+
     def __init__(self):
-        self.limit_per_second = DEFAULT_LIMIT_PER_SECOND
-        self.burst_limit_per_second = DEFAULT_BURST_LIMIT_PER_SECOND
-        self.number_of_bursts = DEFAULT_NUMBER_OF_BURST_PER_MINUTE
-        # This simulates the fixed window counter.
+        self._epoch_times = array("q", [-1]) * WINDOW_SLOTS
+        self._counts = array("I", [0]) * WINDOW_SLOTS
+
+    def __getitem__(self, epoch_time: int) -> int:
+        slot = epoch_time % WINDOW_SLOTS
+        if self._epoch_times[slot] != epoch_time:
+            raise KeyError(epoch_time)
+        return self._counts[slot]
+
+    def __setitem__(self, epoch_time: int, count: int) -> None:
+        slot = epoch_time % WINDOW_SLOTS
+        if self._epoch_times[slot] > epoch_time:
+            # The slot already moved on to a newer second, so this write is for
+            # a second that has left the window.
+            return
+        self._epoch_times[slot] = epoch_time
+        self._counts[slot] = count
+
+    def __delitem__(self, epoch_time: int) -> None:
+        slot = epoch_time % WINDOW_SLOTS
+        if self._epoch_times[slot] != epoch_time:
+            raise KeyError(epoch_time)
+        self._epoch_times[slot] = -1
+        self._counts[slot] = 0
+
+    def __contains__(self, epoch_time: object) -> bool:
+        return (
+            isinstance(epoch_time, int)
+            and self._epoch_times[epoch_time % WINDOW_SLOTS] == epoch_time
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return (epoch_time for epoch_time in self._epoch_times if epoch_time >= 0)
+
+    def __len__(self) -> int:
+        return sum(1 for epoch_time in self._epoch_times if epoch_time >= 0)
+
+    def copy(self) -> SlidingWindowCounter:
+        window = SlidingWindowCounter.__new__(SlidingWindowCounter)
+        window._epoch_times = self._epoch_times[:]
+        window._counts = self._counts[:]
+        return window
+
+    def count(self, epoch_time: int) -> int:
+        """Count for `epoch_time`, 0 if the window holds no requests for it."""
+        slot = epoch_time % WINDOW_SLOTS
+        if self._epoch_times[slot] != epoch_time:
+            return 0
+        return self._counts[slot]
+
+    def increment(self, epoch_time: int, amount: int = 1) -> int:
+        """Add `amount` to the count for `epoch_time` and return the new count."""
+        slot = epoch_time % WINDOW_SLOTS
+        if self._epoch_times[slot] != epoch_time:
+            if self._epoch_times[slot] > epoch_time:
+                return 0
+            self._epoch_times[slot] = epoch_time
+            self._counts[slot] = 0
+        self._counts[slot] += amount
+        return self._counts[slot]
+
+
+class RateLimiterData:
+    __slots__ = ("limits", "api_counts_by_epoch_time", "burst_epoch_times")
+
+    def __init__(self, limits: RateLimits = DEFAULT_RATE_LIMITS):
+        self.limits = limits
+        # This simulates the fixed window counter, bounded to the burst window.
         # {100: 2, 101: 3, 102: 4}
-        self.api_counts_by_epoch_time = defaultdict[int, int](int)
+        self.api_counts_by_epoch_time = SlidingWindowCounter()
+        # Seconds that reached the burst limit, oldest first. Kept alongside the
+        # counts so the burst check does not have to scan the window. A list
+        # rather than a deque: it never holds more than the window's seconds,
+        # and an empty deque alone costs more than the whole counter.
+        self.burst_epoch_times: list[int] = []
+
+    @property
+    def limit_per_second(self) -> int:
+        return self.limits.limit_per_second
+
+    @property
+    def burst_limit_per_second(self) -> int:
+        return self.limits.burst_limit_per_second
+
+    @property
+    def number_of_bursts(self) -> int:
+        return self.limits.number_of_bursts
+
+    @classmethod
+    def from_counts(
+        cls,
+        counts: Mapping[int, int],
+        limits: RateLimits = DEFAULT_RATE_LIMITS,
+    ) -> RateLimiterData:
+        """Rebuild the in-memory form from a {epoch_time: count} mapping."""
+        data = cls(limits)
+        for epoch_time in sorted(counts):
+            count = counts[epoch_time]
+            data.api_counts_by_epoch_time[epoch_time] = count
+            if count >= limits.burst_limit_per_second:
+                data.burst_epoch_times.append(epoch_time)
+        return data
+
+    def copy(self) -> RateLimiterData:
+        """Independent snapshot, safe to read while the original is updated."""
+        data = RateLimiterData(self.limits)
+        data.api_counts_by_epoch_time = self.api_counts_by_epoch_time.copy()
+        data.burst_epoch_times = self.burst_epoch_times.copy()
+        return data
+
+    def increment(self, epoch_time: int, amount: int = 1) -> None:
+        count = self.api_counts_by_epoch_time.increment(epoch_time, amount)
+        # Only the increment that takes a second to the limit records a burst,
+        # so every bursting second is recorded exactly once. Inserted in order:
+        # a replicated increment can land on an older second than local ones.
+        if count - amount < self.burst_limit_per_second <= count:
+            insort(self.burst_epoch_times, epoch_time)
+        self.expire_bursts(epoch_time)
+
+    def window_counts(self, epoch_time: int) -> WindowCounts:
+        return WindowCounts(
+            self.api_counts_by_epoch_time.count(epoch_time),
+            self.bursts_in_window(epoch_time),
+        )
+
+    def fetch_and_increment(self, epoch_time: int) -> WindowCounts:
+        counts = self.window_counts(epoch_time)
+        self.increment(epoch_time)
+        return counts
+
+    def expire_bursts(self, epoch_time: int) -> None:
+        window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+        expired = 0
+        for burst_epoch_time in self.burst_epoch_times:
+            if burst_epoch_time >= window_start:
+                break
+            expired += 1
+        if expired:
+            del self.burst_epoch_times[:expired]
+
+    def bursts_in_window(self, epoch_time: int) -> int:
+        """
+        Number of bursting seconds in [epoch_time - 60, epoch_time].
+
+        A read only: expired bursts are skipped with a binary search rather than
+        dropped, so a check never writes to the data. increment drops them.
+        """
+        window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+        return bisect_right(self.burst_epoch_times, epoch_time) - bisect_left(
+            self.burst_epoch_times, window_start
+        )
+
+
+class RateLimitStore(Protocol):
+    """
+    What the limiters need from a store. LookupStore is the reference
+    implementation; the sharded, compact, shared memory, sketch filtered and
+    Redis stores, and the replicas, all provide the same methods.
+
+    `limits`, where taken, are the limits the key is tracked under: bursts are
+    counted against its burst limit. None keeps the key on its current limits,
+    the defaults for a new key.
+    """
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData: ...
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None: ...
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None: ...
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts: ...
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]: ...
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]: ...
 
 
 class LookupStore(UserDict[RateLimiterKey, RateLimiterData]):
@@ -27,16 +281,97 @@ class LookupStore(UserDict[RateLimiterKey, RateLimiterData]):
     the focus is more on the implementation that we discussed.
     """
 
-    def get(self, api_key: str, api_route: str) -> RateLimiterData:
-        key = RateLimiterKey(api_key, api_route)
-        return self.setdefault(key, RateLimiterData())
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        return self._data_for(RateLimiterKey(api_key, api_route), limits)
 
     def increment_limit_count_by_one(
-        self, api_key: str, api_route: str, epoch_time: int
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
     ) -> None:
         # Key notes/assumptions:
-        # 1. No locking here as I've assumed single threaded access
+        # 1. No locking here as I've assumed single threaded access,
+        #    ShardedLookupStore is the thread safe variant
         # 2. Ignoring any serdes here for simplicity
         # 3. Updates need to be atomic and wrapped up in a transactional context if need be
 
-        self.get(api_key, api_route).api_counts_by_epoch_time[epoch_time] += 1
+        self.get(api_key, api_route, limits).increment(epoch_time)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        """Apply several increments for the same second as one update."""
+        self.get(api_key, api_route, limits).increment(epoch_time, amount)
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        """Count the request and return the counts from just before it."""
+        return self.get(api_key, api_route).fetch_and_increment(epoch_time)
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        fetch_and_increment for several keys in one store operation.
+
+        `limits` gives the limits each key is tracked under; bursts are
+        recorded against its burst limit.
+        """
+        return [
+            self._data_for(key, key_limits).fetch_and_increment(epoch_time)
+            for key, key_limits in zip(keys, limits)
+        ]
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        Like fetch_and_increment_many, but the keys are only counted if every
+        one of them is within its limits, so a rejected request uses no quota.
+        """
+        all_data = [
+            self._data_for(key, key_limits) for key, key_limits in zip(keys, limits)
+        ]
+        results = [data.window_counts(epoch_time) for data in all_data]
+        if all(map(within_limits, results, limits)):
+            for data in all_data:
+                data.increment(epoch_time)
+        return results
+
+    def _data_for(
+        self, key: RateLimiterKey, limits: RateLimits | None
+    ) -> RateLimiterData:
+        # Not setdefault, which would build a throwaway RateLimiterData on
+        # every lookup of an existing key.
+        data = self.data.get(key)
+        if data is None:
+            data = self.data[key] = RateLimiterData(
+                DEFAULT_RATE_LIMITS if limits is None else limits
+            )
+        elif limits is not None and data.limits is not limits:
+            data.limits = limits
+        return data
+
+    def restore(self, key: RateLimiterKey, data: RateLimiterData) -> None:
+        """Put back a key's data, e.g. from a snapshot."""
+        self.data[key] = data
+
+    def __iter__(self) -> Iterator[RateLimiterKey]:
+        # Over a copy, so a snapshot thread can list keys while others are added.
+        return iter(list(self.data))
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import hashlib
+import socket
+from collections.abc import Sequence
+from typing import Any
+
+from .lookup_store import (
+    BURST_WINDOW_IN_SECONDS,
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    DEFAULT_RATE_LIMITS,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    WindowCounts,
+    escape_key_part,
+)
+
+# The whole rate limiting decision, run server side so the read and the
+# increment happen atomically and cost a single round trip.
+#
+# KEYS[1]: hash of {epoch_time: count} for one (api_key, api_route)
+# ARGV: epoch_time, limit per second, burst limit per second,
+#       number of bursts allowed, window in seconds
+# Returns: {allowed (1/0), count for epoch_time after the increment}
+CHECK_AND_INCREMENT_SCRIPT = """
+local key = KEYS[1]
+local epoch_time = tonumber(ARGV[1])
+local limit_per_second = tonumber(ARGV[2])
+local burst_limit_per_second = tonumber(ARGV[3])
+local number_of_bursts = tonumber(ARGV[4])
+local window = tonumber(ARGV[5])
+
+local counts = redis.call('HGETALL', key)
+local current_count = 0
+local bursts = 0
+local expired = {}
+for i = 1, #counts, 2 do
+  local second = tonumber(counts[i])
+  local count = tonumber(counts[i + 1])
+  if second < epoch_time - window then
+    table.insert(expired, counts[i])
+  elseif second <= epoch_time then
+    if second == epoch_time then
+      current_count = count
+    end
+    if count >= burst_limit_per_second then
+      bursts = bursts + 1
+    end
+  end
+end
+if #expired > 0 then
+  redis.call('HDEL', key, unpack(expired))
+end
+
+local allowed = current_count <= limit_per_second or bursts <= number_of_bursts
+redis.call('HINCRBY', key, epoch_time, 1)
+redis.call('EXPIRE', key, window + 1)
+if allowed then
+  return {1, current_count + 1}
+end
+return {0, current_count + 1}
+"""
+CHECK_AND_INCREMENT_SHA = hashlib.sha1(CHECK_AND_INCREMENT_SCRIPT.encode()).hexdigest()
+
+# Policy free variant for callers that make the decision themselves: count the
+# request and return what the window looked like just before it.
+#
+# KEYS[1]: hash of {epoch_time: count} for one (api_key, api_route)
+# ARGV: epoch_time, burst limit per second, window in seconds
+# Returns: {count for epoch_time, bursts in the window}, both before increment
+FETCH_AND_INCREMENT_SCRIPT = """
+local key = KEYS[1]
+local epoch_time = tonumber(ARGV[1])
+local burst_limit_per_second = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+
+local counts = redis.call('HGETALL', key)
+local current_count = 0
+local bursts = 0
+local expired = {}
+for i = 1, #counts, 2 do
+  local second = tonumber(counts[i])
+  local count = tonumber(counts[i + 1])
+  if second < epoch_time - window then
+    table.insert(expired, counts[i])
+  elseif second <= epoch_time then
+    if second == epoch_time then
+      current_count = count
+    end
+    if count >= burst_limit_per_second then
+      bursts = bursts + 1
+    end
+  end
+end
+if #expired > 0 then
+  redis.call('HDEL', key, unpack(expired))
+end
+
+redis.call('HINCRBY', key, epoch_time, 1)
+redis.call('EXPIRE', key, window + 1)
+return {current_count, bursts}
+"""
+FETCH_AND_INCREMENT_SHA = hashlib.sha1(FETCH_AND_INCREMENT_SCRIPT.encode()).hexdigest()
+
+# All or nothing variant over several keys, for limits with nested scopes: the
+# keys are only counted if every one of them is within its limits.
+#
+# KEYS: one hash of {epoch_time: count} per scope
+# ARGV: epoch_time, window in seconds, then for each key its limit per second,
+#       burst limit per second and number of bursts allowed
+# Returns: {count, bursts} per key, flattened, both before any increment
+CHECK_AND_INCREMENT_MANY_SCRIPT = """
+local epoch_time = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+local results = {}
+local allowed = true
+for k = 1, #KEYS do
+  local key = KEYS[k]
+  local limit_per_second = tonumber(ARGV[k * 3])
+  local burst_limit_per_second = tonumber(ARGV[k * 3 + 1])
+  local number_of_bursts = tonumber(ARGV[k * 3 + 2])
+
+  local counts = redis.call('HGETALL', key)
+  local current_count = 0
+  local bursts = 0
+  local expired = {}
+  for i = 1, #counts, 2 do
+    local second = tonumber(counts[i])
+    local count = tonumber(counts[i + 1])
+    if second < epoch_time - window then
+      table.insert(expired, counts[i])
+    elseif second <= epoch_time then
+      if second == epoch_time then
+        current_count = count
+      end
+      if count >= burst_limit_per_second then
+        bursts = bursts + 1
+      end
+    end
+  end
+  if #expired > 0 then
+    redis.call('HDEL', key, unpack(expired))
+  end
+
+  if current_count > limit_per_second and bursts > number_of_bursts then
+    allowed = false
+  end
+  table.insert(results, current_count)
+  table.insert(results, bursts)
+end
+
+if allowed then
+  for k = 1, #KEYS do
+    redis.call('HINCRBY', KEYS[k], epoch_time, 1)
+    redis.call('EXPIRE', KEYS[k], window + 1)
+  end
+end
+return results
+"""
+CHECK_AND_INCREMENT_MANY_SHA = hashlib.sha1(
+    CHECK_AND_INCREMENT_MANY_SCRIPT.encode()
+).hexdigest()
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(*args: Any) -> bytes:
+    """Encode a command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        value = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """Read a single RESP reply. Error replies are returned, not raised."""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode()
+    if prefix == b"-":
+        return RedisError(payload.decode())
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        value = stream.read(length + 2)[:-2]
+        return value.decode()
+    if prefix == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise RedisError(f"Unknown reply type: {line!r}")
+
+
+class RedisConnection:
+    """
+    Minimal RESP2 client. Just enough protocol for the lookup store, so we do
+    not pull in a client library for a handful of commands.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    def execute(self, *args: Any) -> Any:
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: list[tuple[Any, ...]]) -> list[Any]:
+        """Send every command in one write and read all replies back."""
+        self.sock.sendall(b"".join(encode_command(*command) for command in commands))
+        replies = [read_reply(self.stream) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self) -> None:
+        self.stream.close()
+        self.sock.close()
+
+
+class RedisLookupStore:
+    """
+    LookupStore backed by a Redis protocol server.
+
+    Each (api_key, api_route) is a hash of {epoch_time: count} with a TTL of
+    the burst window, matching the layout in the design doc. Only counts are
+    stored and bursts are worked out from them on every read, so `limits`
+    matter when reading and increments ignore them.
+    """
+
+    def __init__(
+        self, host: str = "localhost", port: int = 6379, key_prefix: str = "rl"
+    ):
+        self.connection = RedisConnection(host, port)
+        self.key_prefix = key_prefix
+
+    def _key(self, api_key: str, api_route: str) -> str:
+        # Escaped, as API keys and routes can contain ':' themselves.
+        return ":".join(map(escape_key_part, (self.key_prefix, api_key, api_route)))
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        flat = self.connection.execute("HGETALL", self._key(api_key, api_route))
+        counts = {int(flat[i]): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+        return RateLimiterData.from_counts(
+            counts, DEFAULT_RATE_LIMITS if limits is None else limits
+        )
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.increment_limit_count(api_key, api_route, epoch_time, 1, limits)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        key = self._key(api_key, api_route)
+        self.connection.pipeline(
+            [
+                ("HINCRBY", key, epoch_time, amount),
+                ("EXPIRE", key, BURST_WINDOW_IN_SECONDS + 1),
+            ]
+        )
+
+    def check_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> bool:
+        """
+        Atomically decide whether the request is allowed and count it.
+
+        Uses EVALSHA so the script body is only sent the first time a server
+        sees it; a NOSCRIPT reply falls back to EVAL, which also caches it.
+        """
+        allowed, _ = self._run_script(
+            CHECK_AND_INCREMENT_SCRIPT,
+            CHECK_AND_INCREMENT_SHA,
+            [self._key(api_key, api_route)],
+            epoch_time,
+            DEFAULT_LIMIT_PER_SECOND,
+            DEFAULT_BURST_LIMIT_PER_SECOND,
+            DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+            BURST_WINDOW_IN_SECONDS,
+        )
+        return allowed == 1
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        count, bursts = self._run_script(
+            FETCH_AND_INCREMENT_SCRIPT,
+            FETCH_AND_INCREMENT_SHA,
+            [self._key(api_key, api_route)],
+            epoch_time,
+            DEFAULT_BURST_LIMIT_PER_SECOND,
+            BURST_WINDOW_IN_SECONDS,
+        )
+        return WindowCounts(count, bursts)
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        Pipeline one script call per key, so the whole batch is a single round
+        trip. Each key is updated atomically on its own; the batch is not a
+        transaction across keys.
+        """
+        commands = [
+            (
+                "EVALSHA",
+                FETCH_AND_INCREMENT_SHA,
+                1,
+                self._key(*key),
+                epoch_time,
+                key_limits.burst_limit_per_second,
+                BURST_WINDOW_IN_SECONDS,
+            )
+            for key, key_limits in zip(keys, limits)
+        ]
+        try:
+            replies = self.connection.pipeline(commands)
+        except RedisError as error:
+            if not str(error).startswith("NOSCRIPT"):
+                raise
+            # Nothing ran, as the script is missing for every command. Load it
+            # and send the batch again in the same round trip.
+            replies = self.connection.pipeline(
+                [("SCRIPT", "LOAD", FETCH_AND_INCREMENT_SCRIPT), *commands]
+            )[1:]
+        return [WindowCounts(count, bursts) for count, bursts in replies]
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        One script call over every key, so the check and the increments are a
+        single atomic step on the server and a single round trip.
+        """
+        flat = self._run_script(
+            CHECK_AND_INCREMENT_MANY_SCRIPT,
+            CHECK_AND_INCREMENT_MANY_SHA,
+            [self._key(*key) for key in keys],
+            epoch_time,
+            BURST_WINDOW_IN_SECONDS,
+            *(value for key_limits in limits for value in key_limits),
+        )
+        return [WindowCounts(*flat[i : i + 2]) for i in range(0, len(flat), 2)]
+
+    def _run_script(
+        self, script: str, sha: str, keys: Sequence[str], *args: Any
+    ) -> Any:
+        try:
+            return self.connection.execute("EVALSHA", sha, len(keys), *keys, *args)
+        except RedisError as error:
+            if not str(error).startswith("NOSCRIPT"):
+                raise
+            return self.connection.execute("EVAL", script, len(keys), *keys, *args)
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import hashlib
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable
+
+from .redis_lookup_store import (
+    CHECK_AND_INCREMENT_MANY_SCRIPT,
+    CHECK_AND_INCREMENT_SCRIPT,
+    FETCH_AND_INCREMENT_SCRIPT,
+    RedisError,
+    read_reply,
+)
+
+# A script is emulated by a Python function taking (server, keys, args).
+ScriptHandler = Callable[["InProcessRedisServer", list[str], list[str]], Any]
+
+
+def encode_reply(reply: Any) -> bytes:
+    if isinstance(reply, RedisError):
+        return b"-%s\r\n" % str(reply).encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bool):
+        return b":%d\r\n" % int(reply)
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, (list, tuple)):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(r) for r in reply)
+    value = str(reply).encode()
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _scan(
+    server: InProcessRedisServer,
+    key: str,
+    epoch_time: int,
+    burst_limit: int,
+    window: int,
+) -> tuple[int, int]:
+    """Shared body of the scripts: prune, then count."""
+    counts = server.hash(key)
+    current_count = 0
+    bursts = 0
+    for second, count in list(counts.items()):
+        if second < epoch_time - window:
+            del counts[second]
+        elif second <= epoch_time:
+            if second == epoch_time:
+                current_count = count
+            if count >= burst_limit:
+                bursts += 1
+    return current_count, bursts
+
+
+def _scan_and_increment(
+    server: InProcessRedisServer,
+    key: str,
+    epoch_time: int,
+    burst_limit: int,
+    window: int,
+) -> tuple[int, int]:
+    current_count, bursts = _scan(server, key, epoch_time, burst_limit, window)
+    _increment(server, key, epoch_time, window)
+    return current_count, bursts
+
+
+def _increment(
+    server: InProcessRedisServer, key: str, epoch_time: int, window: int
+) -> None:
+    counts = server.hash(key)
+    counts[epoch_time] = counts.get(epoch_time, 0) + 1
+    server.expire(key, window + 1)
+
+
+def check_and_increment(
+    server: InProcessRedisServer, keys: list[str], args: list[str]
+) -> list[int]:
+    """Python twin of CHECK_AND_INCREMENT_SCRIPT."""
+    epoch_time, limit, burst_limit, number_of_bursts, window = map(int, args)
+    current_count, bursts = _scan_and_increment(
+        server, keys[0], epoch_time, burst_limit, window
+    )
+    allowed = current_count <= limit or bursts <= number_of_bursts
+    return [int(allowed), current_count + 1]
+
+
+def fetch_and_increment(
+    server: InProcessRedisServer, keys: list[str], args: list[str]
+) -> list[int]:
+    """Python twin of FETCH_AND_INCREMENT_SCRIPT."""
+    epoch_time, burst_limit, window = map(int, args)
+    return list(_scan_and_increment(server, keys[0], epoch_time, burst_limit, window))
+
+
+def check_and_increment_many(
+    server: InProcessRedisServer, keys: list[str], args: list[str]
+) -> list[int]:
+    """Python twin of CHECK_AND_INCREMENT_MANY_SCRIPT."""
+    epoch_time, window, *limits = map(int, args)
+    results = []
+    allowed = True
+    for index, key in enumerate(keys):
+        limit, burst_limit, number_of_bursts = limits[index * 3 : index * 3 + 3]
+        current_count, bursts = _scan(server, key, epoch_time, burst_limit, window)
+        if current_count > limit and bursts > number_of_bursts:
+            allowed = False
+        results += [current_count, bursts]
+
+    if allowed:
+        for key in keys:
+            _increment(server, key, epoch_time, window)
+    return results
+
+
+def _lua_arg(value: Any) -> str:
+    # Redis turns Lua numbers passed to redis.call into strings with %.17g.
+    return value if isinstance(value, str) else format(value, ".17g")
+
+
+def lua_script_handler(source: str) -> ScriptHandler:
+    """
+    Handler that runs the Lua `source` itself instead of a Python twin, in
+    lupa's Lua 5.1, the version Redis embeds. Only scripts returning an array
+    of numbers are supported, which covers the lookup store's. Needs lupa.
+    """
+    from lupa.lua51 import LuaRuntime
+
+    lua = LuaRuntime()
+
+    def handler(
+        server: InProcessRedisServer, keys: list[str], args: list[str]
+    ) -> list[int]:
+        def call(name: str, *call_args: Any) -> Any:
+            # The server lock is already held, so commands skip dispatch.
+            command = getattr(server, f"_cmd_{name.lower()}")
+            reply = command(*map(_lua_arg, call_args))
+            return lua.table_from(reply) if isinstance(reply, list) else reply
+
+        lua_globals = lua.globals()
+        lua_globals.KEYS = lua.table_from(keys)
+        lua_globals.ARGV = lua.table_from(args)
+        lua_globals.redis = lua.table_from({"call": call})
+        # Redis truncates Lua numbers in replies to integers.
+        return [int(value) for value in lua.execute(source).values()]
+
+    return handler
+
+
+class InProcessRedisServer:
+    """
+    Redis protocol stand-in for tests, served from a background thread.
+
+    Supports the hash, expiry and scripting commands the lookup store uses.
+    Scripts are emulated by Python handlers registered against the SHA1 of
+    their source, so no Lua interpreter is needed; lua_script_handler runs the
+    Lua itself where lupa is installed. Every command runs under one lock,
+    which gives scripts the same atomicity they have on a real server.
+    """
+
+    def __init__(self):
+        self.hashes: dict[str, dict[int, int]] = {}
+        self.expires_at: dict[str, float] = {}
+        self.known_scripts: dict[str, ScriptHandler] = {}
+        self.loaded_scripts: set[str] = set()
+        self.commands_processed = 0
+        self.lock = threading.Lock()
+        self.register_script(CHECK_AND_INCREMENT_SCRIPT, check_and_increment)
+        self.register_script(FETCH_AND_INCREMENT_SCRIPT, fetch_and_increment)
+        self.register_script(CHECK_AND_INCREMENT_MANY_SCRIPT, check_and_increment_many)
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                # Replies to a pipeline go out one by one, don't let Nagle hold
+                # them back waiting for an ACK.
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def handle(self):
+                while True:
+                    try:
+                        command = read_reply(self.rfile)
+                    except ConnectionError:
+                        return
+                    self.wfile.write(encode_reply(server.dispatch(command)))
+
+        self.tcp_server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.tcp_server.daemon_threads = True
+        self.host, self.port = self.tcp_server.server_address
+        self.thread = threading.Thread(
+            target=self.tcp_server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    def __enter__(self) -> InProcessRedisServer:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+
+    def register_script(self, source: str, handler: ScriptHandler) -> None:
+        self.known_scripts[hashlib.sha1(source.encode()).hexdigest()] = handler
+
+    def hash(self, key: str) -> dict[int, int]:
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.hashes.pop(key, None)
+            self.expires_at.pop(key, None)
+        return self.hashes.setdefault(key, {})
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.expires_at[key] = time.monotonic() + seconds
+
+    def dispatch(self, command: list[str]) -> Any:
+        name, args = command[0].upper(), command[1:]
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return RedisError(f"ERR unknown command '{name}'")
+        with self.lock:
+            self.commands_processed += 1
+            return handler(*args)
+
+    def _run_script(self, sha: str, numkeys: str, *rest: str) -> Any:
+        keys, args = list(rest[: int(numkeys)]), list(rest[int(numkeys) :])
+        return self.known_scripts[sha](self, keys, args)
+
+    def _cmd_ping(self) -> str:
+        return "PONG"
+
+    def _cmd_hgetall(self, key: str) -> list[str]:
+        return [str(v) for item in self.hash(key).items() for v in item]
+
+    def _cmd_hincrby(self, key: str, field: str, amount: str) -> int:
+        counts = self.hash(key)
+        counts[int(field)] = counts.get(int(field), 0) + int(amount)
+        return counts[int(field)]
+
+    def _cmd_hdel(self, key: str, *fields: str) -> int:
+        counts = self.hash(key)
+        return sum(counts.pop(int(field), None) is not None for field in fields)
+
+    def _cmd_expire(self, key: str, seconds: str) -> int:
+        self.expire(key, int(seconds))
+        return 1
+
+    def _cmd_ttl(self, key: str) -> int:
+        # Redis drops a hash once its last field is gone.
+        if not self.hash(key):
+            return -2
+        if key not in self.expires_at:
+            return -1
+        return int(self.expires_at[key] - time.monotonic())
+
+    def _cmd_script(self, subcommand: str, source: str) -> Any:
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        if subcommand.upper() != "LOAD" or sha not in self.known_scripts:
+            return RedisError("ERR script not supported by stand-in")
+        self.loaded_scripts.add(sha)
+        return sha
+
+    def _cmd_eval(self, source: str, *rest: str) -> Any:
+        sha = hashlib.sha1(source.encode()).hexdigest()
+        if sha not in self.known_scripts:
+            return RedisError("ERR script not supported by stand-in")
+        self.loaded_scripts.add(sha)
+        return self._run_script(sha, *rest)
+
+    def _cmd_evalsha(self, sha: str, *rest: str) -> Any:
+        if sha not in self.loaded_scripts:
+            return RedisError("NOSCRIPT No matching script. Please use EVAL.")
+        return self._run_script(sha, *rest)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from .lookup_store import (
+    BURST_WINDOW_IN_SECONDS,
+    LookupStore,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    RateLimitStore,
+    WindowCounts,
+    within_limits,
+)
+
+DEFAULT_FLUSH_INTERVAL_MS = 100
+
+# One grow-only counter per (key, second) bucket
+Bucket = tuple[RateLimiterKey, int]
+
+
+class ReplicationDelta(NamedTuple):
+    """
+    A region's own counts for the buckets it touched since its last flush.
+
+    These are totals, not increments, so applying the same delta twice or out
+    of order is harmless: merging takes the max per region.
+    """
+
+    region: str
+    counts: dict[Bucket, int]
+
+
+class RegionReplica:
+    """
+    Wraps a region's LookupStore and replicates its counts to other regions.
+
+    Every (key, second) bucket is a G-counter: a map of region -> count where
+    the global value is the sum. Requests are counted in the local store
+    straight away and the region's own entry grows with them. Every flush
+    interval the changed entries are sent as a ReplicationDelta. Peers merge
+    them with a per-region max and add whatever grew to their own store. So a
+    global API key is enforced across regions, lagging by at most one flush,
+    without a cross-region round trip per request.
+
+    The replica has the same interface as LookupStore, so it can be passed
+    straight to RateLimiter.
+    """
+
+    def __init__(
+        self,
+        region: str,
+        lookup_store: RateLimitStore | None = None,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+    ):
+        self.region = region
+        self.lookup_store = LookupStore() if lookup_store is None else lookup_store
+        self.flush_interval_ms = flush_interval_ms
+        self.counters: dict[Bucket, dict[str, int]] = defaultdict(dict)
+        self.dirty: set[Bucket] = set()
+        self.latest_epoch_time = 0
+        self.last_flush_ms = time.monotonic() * 1000
+
+    def _record(self, key: RateLimiterKey, epoch_time: int, amount: int) -> None:
+        bucket = (key, epoch_time)
+        counter = self.counters[bucket]
+        counter[self.region] = counter.get(self.region, 0) + amount
+        self.dirty.add(bucket)
+        self.latest_epoch_time = max(self.latest_epoch_time, epoch_time)
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        return self.lookup_store.get(api_key, api_route, limits)
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.increment_limit_count(api_key, api_route, epoch_time, 1, limits)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.lookup_store.increment_limit_count(
+            api_key, api_route, epoch_time, amount, limits
+        )
+        self._record(RateLimiterKey(api_key, api_route), epoch_time, amount)
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        counts = self.lookup_store.fetch_and_increment(api_key, api_route, epoch_time)
+        self._record(RateLimiterKey(api_key, api_route), epoch_time, 1)
+        return counts
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        results = self.lookup_store.fetch_and_increment_many(keys, epoch_time, limits)
+        for key in keys:
+            self._record(key, epoch_time, 1)
+        return results
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        results = self.lookup_store.check_and_increment_many(keys, epoch_time, limits)
+        if all(map(within_limits, results, limits)):
+            for key in keys:
+                self._record(key, epoch_time, 1)
+        return results
+
+    def global_count(self, api_key: str, api_route: str, epoch_time: int) -> int:
+        """Sum of every region's count for the bucket, as known locally."""
+        counter = self.counters.get((RateLimiterKey(api_key, api_route), epoch_time))
+        return sum(counter.values()) if counter else 0
+
+    def flush(self) -> ReplicationDelta:
+        """Take this region's entries for every bucket changed since last flush."""
+        delta = ReplicationDelta(
+            self.region,
+            {
+                bucket: self.counters[bucket][self.region]
+                for bucket in sorted(self.dirty, key=lambda bucket: bucket[1])
+            },
+        )
+        self.dirty.clear()
+        self.last_flush_ms = time.monotonic() * 1000
+        self._prune()
+        return delta
+
+    def maybe_flush(self, now_ms: float | None = None) -> ReplicationDelta | None:
+        """Flush if the interval has passed since the last flush."""
+        if now_ms is None:
+            now_ms = time.monotonic() * 1000
+        if now_ms - self.last_flush_ms < self.flush_interval_ms:
+            return None
+        return self.flush()
+
+    def merge(self, delta: ReplicationDelta) -> None:
+        if delta.region == self.region:
+            return
+        window_start = self.latest_epoch_time - BURST_WINDOW_IN_SECONDS
+        # Oldest second first, so a store's bursts are recorded in order.
+        buckets = sorted(delta.counts.items(), key=lambda item: item[0][1])
+        for (key, epoch_time), count in buckets:
+            if epoch_time < window_start:
+                # Already pruned here, and no longer matters for any decision.
+                continue
+            counter = self.counters[(key, epoch_time)]
+            growth = count - counter.get(delta.region, 0)
+            if growth > 0:
+                counter[delta.region] = count
+                self.lookup_store.increment_limit_count(
+                    key.api_key, key.api_route, epoch_time, growth
+                )
+
+    def _prune(self) -> None:
+        window_start = self.latest_epoch_time - BURST_WINDOW_IN_SECONDS
+        expired = [bucket for bucket in self.counters if bucket[1] < window_start]
+        for bucket in expired:
+            del self.counters[bucket]
+
+
+class ReplicationBus:
+    """In-process fan out of deltas between replicas, standing in for the network."""
+
+    def __init__(self, replicas: Sequence[RegionReplica]):
+        self.replicas = tuple(replicas)
+
+    def publish(self, delta: ReplicationDelta) -> None:
+        for replica in self.replicas:
+            replica.merge(delta)
+
+    def tick(self, now_ms: float | None = None) -> None:
+        """Give every replica the chance to flush on its own schedule."""
+        for replica in self.replicas:
+            delta = replica.maybe_flush(now_ms)
+            if delta is not None and delta.counts:
+                self.publish(delta)
+
+    def flush_all(self) -> None:
+        for replica in self.replicas:
+            self.publish(replica.flush())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .api_rate_limiter import ApiData
+
+# Every raw path that matches no template is counted under this one route, so
+# junk paths cannot grow the number of keys in the LookupStore.
+UNMATCHED_ROUTE = "/:unmatched"
+DEFAULT_CACHE_SIZE = 4096
+
+
+class _TrieNode:
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.param: _TrieNode | None = None
+        self.template: str | None = None
+
+
+def _segments(path: str) -> list[str]:
+    path = path.split("?", 1)[0].split("#", 1)[0]
+    return [segment for segment in path.split("/") if segment]
+
+
+class RouteNormalizer:
+    """
+    Maps raw request paths to their registered route template, e.g.
+    '/users/123/orders/9' -> '/users/:id/orders/:order_id'.
+
+    Templates are compiled into a trie with one level per path segment, so a
+    lookup costs time proportional to the path depth rather than one regex per
+    template. Literal segments win over parameters, so '/users/me' can be
+    registered alongside '/users/:id'. Results for hot raw paths are kept in
+    an LRU cache.
+    """
+
+    def __init__(
+        self, templates: Iterable[str] = (), cache_size: int = DEFAULT_CACHE_SIZE
+    ):
+        self.root = _TrieNode()
+        self.normalize = lru_cache(maxsize=cache_size)(self._match)
+        for template in templates:
+            self.add_template(template)
+
+    def add_template(self, template: str) -> None:
+        node = self.root
+        for segment in _segments(template):
+            if segment.startswith(":"):
+                if node.param is None:
+                    node.param = _TrieNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _TrieNode())
+        node.template = "/" + "/".join(_segments(template))
+        # New templates can change earlier answers.
+        self.normalize.cache_clear()
+
+    def _match(self, path: str) -> str:
+        template = self._walk(self.root, _segments(path), 0)
+        return UNMATCHED_ROUTE if template is None else template
+
+    def _walk(self, node: _TrieNode, segments: list[str], depth: int) -> str | None:
+        if depth == len(segments):
+            return node.template
+        child = node.children.get(segments[depth])
+        if child is not None:
+            template = self._walk(child, segments, depth + 1)
+            if template is not None:
+                return template
+        # Only fall back to the parameter branch when the literal one fails.
+        if node.param is not None:
+            return self._walk(node.param, segments, depth + 1)
+        return None
+
+    def normalize_api_data(self, api_data: ApiData) -> ApiData:
+        return api_data._replace(api_route=self.normalize(api_data.api_route))
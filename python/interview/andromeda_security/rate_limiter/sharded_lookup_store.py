@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator, Sequence
+from contextlib import ExitStack
+
+from .lookup_store import (
+    DEFAULT_RATE_LIMITS,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    WindowCounts,
+    within_limits,
+)
+
+DEFAULT_NUMBER_OF_STRIPES = 64
+
+
+class _Stripe:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: dict[RateLimiterKey, RateLimiterData] = {}
+
+
+class ShardedLookupStore:
+    """
+    Thread safe LookupStore using lock striping.
+
+    Keys are spread over a fixed number of stripes by hash, and each stripe
+    has its own lock and dict. Threads working on keys in different stripes
+    never wait on each other, and there is no store-wide lock.
+    """
+
+    def __init__(self, number_of_stripes: int = DEFAULT_NUMBER_OF_STRIPES):
+        if number_of_stripes < 1:
+            raise ValueError("number_of_stripes must be at least 1")
+        self.stripes = tuple(_Stripe() for _ in range(number_of_stripes))
+
+    def _stripe_for(self, key: RateLimiterKey) -> _Stripe:
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        """
+        Snapshot of the key's data, copied under the stripe lock so it never
+        changes under the caller. Check and count in one step with
+        fetch_and_increment; a get followed by an increment is not atomic.
+        """
+        key = RateLimiterKey(api_key, api_route)
+        stripe = self._stripe_for(key)
+        with stripe.lock:
+            return self._data_for(key, limits).copy()
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.increment_limit_count(api_key, api_route, epoch_time, 1, limits)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        key = RateLimiterKey(api_key, api_route)
+        with self._stripe_for(key).lock:
+            self._data_for(key, limits).increment(epoch_time, amount)
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        key = RateLimiterKey(api_key, api_route)
+        with self._stripe_for(key).lock:
+            return self._data_for(key, None).fetch_and_increment(epoch_time)
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """Update several keys as one atomic step."""
+        with self._locked(keys):
+            return [
+                self._data_for(key, key_limits).fetch_and_increment(epoch_time)
+                for key, key_limits in zip(keys, limits)
+            ]
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        """
+        Like fetch_and_increment_many, but the keys are only counted if every
+        one of them is within its limits. Check and count are one atomic step.
+        """
+        with self._locked(keys):
+            all_data = [
+                self._data_for(key, key_limits) for key, key_limits in zip(keys, limits)
+            ]
+            results = [data.window_counts(epoch_time) for data in all_data]
+            if all(map(within_limits, results, limits)):
+                for data in all_data:
+                    data.increment(epoch_time)
+            return results
+
+    def _locked(self, keys: Sequence[RateLimiterKey]) -> ExitStack:
+        """
+        Lock every stripe involved up front, always in stripe order, so two
+        batches touching the same stripes cannot deadlock.
+        """
+        with ExitStack() as stack:
+            for index in sorted({hash(key) % len(self.stripes) for key in keys}):
+                stack.enter_context(self.stripes[index].lock)
+            return stack.pop_all()
+
+    def _data_for(
+        self, key: RateLimiterKey, limits: RateLimits | None
+    ) -> RateLimiterData:
+        """Find or create the key's data, on `limits` if given. Call locked."""
+        stripe = self._stripe_for(key)
+        data = stripe.data.get(key)
+        if data is None:
+            data = stripe.data[key] = RateLimiterData(
+                DEFAULT_RATE_LIMITS if limits is None else limits
+            )
+        elif limits is not None and data.limits is not limits:
+            data.limits = limits
+        return data
+
+    def restore(self, key: RateLimiterKey, data: RateLimiterData) -> None:
+        stripe = self._stripe_for(key)
+        with stripe.lock:
+            stripe.data[key] = data
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, RateLimiterKey):
+            return False
+        return key in self._stripe_for(key).data
+
+    def __len__(self) -> int:
+        return sum(len(stripe.data) for stripe in self.stripes)
+
+    def __iter__(self) -> Iterator[RateLimiterKey]:
+        for stripe in self.stripes:
+            with stripe.lock:
+                keys = list(stripe.data)
+            yield from keys
@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import sys
+from collections.abc import Sequence
+from multiprocessing import resource_tracker, shared_memory, synchronize
+from typing import Any
+
+from .compact_lookup_store import DEFAULT_TRACKED_BURSTS
+from .lookup_store import (
+    BURST_WINDOW_IN_SECONDS,
+    DEFAULT_RATE_LIMITS,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+    WindowCounts,
+    within_limits,
+)
+
+DEFAULT_CAPACITY = 1 << 16
+MAGIC = 0x524C534D  # "RLSM"
+
+# Header, as uint32 words: magic, capacity, tracked bursts, keys in use.
+HEADER_WORDS = 4
+# Slot, as uint32 words after the 64 bit key fingerprint (words 0 and 1):
+EPOCH_TIME, COUNT = 2, 3
+LIMIT_PER_SECOND, BURST_LIMIT_PER_SECOND, NUMBER_OF_BURSTS = 4, 5, 6
+BURST_EPOCH_TIMES = 7
+
+
+class SharedTableFullError(RuntimeError):
+    pass
+
+
+def fingerprint(api_key: str, api_route: str) -> int:
+    """
+    64 bit key hash that is the same in every process, unlike hash().
+
+    Zero marks an empty slot, so it is never returned.
+    """
+    digest = hashlib.blake2b(f"{api_key}\0{api_route}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedMemoryLookupStore:
+    """
+    LookupStore shared by the worker processes on a host.
+
+    The counters live in a `multiprocessing.shared_memory` block laid out as a
+    fixed size open addressing hash table with linear probing. Each slot holds
+    a 64 bit fingerprint of the key and then, like CompactLookupStore, the
+    current second and its count, the key's limits and its newest bursting
+    seconds, all as uint32. So every worker enforces one shared limit per
+    key, without a network hop.
+
+    Create the store in the parent before forking workers, and either let
+    them inherit it or pass it to Process; it pickles to its shared memory
+    name and lock. Only the creating process should call `unlink`.
+
+    Every operation runs under one cross-process lock. Probing can cross any
+    stripe boundary, so striping would need a lock per probe step; a single
+    lock held for a few microseconds is simpler and is not the bottleneck
+    next to a request. Slots of keys idle for a whole window are reused by new
+    keys, so the table only fills up if more keys than `capacity` are active
+    within one window; past that SharedTableFullError is raised.
+
+    Keys are only kept as fingerprints, so a collision between two keys is
+    possible but at 64 bits negligible, and the store cannot list its keys.
+    """
+
+    def __init__(
+        self,
+        name: str | None = None,
+        capacity: int = DEFAULT_CAPACITY,
+        tracked_bursts: int = DEFAULT_TRACKED_BURSTS,
+        lock: synchronize.Lock | None = None,
+    ):
+        self.owner = name is None
+        if self.owner:
+            if capacity < 1:
+                raise ValueError("capacity must be at least 1")
+            # Round slots up to whole 64 bit words, so fingerprints stay aligned.
+            slot_words = BURST_EPOCH_TIMES + tracked_bursts
+            slot_words += slot_words % 2
+            self.shared_memory = shared_memory.SharedMemory(
+                create=True, size=4 * (HEADER_WORDS + capacity * slot_words)
+            )
+            # New shared memory is zero filled, so every slot starts empty.
+            words = self.shared_memory.buf.cast("I")
+            words[0], words[1], words[2] = MAGIC, capacity, tracked_bursts
+            words.release()
+        elif sys.version_info >= (3, 13):
+            # Attaching registers the block with this process's resource
+            # tracker, which would unlink it when the process exits.
+            self.shared_memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # No `track` before 3.13, so undo the registration instead.
+            # `_name` is the name as registered, with its leading slash.
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shared_memory._name, "shared_memory")
+        self.lock = multiprocessing.Lock() if lock is None else lock
+
+        self.words = self.shared_memory.buf.cast("I")
+        if self.words[0] != MAGIC:
+            raise ValueError(f"{self.shared_memory.name} is not a rate limiter table")
+        self.capacity = self.words[1]
+        self.tracked_bursts = self.words[2]
+        self.slot_words = BURST_EPOCH_TIMES + self.tracked_bursts
+        self.slot_words += self.slot_words % 2
+        self.fingerprints = self.shared_memory.buf.cast("Q")
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"name": self.name, "lock": self.lock}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["name"], lock=state["lock"])
+
+    def close(self) -> None:
+        self.words.release()
+        self.fingerprints.release()
+        self.shared_memory.close()
+
+    def unlink(self) -> None:
+        self.shared_memory.unlink()
+
+    def _base(self, slot: int) -> int:
+        return HEADER_WORDS + slot * self.slot_words
+
+    def _find(self, key_fingerprint: int) -> int | None:
+        """Slot holding the key, or None. Call with the lock held."""
+        slot = key_fingerprint % self.capacity
+        for _ in range(self.capacity):
+            stored = self.fingerprints[self._base(slot) // 2]
+            if stored == key_fingerprint:
+                return slot
+            if stored == 0:
+                return None
+            slot = (slot + 1) % self.capacity
+        return None
+
+    def _slot(
+        self,
+        key_fingerprint: int,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> int:
+        """Find or claim the key's slot. Call with the lock held."""
+        words = self.words
+        window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+        slot = key_fingerprint % self.capacity
+        reusable = None
+        for _ in range(self.capacity):
+            base = self._base(slot)
+            stored = self.fingerprints[base // 2]
+            if stored == key_fingerprint:
+                if limits is not None:
+                    self._set_limits(base, limits)
+                return slot
+            if stored == 0:
+                break
+            if reusable is None and words[base + EPOCH_TIME] < window_start:
+                # Idle for a whole window, so nothing in it counts any more.
+                reusable = slot
+            slot = (slot + 1) % self.capacity
+        else:
+            if reusable is None:
+                raise SharedTableFullError(
+                    f"all {self.capacity} slots are in use within the window"
+                )
+
+        if reusable is not None:
+            slot = reusable
+        else:
+            words[3] += 1
+        base = self._base(slot)
+        words[base + EPOCH_TIME] = 0
+        words[base + COUNT] = 0
+        for offset in range(self.tracked_bursts):
+            words[base + BURST_EPOCH_TIMES + offset] = 0
+        self._set_limits(base, limits or DEFAULT_RATE_LIMITS)
+        # Claimed last, once the slot is ready.
+        self.fingerprints[base // 2] = key_fingerprint
+        return slot
+
+    def _set_limits(self, base: int, limits: RateLimits) -> None:
+        words = self.words
+        words[base + LIMIT_PER_SECOND] = limits.limit_per_second
+        words[base + BURST_LIMIT_PER_SECOND] = limits.burst_limit_per_second
+        words[base + NUMBER_OF_BURSTS] = limits.number_of_bursts
+
+    def _limits(self, base: int) -> RateLimits:
+        words = self.words
+        limits = RateLimits(
+            words[base + LIMIT_PER_SECOND],
+            words[base + BURST_LIMIT_PER_SECOND],
+            words[base + NUMBER_OF_BURSTS],
+        )
+        # Keys on the default plan share the one RateLimits, as elsewhere.
+        return DEFAULT_RATE_LIMITS if limits == DEFAULT_RATE_LIMITS else limits
+
+    def _bursts_in_window(self, base: int, epoch_time: int) -> int:
+        words = self.words
+        window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+        bursts = 0
+        start = base + BURST_EPOCH_TIMES
+        for burst_epoch_time in words[start : start + self.tracked_bursts]:
+            if burst_epoch_time < window_start or burst_epoch_time == 0:
+                break
+            if burst_epoch_time <= epoch_time:
+                bursts += 1
+        return bursts
+
+    def _count(self, base: int, epoch_time: int) -> int:
+        words = self.words
+        return words[base + COUNT] if words[base + EPOCH_TIME] == epoch_time else 0
+
+    def _increment(self, base: int, epoch_time: int, amount: int) -> None:
+        words = self.words
+        current_epoch_time = words[base + EPOCH_TIME]
+        if epoch_time < current_epoch_time:
+            return
+        if epoch_time > current_epoch_time:
+            words[base + EPOCH_TIME] = epoch_time
+            words[base + COUNT] = 0
+        count = words[base + COUNT] + amount
+        words[base + COUNT] = count
+
+        burst_limit = words[base + BURST_LIMIT_PER_SECOND]
+        if count - amount < burst_limit <= count:
+            # Newest first: shift the older bursts along and drop the oldest.
+            start = base + BURST_EPOCH_TIMES
+            for index in range(start + self.tracked_bursts - 1, start, -1):
+                words[index] = words[index - 1]
+            words[start] = epoch_time
+
+    def get(
+        self, api_key: str, api_route: str, limits: RateLimits | None = None
+    ) -> RateLimiterData:
+        """
+        A RateLimiterData snapshot of the key, holding the current second's
+        count and the tracked bursts. Writes to it do not reach the store.
+        """
+        with self.lock:
+            slot = self._find(fingerprint(api_key, api_route))
+            if slot is None:
+                return RateLimiterData(
+                    DEFAULT_RATE_LIMITS if limits is None else limits
+                )
+            base = self._base(slot)
+            if limits is not None:
+                self._set_limits(base, limits)
+            words = self.words
+            data = RateLimiterData(self._limits(base))
+            if words[base + EPOCH_TIME]:
+                data.api_counts_by_epoch_time[words[base + EPOCH_TIME]] = words[
+                    base + COUNT
+                ]
+            start = base + BURST_EPOCH_TIMES
+            data.burst_epoch_times = sorted(
+                burst_epoch_time
+                for burst_epoch_time in words[start : start + self.tracked_bursts]
+                if burst_epoch_time
+            )
+            return data
+
+    def increment_limit_count_by_one(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        self.increment_limit_count(api_key, api_route, epoch_time, 1, limits)
+
+    def increment_limit_count(
+        self,
+        api_key: str,
+        api_route: str,
+        epoch_time: int,
+        amount: int,
+        limits: RateLimits | None = None,
+    ) -> None:
+        key_fingerprint = fingerprint(api_key, api_route)
+        with self.lock:
+            base = self._base(self._slot(key_fingerprint, epoch_time, limits))
+            self._increment(base, epoch_time, amount)
+
+    def fetch_and_increment(
+        self, api_key: str, api_route: str, epoch_time: int
+    ) -> WindowCounts:
+        key_fingerprint = fingerprint(api_key, api_route)
+        with self.lock:
+            base = self._base(self._slot(key_fingerprint, epoch_time))
+            counts = WindowCounts(
+                self._count(base, epoch_time), self._bursts_in_window(base, epoch_time)
+            )
+            self._increment(base, epoch_time, 1)
+            return counts
+
+    def fetch_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        key_fingerprints = [fingerprint(*key) for key in keys]
+        results = []
+        with self.lock:
+            for key_fingerprint, key_limits in zip(key_fingerprints, limits):
+                base = self._base(self._slot(key_fingerprint, epoch_time, key_limits))
+                results.append(
+                    WindowCounts(
+                        self._count(base, epoch_time),
+                        self._bursts_in_window(base, epoch_time),
+                    )
+                )
+                self._increment(base, epoch_time, 1)
+        return results
+
+    def check_and_increment_many(
+        self,
+        keys: Sequence[RateLimiterKey],
+        epoch_time: int,
+        limits: Sequence[RateLimits],
+    ) -> list[WindowCounts]:
+        key_fingerprints = [fingerprint(*key) for key in keys]
+        with self.lock:
+            bases = []
+            for key_fingerprint, key_limits in zip(key_fingerprints, limits):
+                base = self._base(self._slot(key_fingerprint, epoch_time, key_limits))
+                # Move a newly claimed slot onto this second without counting,
+                # so the next key's probe does not take it for an idle one.
+                self._increment(base, epoch_time, 0)
+                bases.append(base)
+            results = [
+                WindowCounts(
+                    self._count(base, epoch_time),
+                    self._bursts_in_window(base, epoch_time),
+                )
+                for base in bases
+            ]
+            if all(map(within_limits, results, limits)):
+                for base in bases:
+                    self._increment(base, epoch_time, 1)
+        return results
+
+    def __len__(self) -> int:
+        """Slots claimed so far, including ones idle long enough to reuse."""
+        return self.words[3]
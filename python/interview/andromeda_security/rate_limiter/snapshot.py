@@ -0,0 +1,234 @@
+"""
+Binary snapshots of a store's live counters, for warm restarts.
+
+File layout, all little endian:
+
+    header   magic (8s) | format version (I) | key count (I) | epoch time (q)
+    per key  api_key length (H) | api_route length (H)
+             limit_per_second (I) | burst_limit_per_second (I)
+             number_of_bursts (I) | count entries (B) | burst entries (B)
+             api_key and api_route as UTF-8
+             per count entry: seconds before the header time (B) | count (I)
+             per burst entry: seconds before the header time (B)
+
+Only seconds inside the burst window are written, so every time fits in one
+byte as an offset from the snapshot time, and keys idle for a whole window
+are left out. A key with a few live seconds takes a few dozen bytes.
+
+Redis keeps its own state across restarts (RDB/AOF), so this is for the
+in-process stores.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from .lookup_store import (
+    BURST_WINDOW_IN_SECONDS,
+    DEFAULT_RATE_LIMITS,
+    RateLimiterData,
+    RateLimiterKey,
+    RateLimits,
+)
+
+MAGIC = b"RLSNAP\x00\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIq")
+RECORD = struct.Struct("<HHIIIBB")
+COUNT_ENTRY = struct.Struct("<BI")
+BURST_ENTRY = struct.Struct("<B")
+DEFAULT_SNAPSHOT_INTERVAL_SECONDS = 5.0
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _encode(key: RateLimiterKey, data: RateLimiterData, epoch_time: int) -> bytes:
+    window_start = epoch_time - BURST_WINDOW_IN_SECONDS
+    # `data` can be live and written to meanwhile: a slot that rolls over
+    # between listing and reading the seconds reads as 0 and is left out.
+    counter = data.api_counts_by_epoch_time
+    counts = []
+    for second in list(counter):
+        if window_start <= second <= epoch_time:
+            count = counter.count(second)
+            if count:
+                counts.append((epoch_time - second, count))
+    bursts = [
+        epoch_time - second
+        for second in data.burst_epoch_times.copy()
+        if window_start <= second <= epoch_time
+    ]
+    if not counts and not bursts:
+        return b""
+    api_key = key.api_key.encode()
+    api_route = key.api_route.encode()
+    return b"".join(
+        (
+            RECORD.pack(
+                len(api_key), len(api_route), *data.limits, len(counts), len(bursts)
+            ),
+            api_key,
+            api_route,
+            *(COUNT_ENTRY.pack(*entry) for entry in counts),
+            *(BURST_ENTRY.pack(offset) for offset in bursts),
+        )
+    )
+
+
+def write_snapshot(store: Any, path: str | Path, epoch_time: int) -> int:
+    """
+    Write every key with counts in the window ending at `epoch_time`.
+
+    The file is written next to `path` and renamed over it, so a crash part
+    way through leaves the previous snapshot intact. The store keeps serving
+    while the snapshot is taken; each key is read as it is at that moment,
+    and keys added after the snapshot starts may be left out. Returns the
+    number of keys written.
+    """
+    records = []
+    for key in list(store):
+        record = _encode(key, store.get(*key), epoch_time)
+        if record:
+            records.append(record)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(records), epoch_time))
+        file.write(b"".join(records))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+    return len(records)
+
+
+def restore_snapshot(store: Any, path: str | Path) -> int:
+    """
+    Load a snapshot into `store` through its `restore` method.
+
+    The file is memory mapped and decoded in place, without reading it into
+    a buffer first. Seconds that have left the window since the snapshot was
+    taken age out on their own, exactly as they would have without the
+    restart. Returns the number of keys restored.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < HEADER.size:
+            raise SnapshotError(f"{path} is too short to be a snapshot")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _restore(store, buffer, path)
+
+
+def _restore(store: Any, buffer: mmap.mmap, path: str | Path) -> int:
+    magic, version, key_count, epoch_time = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise SnapshotError(f"{path} is not a version {FORMAT_VERSION} snapshot")
+
+    # Equal limits share one RateLimits, like keys on the default plan do.
+    shared_limits = {DEFAULT_RATE_LIMITS: DEFAULT_RATE_LIMITS}
+    unpack_record = RECORD.unpack_from
+    size = len(buffer)
+    offset = HEADER.size
+    try:
+        for _ in range(key_count):
+            record = unpack_record(buffer, offset)
+            key_end = offset + RECORD.size + record[0]
+            route_end = key_end + record[1]
+            api_key = buffer[offset + RECORD.size : key_end].decode()
+            api_route = buffer[key_end:route_end].decode()
+            offset = route_end
+
+            limit_values = record[2:5]
+            limits = shared_limits.get(limit_values)
+            if limits is None:
+                limits = RateLimits(*limit_values)
+                shared_limits[limits] = limits
+            data = RateLimiterData(limits)
+            counts_end = offset + record[5] * COUNT_ENTRY.size
+            counter = data.api_counts_by_epoch_time
+            for seconds_ago, count in COUNT_ENTRY.iter_unpack(
+                buffer[offset:counts_end]
+            ):
+                counter[epoch_time - seconds_ago] = count
+            offset = counts_end
+            if record[6]:
+                bursts_end = offset + record[6] * BURST_ENTRY.size
+                # Written oldest first, so already in the order the store keeps.
+                data.burst_epoch_times = [
+                    epoch_time - seconds_ago
+                    for seconds_ago in buffer[offset:bursts_end]
+                ]
+                offset = bursts_end
+            if offset > size:
+                raise SnapshotError(f"{path} is truncated")
+
+            store.restore(RateLimiterKey(api_key, api_route), data)
+    except (struct.error, UnicodeDecodeError) as error:
+        raise SnapshotError(f"{path} is truncated or corrupt") from error
+    return key_count
+
+
+class Snapshotter:
+    """
+    Takes a snapshot of `store` every `interval_seconds` in a background thread.
+
+    On startup call `restore` before serving traffic, then `start`. A missing
+    snapshot file just means a cold start.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        path: str | Path,
+        interval_seconds: float = DEFAULT_SNAPSHOT_INTERVAL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self.snapshots_taken = 0
+        self.snapshot_errors = 0
+        self._stop_snapshotting = threading.Event()
+        self._snapshotter: threading.Thread | None = None
+
+    def restore(self) -> int:
+        try:
+            return restore_snapshot(self.store, self.path)
+        except FileNotFoundError:
+            return 0
+
+    def snapshot(self) -> int:
+        keys = write_snapshot(self.store, self.path, int(self.clock()))
+        self.snapshots_taken += 1
+        return keys
+
+    def start(self) -> None:
+        self._stop_snapshotting.clear()
+        self._snapshotter = threading.Thread(
+            target=self._snapshot_until_stopped, daemon=True
+        )
+        self._snapshotter.start()
+
+    def stop(self) -> None:
+        """Stop the thread and take one last snapshot."""
+        self._stop_snapshotting.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+            self._snapshotter = None
+        self.snapshot()
+
+    def _snapshot_until_stopped(self) -> None:
+        while not self._stop_snapshotting.wait(self.interval_seconds):
+            try:
+                self.snapshot()
+            except Exception:
+                # Keep the last good snapshot and try again next interval; the
+                # thread must outlive any one failed snapshot.
+                self.snapshot_errors += 1
@@ -0,0 +1,105 @@
+import pytest
+from .algorithms import (
+    DEFAULT_GCRA_BURST,
+    GCRA_EVICTION_INTERVAL_IN_SECONDS,
+    FixedWindowAlgorithm,
+    GcraAlgorithm,
+)
+from .api_rate_limiter import ApiData, RateLimiter
+from .lookup_store import DEFAULT_LIMIT_PER_SECOND
+
+
+class TestGcraAlgorithm:
+    @pytest.fixture
+    def rate_limiter(self):
+        return RateLimiter(algorithm=GcraAlgorithm(limit_per_second=10, burst=5))
+
+    def send(self, rate_limiter, api_data):
+        allowed = rate_limiter.is_request_allowed(api_data)
+        rate_limiter.increase_incoming_request_count(api_data)
+        return allowed
+
+    def test_rejects_zero_rate(self):
+        with pytest.raises(ValueError):
+            GcraAlgorithm(limit_per_second=0)
+
+    def test_allows_burst_then_rejects(self, rate_limiter):
+        api_data = ApiData("test_key", "/test", 1000)
+        results = [self.send(rate_limiter, api_data) for _ in range(10)]
+        # One request for "now" plus a burst of five.
+        assert results == [True] * 6 + [False] * 4
+
+    def test_refills_at_average_rate(self):
+        rate_limiter = RateLimiter(
+            algorithm=GcraAlgorithm(limit_per_second=10, burst=20)
+        )
+        for _ in range(30):
+            self.send(rate_limiter, ApiData("test_key", "/test", 1000))
+
+        # The burst was used up, so the next second only gets the average rate.
+        api_data = ApiData("test_key", "/test", 1001)
+        results = [self.send(rate_limiter, api_data) for _ in range(30)]
+        assert results.count(True) == 10
+
+    def test_keys_are_independent(self, rate_limiter):
+        for _ in range(10):
+            self.send(rate_limiter, ApiData("test_key", "/test", 1000))
+        assert self.send(rate_limiter, ApiData("other_key", "/test", 1000)) is True
+
+    def test_one_int_per_key(self, rate_limiter):
+        for i in range(5):
+            self.send(rate_limiter, ApiData(f"key_{i}", "/test", 1000))
+        state = rate_limiter.algorithm.theoretical_arrival_times
+        assert len(state) == 5
+        assert all(isinstance(tat, int) for tat in state.values())
+
+    def test_keys_past_their_tat_are_evicted(self, rate_limiter):
+        for i in range(100):
+            self.send(rate_limiter, ApiData(f"key_{i}", "/test", 1000))
+        self.send(rate_limiter, ApiData("key_0", "/test", 1001))
+
+        later = 1000 + GCRA_EVICTION_INTERVAL_IN_SECONDS
+        assert self.send(rate_limiter, ApiData("other_key", "/test", later))
+        assert list(rate_limiter.algorithm.theoretical_arrival_times) == [
+            ("other_key", "/test")
+        ]
+
+    def test_per_second_and_burst_limits(self, rate_limiter):
+        api_data = ApiData("test_key", "/test", 1000)
+        under_limits = []
+        for _ in range(7):
+            under_limits.append(
+                (
+                    rate_limiter.is_request_under_per_second_limit(api_data),
+                    rate_limiter.is_request_under_burstable_limit(api_data),
+                )
+            )
+            self.send(rate_limiter, api_data)
+        # Only the first request fits the average rate, the burst pool of
+        # five covers the next five.
+        assert under_limits == [(True, True)] + [(False, True)] * 5 + [(False, False)]
+        # A tenth of a second per request at 10 per second, so a second later
+        # the pool has refilled and the rate alone allows a request again.
+        later = api_data._replace(epoch_time=1001)
+        assert rate_limiter.is_request_under_per_second_limit(later)
+
+    def test_default_burst_covers_fixed_window_bursts(self):
+        rate_limiter = RateLimiter(algorithm=GcraAlgorithm())
+        api_data = ApiData("test_key", "/test", 1000)
+        results = [self.send(rate_limiter, api_data) for _ in range(500)]
+        assert results.count(True) == DEFAULT_GCRA_BURST + 1
+
+
+class TestFixedWindowAlgorithm:
+    def test_is_default_algorithm(self):
+        rate_limiter = RateLimiter()
+        assert isinstance(rate_limiter.algorithm, FixedWindowAlgorithm)
+        assert rate_limiter.algorithm.lookup_store is rate_limiter.lookup_store
+
+    def test_per_second_limit(self):
+        algorithm = FixedWindowAlgorithm()
+        api_data = ApiData("test_key", "/test", 1000)
+        for _ in range(DEFAULT_LIMIT_PER_SECOND + 1):
+            algorithm.increase_incoming_request_count(api_data)
+        data = algorithm.lookup_store.get("test_key", "/test")
+        assert data.api_counts_by_epoch_time[1000] == DEFAULT_LIMIT_PER_SECOND + 1
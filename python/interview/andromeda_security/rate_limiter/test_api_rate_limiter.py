@@ -1,9 +1,11 @@
 import pytest
+from .algorithms import FixedWindowAlgorithm, GcraAlgorithm, RateLimitDecision
 from .api_rate_limiter import RateLimiter, ApiData
 from .lookup_store import (
     DEFAULT_LIMIT_PER_SECOND,
     DEFAULT_BURST_LIMIT_PER_SECOND,
     DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    LookupStore,
 )
 
 
@@ -185,3 +187,76 @@ class TestRateLimiter:
         # Should be blocked
         api_data = ApiData(api_key=api_key, api_route=api_route, epoch_time=new_epoch)
         assert rate_limiter.is_request_allowed(api_data) is False
+
+    def test_rejects_lookup_store_with_explicit_algorithm(self):
+        with pytest.raises(ValueError):
+            RateLimiter(LookupStore(), algorithm=GcraAlgorithm())
+        lookup_store = LookupStore()
+        rate_limiter = RateLimiter(algorithm=FixedWindowAlgorithm(lookup_store))
+        rate_limiter.increase_incoming_request_count(ApiData("abc", "/test", 1000))
+        assert len(lookup_store) == 1
+
+
+class TestAcquire:
+    @pytest.fixture
+    def traffic(self):
+        """A minute and a bit of traffic with bursts in the first few seconds."""
+        requests = []
+        for epoch_time in range(1000, 1065):
+            per_second = DEFAULT_BURST_LIMIT_PER_SECOND + 1 if epoch_time < 1004 else 3
+            requests.extend(
+                ApiData(api_key="test_key", api_route="/test", epoch_time=epoch_time)
+                for _ in range(per_second)
+            )
+        return requests
+
+    @pytest.mark.parametrize(
+        "make_algorithm", [FixedWindowAlgorithm, GcraAlgorithm], ids=["fixed", "gcra"]
+    )
+    def test_acquire_matches_check_then_increment(self, traffic, make_algorithm):
+        two_calls = RateLimiter(algorithm=make_algorithm())
+        single_call = RateLimiter(algorithm=make_algorithm())
+
+        for api_data in traffic:
+            expected = two_calls.is_request_allowed(api_data)
+            two_calls.increase_incoming_request_count(api_data)
+            assert single_call.acquire(api_data).allowed is expected
+
+    def test_acquire_uses_a_single_lookup(self):
+        class CountingLookupStore(LookupStore):
+            lookups = 0
+
+            def get(self, api_key, api_route):
+                self.lookups += 1
+                return super().get(api_key, api_route)
+
+        lookup_store = CountingLookupStore()
+        rate_limiter = RateLimiter(lookup_store)
+        rate_limiter.acquire(ApiData("test_key", "/test", 1000))
+        assert lookup_store.lookups == 1
+
+    def test_acquire_reports_quota(self):
+        rate_limiter = RateLimiter()
+        api_data = ApiData("test_key", "/test", 1000)
+
+        decision = rate_limiter.acquire(api_data)
+        assert decision == RateLimitDecision(
+            allowed=True,
+            remaining_per_second=DEFAULT_LIMIT_PER_SECOND,
+            remaining_bursts=DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+            retry_after_seconds=0,
+        )
+
+        for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND):
+            decision = rate_limiter.acquire(api_data)
+        assert decision.remaining_per_second == 0
+        assert decision.remaining_bursts == DEFAULT_NUMBER_OF_BURST_PER_MINUTE - 1
+
+    def test_rejection_has_retry_after(self, traffic):
+        rate_limiter = RateLimiter()
+        decisions = [rate_limiter.acquire(api_data) for api_data in traffic]
+        rejected = [decision for decision in decisions if not decision.allowed]
+
+        assert rejected
+        assert all(decision.retry_after_seconds == 1 for decision in rejected)
+        assert all(decision.remaining_bursts == 0 for decision in rejected)
@@ -0,0 +1,207 @@
+import asyncio
+import sqlite3
+
+from .api_rate_limiter import ApiData, RateLimiter
+from .asgi_middleware import RateLimitMiddleware
+from .audit_log import AuditContext, AuditLog, SqliteAuditSink
+from .lookup_store import LookupStore
+from .redis_lookup_store import RedisLookupStore
+from .redis_stand_in import InProcessRedisServer
+from .route_normalizer import RouteNormalizer
+
+
+class RecordingApp:
+    def __init__(self):
+        self.scopes = []
+
+    async def __call__(self, scope, receive, send):
+        self.scopes.append(scope)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def request(app, path="/users/123", api_key=b"abc", scope_type="http", headers=()):
+    scope = {
+        "type": scope_type,
+        "path": path,
+        "headers": [*([(b"x-api-key", api_key)] if api_key else []), *headers],
+        "client": ("10.0.0.1", 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def middleware(app, rate_limiter=None, **kwargs):
+    return RateLimitMiddleware(app, rate_limiter, clock=lambda: 1000, **kwargs)
+
+
+def exhaust(rate_limiter, api_data):
+    # Three bursting seconds in the window, then over the per second limit.
+    for epoch_time in (api_data.epoch_time - 3, api_data.epoch_time - 2):
+        for _ in range(100):
+            rate_limiter.increase_incoming_request_count(
+                api_data._replace(epoch_time=epoch_time)
+            )
+    for _ in range(100):
+        rate_limiter.increase_incoming_request_count(api_data)
+
+
+class TestRateLimitMiddleware:
+    def test_allowed_request_is_forwarded_with_headers(self):
+        app = RecordingApp()
+        messages = request(middleware(app))
+        assert len(app.scopes) == 1
+        start = messages[0]
+        assert start["status"] == 200
+        assert (b"x-ratelimit-remaining", b"10") in start["headers"]
+        assert messages[1]["body"] == b"ok"
+
+    def test_rejected_request_short_circuits(self):
+        app = RecordingApp()
+        rate_limiter = RateLimiter()
+        exhaust(rate_limiter, ApiData("abc", "/users/123", 1000))
+        messages = request(middleware(app, rate_limiter))
+        assert app.scopes == []
+        start = messages[0]
+        assert start["status"] == 429
+        assert (b"retry-after", b"1") in start["headers"]
+        assert b"rate limit exceeded" in messages[1]["body"]
+
+    def test_rejection_status_is_configurable(self):
+        rate_limiter = RateLimiter()
+        exhaust(rate_limiter, ApiData("abc", "/users/123", 1000))
+        messages = request(
+            middleware(RecordingApp(), rate_limiter, rejection_status=503)
+        )
+        assert messages[0]["status"] == 503
+
+    def test_routes_are_normalized(self):
+        store = LookupStore()
+        rate_limiter = RateLimiter(
+            store, route_normalizer=RouteNormalizer(["/users/:id"])
+        )
+        app = middleware(RecordingApp(), rate_limiter)
+        request(app, "/users/1")
+        request(app, "/users/2")
+        assert store.get("abc", "/users/:id").api_counts_by_epoch_time[1000] == 2
+
+    def test_missing_api_key_falls_back_to_client_address(self):
+        store = LookupStore()
+        app = middleware(RecordingApp(), RateLimiter(store))
+        request(app, api_key=None)
+        assert list(store) == [("client:10.0.0.1", "/users/123")]
+
+    def test_other_scopes_pass_through(self):
+        store = LookupStore()
+        app = RecordingApp()
+        request(middleware(app, RateLimiter(store)), scope_type="websocket")
+        assert len(app.scopes) == 1
+        assert len(store) == 0
+
+    def test_offloaded_store_calls(self):
+        app = middleware(RecordingApp(), offload_store_calls=True)
+        messages = request(app)
+        app.close()
+        assert messages[0]["status"] == 200
+
+    def test_offloaded_store_calls_share_one_connection_safely(self):
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def call(app, api_key):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {
+                "type": "http",
+                "path": "/users/123",
+                "headers": [(b"x-api-key", api_key)],
+                "client": ("10.0.0.1", 50000),
+            }
+            await app(scope, receive, send)
+            return messages[0]["status"]
+
+        with InProcessRedisServer() as server:
+            store = RedisLookupStore(server.host, server.port)
+            app = middleware(
+                RecordingApp(), RateLimiter(store), offload_store_calls=True
+            )
+            api_keys = [f"key_{i % 20}".encode() for i in range(400)]
+
+            async def run():
+                # Concurrent requests on the one socket used to interleave and hang.
+                return await asyncio.wait_for(
+                    asyncio.gather(*(call(app, api_key) for api_key in api_keys)), 10
+                )
+
+            try:
+                statuses = asyncio.run(run())
+                counts = [
+                    store.get(f"key_{i}", "/users/123").api_counts_by_epoch_time
+                    for i in range(20)
+                ]
+            finally:
+                app.close()
+                store.close()
+
+        assert statuses == [200] * 400
+        assert [c.count(1000) for c in counts] == [20] * 20
+
+
+class TestAuditContext:
+    def test_user_session_and_origin(self):
+        scope = {
+            "headers": [
+                (b"x-user-id", b"alice"),
+                (b"cookie", b"theme=dark; session=s-1"),
+                (b"origin", b"https://app.example.com"),
+            ],
+            "client": ("10.0.0.1", 50000),
+        }
+        assert middleware(RecordingApp()).audit_context(scope) == AuditContext(
+            "alice", "s-1", "https://app.example.com"
+        )
+
+    def test_origin_falls_back_to_client(self):
+        scope = {"headers": [], "client": ("10.0.0.1", 50000)}
+        assert middleware(RecordingApp()).audit_context(scope) == AuditContext(
+            origin="10.0.0.1"
+        )
+
+    def test_custom_header_and_cookie(self):
+        scope = {"headers": [(b"x-account", b"bob"), (b"cookie", b"sid=s-2")]}
+        app = middleware(RecordingApp(), user_header="X-Account", session_cookie="sid")
+        assert app.audit_context(scope) == AuditContext("bob", "s-2")
+
+    def test_stored_records_contain_context(self, tmp_path):
+        path = tmp_path / "audit.db"
+        headers = [(b"x-user-id", b"alice"), (b"cookie", b"session=s-1")]
+        with AuditLog(SqliteAuditSink(path)) as audit_log:
+            app = middleware(RecordingApp(), RateLimiter(audit_log=audit_log))
+            request(app, headers=headers)
+            offloaded = middleware(
+                RecordingApp(),
+                RateLimiter(audit_log=audit_log),
+                offload_store_calls=True,
+            )
+            request(offloaded, headers=headers)
+        rows = sqlite3.connect(path).execute(
+            "SELECT api_key, user, session, origin FROM rate_limit_audit"
+        )
+        assert list(rows) == [("abc", "alice", "s-1", "10.0.0.1")] * 2
@@ -0,0 +1,118 @@
+import asyncio
+
+from .api_rate_limiter import ApiData, RateLimiter
+from .async_rate_limiter import AsyncRateLimiter
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+)
+from .redis_lookup_store import RedisLookupStore
+from .redis_stand_in import InProcessRedisServer
+from .sharded_lookup_store import ShardedLookupStore
+
+
+class TestAsyncRateLimiter:
+    def test_is_request_allowed_when_no_requests(self):
+        rate_limiter = AsyncRateLimiter()
+        api_data = ApiData("test_key", "/test", 1000)
+        assert asyncio.run(rate_limiter.is_request_allowed(api_data)) is True
+
+    def test_concurrent_increments_are_coalesced(self):
+        rate_limiter = AsyncRateLimiter()
+        api_data = ApiData("test_key", "/test", 1000)
+        other_api_data = ApiData("other_key", "/test", 1000)
+
+        async def run():
+            await asyncio.gather(
+                *(
+                    rate_limiter.increase_incoming_request_count(api_data)
+                    for _ in range(50)
+                ),
+                *(
+                    rate_limiter.increase_incoming_request_count(other_api_data)
+                    for _ in range(5)
+                ),
+            )
+
+        asyncio.run(run())
+
+        assert rate_limiter.store_writes == 2
+        counts = rate_limiter.lookup_store.get("test_key", "/test")
+        assert counts.api_counts_by_epoch_time[1000] == 50
+
+    def test_check_waits_for_pending_increments(self):
+        rate_limiter = AsyncRateLimiter()
+        api_data = ApiData("test_key", "/test", 1000)
+
+        async def run():
+            increments = [
+                asyncio.ensure_future(
+                    rate_limiter.increase_incoming_request_count(api_data)
+                )
+                for _ in range(DEFAULT_LIMIT_PER_SECOND + 1)
+            ]
+            await asyncio.sleep(0)
+            assert rate_limiter.store_writes == 0
+            await rate_limiter.is_request_allowed(api_data)
+            assert rate_limiter.store_writes == 1
+            await asyncio.gather(*increments)
+
+        asyncio.run(run())
+        counts = rate_limiter.lookup_store.get("test_key", "/test")
+        assert counts.api_counts_by_epoch_time[1000] == DEFAULT_LIMIT_PER_SECOND + 1
+
+    def test_decisions_match_sync_rate_limiter(self):
+        sync_rate_limiter = RateLimiter()
+        rate_limiter = AsyncRateLimiter(ShardedLookupStore(), offload_store_calls=True)
+
+        async def run():
+            for burst_num in range(DEFAULT_NUMBER_OF_BURST_PER_MINUTE + 1):
+                api_data = ApiData("test_key", "/test", 1000 + burst_num)
+                await asyncio.gather(
+                    *(
+                        rate_limiter.increase_incoming_request_count(api_data)
+                        for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND + 1)
+                    )
+                )
+                for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND + 1):
+                    sync_rate_limiter.increase_incoming_request_count(api_data)
+
+                assert await rate_limiter.is_request_allowed(
+                    api_data
+                ) is sync_rate_limiter.is_request_allowed(api_data)
+            return await rate_limiter.is_request_allowed(api_data)
+
+        assert asyncio.run(run()) is False
+        rate_limiter.close()
+
+    def test_offloaded_store_calls_share_one_connection_safely(self):
+        with InProcessRedisServer() as server:
+            store = RedisLookupStore(server.host, server.port)
+            rate_limiter = AsyncRateLimiter(store, offload_store_calls=True)
+            requests = [
+                ApiData(f"key_{i % 20}", "/test", 1000 + i % 3) for i in range(400)
+            ]
+
+            async def handle(api_data):
+                allowed = await rate_limiter.is_request_allowed(api_data)
+                await rate_limiter.increase_incoming_request_count(api_data)
+                return allowed
+
+            async def run():
+                # Concurrent calls on the one socket used to interleave and hang.
+                return await asyncio.wait_for(
+                    asyncio.gather(*(handle(api_data) for api_data in requests)), 10
+                )
+
+            try:
+                assert all(asyncio.run(run()))
+                counts = [
+                    store.get(f"key_{i}", "/test").api_counts_by_epoch_time.count(1000)
+                    for i in range(20)
+                ]
+            finally:
+                rate_limiter.close()
+                store.close()
+
+        assert sum(counts) == sum(api_data.epoch_time == 1000 for api_data in requests)
@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .audit_log import (
+    AuditContext,
+    AuditLog,
+    AuditRecord,
+    JsonLinesAuditSink,
+    SqliteAuditSink,
+)
+
+
+class RecordingSink:
+    def __init__(self, gate: threading.Event | None = None):
+        self.batches = []
+        self.gate = gate
+        self.closed = False
+
+    def write_batch(self, records):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(records))
+
+    def close(self):
+        self.closed = True
+
+
+class FailingSink(RecordingSink):
+    def write_batch(self, records):
+        raise OSError("disk full")
+
+
+def record(i=0, allowed=True):
+    return AuditRecord("abc", "/users/:id", 1000 + i, allowed, 1.5, "alice")
+
+
+class TestAuditLog:
+    def test_invalid_sizes(self):
+        with pytest.raises(ValueError):
+            AuditLog(RecordingSink(), max_queue_size=0)
+        with pytest.raises(ValueError):
+            AuditLog(RecordingSink(), batch_size=0)
+
+    def test_stop_writes_everything_in_batches(self):
+        sink = RecordingSink()
+        with AuditLog(sink, batch_size=10) as audit_log:
+            for i in range(25):
+                assert audit_log.record(record(i))
+        assert sink.closed
+        assert audit_log.written == 25
+        assert [r for batch in sink.batches for r in batch] == [
+            record(i) for i in range(25)
+        ]
+        assert all(len(batch) <= 10 for batch in sink.batches)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        gate = threading.Event()
+        sink = RecordingSink(gate)
+        audit_log = AuditLog(sink, max_queue_size=5, batch_size=1)
+        # Not started yet, so nothing drains the queue.
+        results = [audit_log.record(record(i)) for i in range(8)]
+        assert results == [True] * 5 + [False] * 3
+        assert audit_log.dropped == 3
+        assert audit_log.pending == 5
+
+        gate.set()
+        audit_log.start()
+        audit_log.stop()
+        assert audit_log.written == 5
+
+    def test_drops_are_counted_across_threads(self):
+        audit_log = AuditLog(RecordingSink(), max_queue_size=5)
+
+        def flood():
+            for i in range(10_000):
+                audit_log.record(record(i))
+
+        threads = [threading.Thread(target=flood) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert audit_log.pending == 5
+        assert audit_log.dropped == 8 * 10_000 - 5
+
+    def test_sink_errors_are_counted(self):
+        audit_log = AuditLog(FailingSink(), batch_size=2)
+        with audit_log:
+            for i in range(4):
+                audit_log.record(record(i))
+        assert audit_log.written == 0
+        assert audit_log.failed_records == 4
+        assert audit_log.write_errors >= 2
+
+
+class TestSinks:
+    def test_sqlite_sink(self, tmp_path):
+        path = tmp_path / "audit.db"
+        with AuditLog(SqliteAuditSink(path)) as audit_log:
+            audit_log.record(record(0))
+            audit_log.record(record(1, allowed=False))
+        rows = sqlite3.connect(path).execute(
+            "SELECT api_key, epoch_time, allowed, user FROM rate_limit_audit"
+        )
+        assert sorted(rows) == [("abc", 1000, 1, "alice"), ("abc", 1001, 0, "alice")]
+
+    def test_json_lines_sink_appends(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        for i in range(2):
+            with AuditLog(JsonLinesAuditSink(path)) as audit_log:
+                audit_log.record(record(i))
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["epoch_time"] for line in lines] == [1000, 1001]
+        assert lines[0]["user"] == "alice"
+
+
+class TestRateLimiterAudit:
+    def test_decisions_are_audited(self):
+        sink = RecordingSink()
+        with AuditLog(sink) as audit_log:
+            rate_limiter = RateLimiter(audit_log=audit_log)
+            api_data = ApiData("abc", "/users/:id", 1000)
+            assert rate_limiter.is_request_allowed(api_data)
+            assert rate_limiter.acquire(api_data).allowed
+        records = [r for batch in sink.batches for r in batch]
+        assert [(r.api_key, r.epoch_time, r.allowed) for r in records] == [
+            ("abc", 1000, True),
+            ("abc", 1000, True),
+        ]
+
+    def test_context_is_stored(self, tmp_path):
+        path = tmp_path / "audit.db"
+        context = AuditContext("alice", "s-1", "https://app.example.com")
+        with AuditLog(SqliteAuditSink(path)) as audit_log:
+            rate_limiter = RateLimiter(audit_log=audit_log)
+            api_data = ApiData("abc", "/users/:id", 1000)
+            rate_limiter.is_request_allowed(api_data, context)
+            rate_limiter.acquire(api_data, context)
+            rate_limiter.acquire(api_data)
+        rows = sqlite3.connect(path).execute(
+            "SELECT user, session, origin FROM rate_limit_audit ORDER BY rowid"
+        )
+        assert list(rows) == [tuple(context), tuple(context), (None, None, None)]
+
+    def test_slow_sink_does_not_block_requests(self):
+        gate = threading.Event()
+        audit_log = AuditLog(RecordingSink(gate), max_queue_size=10, batch_size=1)
+        audit_log.start()
+        rate_limiter = RateLimiter(audit_log=audit_log)
+        for epoch_time in range(1000, 1100):
+            rate_limiter.acquire(ApiData("abc", "/users/:id", epoch_time))
+        # At most one record is held by the stuck worker and ten fill the queue.
+        assert audit_log.dropped >= 89
+        gate.set()
+        audit_log.stop()
+        assert audit_log.written + audit_log.dropped == 100
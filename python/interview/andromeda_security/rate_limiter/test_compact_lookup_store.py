@@ -0,0 +1,101 @@
+import sys
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .compact_lookup_store import MAX_LIMIT_PROFILES, CompactLookupStore
+from .hierarchical_rate_limiter import (
+    HierarchicalRateLimiter,
+    LimitPolicy,
+    RequestContext,
+)
+from .lookup_store import DEFAULT_BURST_LIMIT_PER_SECOND, LookupStore, RateLimits
+
+
+def traffic():
+    """Bursty traffic for a few keys over about two minutes."""
+    for epoch_time in range(1000, 1130):
+        for key_index in range(3):
+            bursting = (epoch_time + key_index) % 17 < 3
+            per_second = DEFAULT_BURST_LIMIT_PER_SECOND + 5 if bursting else 4
+            for _ in range(per_second):
+                yield ApiData(f"key_{key_index}", "/users/:id", epoch_time)
+
+
+class TestCompactLookupStore:
+    def test_decisions_match_lookup_store(self):
+        expected = RateLimiter(LookupStore())
+        rate_limiter = RateLimiter(CompactLookupStore())
+        for api_data in traffic():
+            assert rate_limiter.acquire(api_data) == expected.acquire(api_data)
+
+    def test_check_then_increment_matches_lookup_store(self):
+        expected = RateLimiter(LookupStore())
+        rate_limiter = RateLimiter(CompactLookupStore())
+        for api_data in traffic():
+            assert rate_limiter.is_request_allowed(
+                api_data
+            ) is expected.is_request_allowed(api_data)
+            rate_limiter.increase_incoming_request_count(api_data)
+            expected.increase_incoming_request_count(api_data)
+
+    def test_hierarchical_decisions_match_lookup_store(self):
+        policies = (
+            LimitPolicy("tenant", ("tenant",), 20, 40, 1),
+            LimitPolicy("endpoint", ("api_key", "api_route"), 3, 6, 0),
+        )
+        expected = HierarchicalRateLimiter(policies, LookupStore())
+        rate_limiter = HierarchicalRateLimiter(policies, CompactLookupStore())
+        for api_data in traffic():
+            context = RequestContext("acme", "alice", *api_data)
+            assert rate_limiter.acquire(context) == expected.acquire(context)
+
+    def test_keys_are_interned(self):
+        store = CompactLookupStore()
+        store.increment_limit_count_by_one("".join(["key", "_1"]), "/test", 1000)
+        store.increment_limit_count_by_one("".join(["key", "_1"]), "/test", 1000)
+
+        assert len(store) == 1
+        (api_key,) = store.slots_by_route["/test"]
+        assert api_key is sys.intern("key_1")
+
+    def test_default_limits_are_shared(self):
+        store = CompactLookupStore()
+        for i in range(10):
+            store.increment_limit_count_by_one(f"key_{i}", "/test", 1000)
+        assert store.limit_profiles == [store.limit_profiles[0]]
+        assert set(store.limit_profile_ids) == {0}
+
+    def test_many_limit_profiles(self):
+        store = CompactLookupStore()
+        for i in range(300):
+            limits = RateLimits(limit_per_second=1000 + i)
+            store.increment_limit_count_by_one(f"key_{i}", "/test", 1000, limits)
+        assert len(store.limit_profiles) == 301
+        assert store.get("key_299", "/test").limit_per_second == 1299
+
+    def test_too_many_limit_profiles_leaves_store_intact(self):
+        store = CompactLookupStore()
+        store.limit_profiles += [RateLimits(i) for i in range(1, MAX_LIMIT_PROFILES)]
+        store.increment_limit_count_by_one("a", "/test", 1000)
+        with pytest.raises(ValueError):
+            store.increment_limit_count_by_one("b", "/test", 1000, RateLimits(0))
+        store.increment_limit_count_by_one("c", "/test", 1000)
+
+        slabs = (store.epoch_times, store.counts, store.limit_profile_ids)
+        assert [len(slab) for slab in slabs] == [2, 2, 2]
+        assert len(store.burst_epoch_times) == 2 * store.tracked_bursts
+        assert store.get("c", "/test").api_counts_by_epoch_time.count(1000) == 1
+
+    def test_late_increment_is_dropped(self):
+        store = CompactLookupStore()
+        store.increment_limit_count_by_one("test_key", "/test", 1001)
+        store.increment_limit_count_by_one("test_key", "/test", 1000)
+        data = store.get("test_key", "/test")
+        assert dict(data.api_counts_by_epoch_time.items()) == {1001: 1}
+
+    @pytest.mark.parametrize("store", [LookupStore, CompactLookupStore])
+    def test_iterates_keys(self, store):
+        lookup_store = store()
+        lookup_store.increment_limit_count_by_one("a", "/x", 1000)
+        lookup_store.increment_limit_count_by_one("b", "/y", 1000)
+        assert set(lookup_store) == {("a", "/x"), ("b", "/y")}
@@ -0,0 +1,115 @@
+import math
+import random
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .count_min_sketch import CountMinSketch, SketchFilteredLookupStore
+from .lookup_store import LookupStore, RateLimiterKey, RateLimits
+from .sharded_lookup_store import ShardedLookupStore
+
+
+def zipf_traffic(requests, keys, seed=7):
+    randomizer = random.Random(seed)
+    weights = [1 / rank**1.1 for rank in range(1, keys + 1)]
+    return randomizer.choices(
+        [RateLimiterKey(f"key_{i}", "/users/:id") for i in range(keys)],
+        weights=weights,
+        k=requests,
+    )
+
+
+class TestCountMinSketch:
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            CountMinSketch(0, 1)
+
+    def test_size_from_error_bounds(self):
+        sketch = CountMinSketch.from_error_bounds(epsilon=0.01, delta=0.01)
+        assert sketch.width == math.ceil(math.e / 0.01)
+        assert sketch.depth == math.ceil(math.log(100))
+
+    def test_error_bounds_against_exact_counts(self):
+        epsilon, delta = 0.005, 0.01
+        sketch = CountMinSketch.from_error_bounds(epsilon, delta)
+        exact = {}
+        for key in zipf_traffic(50_000, 5_000):
+            sketch.add(key)
+            exact[key] = exact.get(key, 0) + 1
+
+        allowed_error = epsilon * sketch.total
+        over_bound = 0
+        for key, count in exact.items():
+            estimate = sketch.estimate(key)
+            assert estimate >= count
+            over_bound += estimate - count > allowed_error
+        # At most a delta share of keys may go past the bound; a little
+        # slack keeps this from depending on the hash seed of the run.
+        assert over_bound <= 2 * delta * len(exact)
+
+    def test_clear(self):
+        sketch = CountMinSketch(100, 3)
+        sketch.add("abc", 5)
+        sketch.clear()
+        assert sketch.estimate("abc") == 0
+        assert sketch.total == 0
+
+
+class TestSketchFilteredLookupStore:
+    def test_junk_keys_do_not_allocate(self):
+        store = SketchFilteredLookupStore()
+        rate_limiter = RateLimiter(store)
+        randomizer = random.Random(1)
+        for _ in range(20_000):
+            api_key = f"junk_{randomizer.getrandbits(64)}"
+            assert rate_limiter.acquire(ApiData(api_key, "/users/:id", 1000)).allowed
+        assert len(store) == 0
+
+    def test_heavy_key_is_promoted_and_enforced(self):
+        store = SketchFilteredLookupStore()
+        rate_limiter = RateLimiter(store)
+        api_data = ApiData("abc", "/users/:id", 1000)
+        for _ in range(11):
+            assert rate_limiter.acquire(api_data).allowed
+        assert RateLimiterKey("abc", "/users/:id") in store.exact_store
+        assert (
+            store.exact_store.get("abc", "/users/:id").api_counts_by_epoch_time[1000]
+            == 11
+        )
+
+    @pytest.mark.parametrize("make_exact_store", [LookupStore, ShardedLookupStore])
+    def test_decisions_match_exact_store(self, make_exact_store):
+        exact = RateLimiter(LookupStore())
+        filtered = RateLimiter(SketchFilteredLookupStore(make_exact_store()))
+        randomizer = random.Random(3)
+        traffic = zipf_traffic(30_000, 2_000)
+        for i, key in enumerate(traffic):
+            api_data = ApiData(*key, 1000 + i // 1_000)
+            # Sketch counts before promotion are estimates, so compare the
+            # decisions rather than the remaining quota.
+            assert filtered.acquire(api_data).allowed == exact.acquire(api_data).allowed
+            if randomizer.random() < 0.01:
+                assert filtered.is_request_allowed(
+                    api_data
+                ) == exact.is_request_allowed(api_data)
+
+    def test_check_then_increment_path(self):
+        rate_limiter = RateLimiter(SketchFilteredLookupStore())
+        for epoch_time in (1000, 1001, 1002):
+            api_data = ApiData("abc", "/users/:id", epoch_time)
+            for _ in range(100):
+                rate_limiter.increase_incoming_request_count(api_data)
+        api_data = ApiData("abc", "/users/:id", 1003)
+        for _ in range(11):
+            rate_limiter.increase_incoming_request_count(api_data)
+        assert not rate_limiter.is_request_allowed(api_data)
+
+    def test_tighter_policy_limits_skip_the_sketch(self):
+        store = SketchFilteredLookupStore()
+        key = RateLimiterKey("tenant:acme", "*")
+        store.fetch_and_increment_many([key], 1000, [RateLimits(1, 2, 0)])
+        assert key in store.exact_store
+
+    def test_old_seconds_are_let_through(self):
+        store = SketchFilteredLookupStore(sketch_seconds=2)
+        store.fetch_and_increment("abc", "/users/:id", 1005)
+        assert store.fetch_and_increment("abc", "/users/:id", 1000).count == 0
@@ -0,0 +1,124 @@
+import pytest
+from .compact_lookup_store import CompactLookupStore
+from .count_min_sketch import SketchFilteredLookupStore
+from .hierarchical_rate_limiter import (
+    HierarchicalRateLimiter,
+    LimitPolicy,
+    RequestContext,
+)
+from .lookup_store import LookupStore, RateLimiterKey
+from .redis_lookup_store import RedisLookupStore
+from .redis_stand_in import InProcessRedisServer
+from .sharded_lookup_store import ShardedLookupStore
+
+POLICIES = (
+    LimitPolicy("tenant", ("tenant",), 20, 40, 0),
+    LimitPolicy("api_key", ("api_key",), 10, 20, 0),
+    LimitPolicy("user", ("tenant", "user"), 5, 10, 0),
+    LimitPolicy("endpoint", ("api_key", "api_route"), 3, 6, 0),
+)
+
+
+def context(user="alice", api_key="abc", api_route="/users/:id", epoch_time=1000):
+    return RequestContext("acme", user, api_key, api_route, epoch_time)
+
+
+class TestLimitPolicy:
+    def test_key_for(self):
+        assert POLICIES[0].key_for(context()) == RateLimiterKey("tenant:acme", "*")
+        assert POLICIES[2].key_for(context()) == RateLimiterKey("user:acme:alice", "*")
+        assert POLICIES[3].key_for(context()) == RateLimiterKey(
+            "endpoint:abc", "/users/:id"
+        )
+
+    def test_keys_do_not_collide(self):
+        policy = LimitPolicy("user", ("tenant", "user"))
+        first = RequestContext("a:b", "c", "abc", "/users/:id", 1000)
+        second = RequestContext("a", "b:c", "abc", "/users/:id", 1000)
+        assert policy.key_for(first) != policy.key_for(second)
+
+
+class TestHierarchicalRateLimiter:
+    def test_requires_a_policy(self):
+        with pytest.raises(ValueError):
+            HierarchicalRateLimiter(())
+
+    def test_endpoint_limit_rejects_first(self):
+        rate_limiter = HierarchicalRateLimiter(POLICIES)
+        decisions = [rate_limiter.acquire(context()) for _ in range(7)]
+
+        # Up to the burst limit, then the single allowed burst is spent.
+        assert [decision.allowed for decision in decisions] == [True] * 6 + [False]
+        assert decisions[-1].rejected_by == "endpoint"
+
+    def test_tenant_limit_applies_across_users_and_keys(self):
+        rate_limiter = HierarchicalRateLimiter(POLICIES)
+        results = []
+        for i in range(50):
+            decision = rate_limiter.acquire(
+                context(user=f"user_{i}", api_key=f"key_{i}", api_route=f"/r/{i}")
+            )
+            results.append(decision)
+
+        assert sum(decision.allowed for decision in results) == 40
+        assert {d.rejected_by for d in results if not d.allowed} == {"tenant"}
+
+    def test_all_scopes_use_one_store_call(self):
+        class CountingLookupStore(LookupStore):
+            batches = 0
+
+            def check_and_increment_many(self, *args):
+                self.batches += 1
+                return super().check_and_increment_many(*args)
+
+        lookup_store = CountingLookupStore()
+        rate_limiter = HierarchicalRateLimiter(POLICIES, lookup_store)
+        rate_limiter.acquire(context())
+
+        assert lookup_store.batches == 1
+        assert len(lookup_store) == len(POLICIES)
+
+    @pytest.mark.parametrize(
+        "store_name", ["lookup", "sharded", "compact", "sketch", "redis"]
+    )
+    def test_rejected_request_leaves_parent_counts_unchanged(self, store_name):
+        with InProcessRedisServer() as server:
+            lookup_store = {
+                "lookup": LookupStore,
+                "sharded": ShardedLookupStore,
+                "compact": CompactLookupStore,
+                "sketch": SketchFilteredLookupStore,
+                "redis": lambda: RedisLookupStore(server.host, server.port),
+            }[store_name]()
+            rate_limiter = HierarchicalRateLimiter(POLICIES, lookup_store)
+            decisions = [rate_limiter.acquire(context()) for _ in range(7)]
+            assert decisions[-1].rejected_by == "endpoint"
+
+            for scope in ("tenant:acme", "api_key:abc", "user:acme:alice"):
+                data = lookup_store.get(scope, "*")
+                assert data.api_counts_by_epoch_time.count(1000) == 6
+            if store_name == "redis":
+                lookup_store.close()
+
+    def test_per_scope_burst_limit_is_used(self):
+        rate_limiter = HierarchicalRateLimiter(POLICIES)
+        rate_limiter.acquire(context())
+        data = rate_limiter.lookup_store.get("user:acme:alice", "*")
+        assert data.burst_limit_per_second == 10
+
+    @pytest.mark.parametrize("store_name", ["sharded", "redis"])
+    def test_stores_agree(self, store_name):
+        expected = HierarchicalRateLimiter(POLICIES)
+        with InProcessRedisServer() as server:
+            if store_name == "redis":
+                lookup_store = RedisLookupStore(server.host, server.port)
+            else:
+                lookup_store = ShardedLookupStore()
+            rate_limiter = HierarchicalRateLimiter(POLICIES, lookup_store)
+
+            for i in range(60):
+                request = context(user=f"user_{i % 3}", epoch_time=1000 + i // 20)
+                assert rate_limiter.acquire(request) == expected.acquire(request)
+
+            if store_name == "redis":
+                lookup_store.close()
@@ -0,0 +1,226 @@
+import sqlite3
+import time
+from contextlib import ExitStack
+
+import pytest
+from .algorithms import GcraAlgorithm
+from .api_rate_limiter import ApiData, RateLimiter
+from .compact_lookup_store import CompactLookupStore
+from .count_min_sketch import SketchFilteredLookupStore
+from .limit_config import LimitConfig, create_schema, set_override
+from .lookup_store import DEFAULT_RATE_LIMITS, LookupStore, RateLimits
+from .redis_lookup_store import RedisLookupStore
+from .redis_stand_in import InProcessRedisServer
+from .sharded_lookup_store import ShardedLookupStore
+from .shared_memory_lookup_store import SharedMemoryLookupStore
+
+PREMIUM = RateLimits(
+    limit_per_second=50, burst_limit_per_second=200, number_of_bursts=5
+)
+STRICT = RateLimits(limit_per_second=1, burst_limit_per_second=2, number_of_bursts=0)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "limits.db"
+    connection = sqlite3.connect(path)
+    create_schema(connection)
+    yield connection, lambda: sqlite3.connect(path)
+    connection.close()
+
+
+class CountingConnect:
+    def __init__(self, connect):
+        self.connect = connect
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.connect()
+
+
+class TestLimitConfig:
+    def test_defaults_before_any_override(self, database):
+        _, connect = database
+        config = LimitConfig(connect)
+        assert config.reload()
+        assert config.limits_for("abc", "/users/:id") is DEFAULT_RATE_LIMITS
+
+    def test_route_override_wins_over_key_wide_override(self, database):
+        connection, connect = database
+        set_override(connection, "abc", PREMIUM)
+        set_override(connection, "abc", RateLimits(1, 2, 0), "/export")
+        config = LimitConfig(connect)
+        config.reload()
+        assert config.limits_for("abc", "/export") == RateLimits(1, 2, 0)
+        assert config.limits_for("abc", "/users/:id") == PREMIUM
+        assert config.limits_for("xyz", "/export") is DEFAULT_RATE_LIMITS
+
+    def test_reload_only_when_version_moves(self, database):
+        connection, connect = database
+        config = LimitConfig(connect)
+        assert config.reload()
+        assert not config.reload()
+        set_override(connection, "abc", PREMIUM)
+        assert config.reload()
+        assert config.limits_for("abc", "/") == PREMIUM
+
+    def test_equal_limits_are_shared(self, database):
+        connection, connect = database
+        set_override(connection, "abc", RateLimits(50, 200, 5))
+        set_override(connection, "xyz", RateLimits(50, 200, 5))
+        config = LimitConfig(connect)
+        config.reload()
+        assert config.limits_for("abc", "/") is config.limits_for("xyz", "/")
+
+    def test_background_reload(self, database):
+        connection, connect = database
+        config = LimitConfig(connect)
+        config.start(interval_seconds=0.01)
+        try:
+            set_override(connection, "abc", PREMIUM)
+            deadline = time.monotonic() + 2
+            while config.limits_for("abc", "/") != PREMIUM:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            config.stop()
+
+
+class TestRateLimiterWithLimitConfig:
+    def test_premium_key_gets_its_own_limits(self, database):
+        connection, connect = database
+        set_override(connection, "premium", PREMIUM)
+        config = LimitConfig(connect)
+        config.reload()
+        rate_limiter = RateLimiter(limit_config=config)
+
+        for api_key, limit in (("premium", 50), ("free", 10)):
+            api_data = ApiData(api_key, "/users/:id", 1000)
+            for _ in range(limit + 1):
+                assert rate_limiter.is_request_allowed(api_data)
+                rate_limiter.increase_incoming_request_count(api_data)
+            assert not rate_limiter.is_request_under_per_second_limit(api_data)
+
+    def test_rejects_limit_config_with_explicit_algorithm(self, database):
+        _, connect = database
+        with pytest.raises(ValueError):
+            RateLimiter(algorithm=GcraAlgorithm(), limit_config=LimitConfig(connect))
+
+    def test_acquire_uses_key_limits(self, database):
+        connection, connect = database
+        set_override(connection, "premium", PREMIUM)
+        config = LimitConfig(connect)
+        config.reload()
+        rate_limiter = RateLimiter(limit_config=config)
+
+        decision = rate_limiter.acquire(ApiData("premium", "/users/:id", 1000))
+        assert decision.remaining_per_second == 50
+        assert decision.remaining_bursts == 5
+        decision = rate_limiter.acquire(ApiData("free", "/users/:id", 1000))
+        assert decision.remaining_per_second == 10
+
+    def test_acquire_with_redis_store(self, database):
+        connection, connect = database
+        set_override(connection, "premium", RateLimits(2, 3, 0))
+        config = LimitConfig(connect)
+        config.reload()
+        with InProcessRedisServer() as server:
+            store = RedisLookupStore("127.0.0.1", server.port)
+            try:
+                rate_limiter = RateLimiter(store, limit_config=config)
+                api_data = ApiData("premium", "/users/:id", 1000)
+                allowed = [rate_limiter.acquire(api_data).allowed for _ in range(5)]
+            finally:
+                store.close()
+        # Over the per second limit once the key has burst, with no bursts to spare.
+        assert allowed == [True, True, True, False, False]
+
+    def test_counting_does_not_read_the_key(self, database):
+        connection, connect = database
+        set_override(connection, "strict", STRICT)
+        config = LimitConfig(connect)
+        config.reload()
+        with InProcessRedisServer() as server:
+            store = RedisLookupStore(server.host, server.port)
+            try:
+                rate_limiter = RateLimiter(store, limit_config=config)
+                before = server.commands_processed
+                rate_limiter.increase_incoming_request_count(
+                    ApiData("strict", "/users/:id", 1000)
+                )
+            finally:
+                store.close()
+        # HINCRBY and EXPIRE, without an HGETALL to look up the limits.
+        assert server.commands_processed - before == 2
+
+    @pytest.mark.parametrize(
+        "store_name",
+        ["lookup", "sharded", "compact", "shared_memory", "sketch", "redis"],
+    )
+    def test_every_store_makes_the_same_decisions(self, database, store_name):
+        connection, connect = database
+        set_override(connection, "strict", STRICT)
+        set_override(connection, "premium", PREMIUM)
+        config = LimitConfig(connect)
+        config.reload()
+        traffic = [
+            ApiData(api_key, "/users/:id", epoch_time)
+            for epoch_time in range(1000, 1004)
+            for api_key, per_second in (("strict", 5), ("premium", 60), ("free", 12))
+            for _ in range(per_second)
+        ]
+
+        with InProcessRedisServer() as server, ExitStack() as cleanup:
+            if store_name == "shared_memory":
+                store = SharedMemoryLookupStore(capacity=64)
+                cleanup.callback(store.unlink)
+                cleanup.callback(store.close)
+            elif store_name == "redis":
+                store = RedisLookupStore(server.host, server.port)
+                cleanup.callback(store.close)
+            else:
+                store = {
+                    "lookup": LookupStore,
+                    "sharded": ShardedLookupStore,
+                    "compact": CompactLookupStore,
+                    "sketch": SketchFilteredLookupStore,
+                }[store_name]()
+            expected = RateLimiter(limit_config=config)
+            rate_limiter = RateLimiter(store, limit_config=config)
+
+            for api_data in traffic:
+                assert rate_limiter.is_request_allowed(
+                    api_data
+                ) is expected.is_request_allowed(api_data)
+                rate_limiter.increase_incoming_request_count(api_data)
+                expected.increase_incoming_request_count(api_data)
+            # Bursting at 1000 already used up the strict key's allowance.
+            strict = ApiData("strict", "/users/:id", 1003)
+            assert rate_limiter.is_request_allowed(strict) is False
+
+    def test_plan_change_applies_after_reload(self, database):
+        connection, connect = database
+        set_override(connection, "abc", STRICT)
+        config = LimitConfig(connect)
+        config.reload()
+        rate_limiter = RateLimiter(limit_config=config)
+        api_data = ApiData("abc", "/users/:id", 1000)
+        for _ in range(5):
+            rate_limiter.increase_incoming_request_count(api_data)
+        assert not rate_limiter.is_request_allowed(api_data)
+
+        set_override(connection, "abc", PREMIUM)
+        config.reload()
+        assert rate_limiter.is_request_allowed(api_data)
+
+    def test_no_database_access_per_request(self, database):
+        connection, connect = database
+        set_override(connection, "premium", PREMIUM)
+        counting_connect = CountingConnect(connect)
+        config = LimitConfig(counting_connect)
+        config.reload()
+        rate_limiter = RateLimiter(limit_config=config)
+        for epoch_time in range(1000, 1100):
+            rate_limiter.acquire(ApiData("premium", "/users/:id", epoch_time))
+        assert counting_connect.calls == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    WINDOW_SLOTS,
+    LookupStore,
+    SlidingWindowCounter,
+)
+
+
+class TestSlidingWindowCounter:
+    def test_increment_and_get(self):
+        window = SlidingWindowCounter()
+        window.increment(1000)
+        window[1000] += 1
+        assert window.get(1000, 0) == 2
+        assert window.get(1001, 0) == 0
+        assert dict(window.items()) == {1000: 2}
+
+    def test_missing_second_raises_key_error(self):
+        window = SlidingWindowCounter()
+        window.increment(1000 + WINDOW_SLOTS)
+        with pytest.raises(KeyError):
+            window[1000]
+        with pytest.raises(KeyError):
+            window[1001]
+        assert window.count(1000) == 0
+        assert window.count(1000 + WINDOW_SLOTS) == 1
+
+    def test_stale_slot_is_reset(self):
+        window = SlidingWindowCounter()
+        window.increment(1000)
+        window.increment(1000 + WINDOW_SLOTS)
+        assert window.get(1000, 0) == 0
+        assert window.get(1000 + WINDOW_SLOTS, 0) == 1
+
+    def test_write_for_expired_second_is_dropped(self):
+        window = SlidingWindowCounter()
+        window.increment(1000 + WINDOW_SLOTS)
+        assert window.increment(1000) == 0
+        assert dict(window.items()) == {1000 + WINDOW_SLOTS: 1}
+
+
+class TestLookupStore:
+    def test_memory_is_bounded_for_long_lived_key(self):
+        store = LookupStore()
+        for epoch_time in range(1000, 1000 + 10 * WINDOW_SLOTS):
+            store.increment_limit_count_by_one("test_key", "/test", epoch_time)
+
+        window = store.get("test_key", "/test").api_counts_by_epoch_time
+        assert len(window) == WINDOW_SLOTS
+        assert min(window) == 1000 + 9 * WINDOW_SLOTS
+
+    def test_burst_count_is_tracked_incrementally(self):
+        store = LookupStore()
+        for epoch_time in (1000, 1001):
+            for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND + 5):
+                store.increment_limit_count_by_one("test_key", "/test", epoch_time)
+
+        data = store.get("test_key", "/test")
+        assert list(data.burst_epoch_times) == [1000, 1001]
+        assert data.bursts_in_window(1060) == 2
+        assert data.bursts_in_window(1061) == 1
+        assert data.bursts_in_window(1062) == 0
+        # Checking is read only, expired bursts stay until the next increment.
+        assert list(data.burst_epoch_times) == [1000, 1001]
+
+    def test_late_burst_is_kept_in_order(self):
+        store = LookupStore()
+        for epoch_time in (1002, 1001):
+            store.increment_limit_count(
+                "test_key", "/test", epoch_time, DEFAULT_BURST_LIMIT_PER_SECOND
+            )
+
+        data = store.get("test_key", "/test")
+        assert list(data.burst_epoch_times) == [1001, 1002]
+        assert data.bursts_in_window(1001) == 1
+        assert data.bursts_in_window(1061) == 2
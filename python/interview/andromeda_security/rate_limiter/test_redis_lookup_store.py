@@ -0,0 +1,188 @@
+import os
+import socket
+import uuid
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    DEFAULT_NUMBER_OF_BURST_PER_MINUTE,
+    RateLimiterKey,
+    RateLimits,
+    WindowCounts,
+)
+from .redis_lookup_store import (
+    CHECK_AND_INCREMENT_MANY_SCRIPT,
+    CHECK_AND_INCREMENT_MANY_SHA,
+    CHECK_AND_INCREMENT_SCRIPT,
+    CHECK_AND_INCREMENT_SHA,
+    FETCH_AND_INCREMENT_SCRIPT,
+    FETCH_AND_INCREMENT_SHA,
+    RedisLookupStore,
+)
+from .redis_stand_in import InProcessRedisServer, lua_script_handler
+
+
+class TestRedisLookupStore:
+    @pytest.fixture
+    def server(self):
+        with InProcessRedisServer() as server:
+            yield server
+
+    @pytest.fixture
+    def store(self, server):
+        store = RedisLookupStore(server.host, server.port)
+        yield store
+        store.close()
+
+    def test_increment_and_get(self, store, server):
+        for _ in range(3):
+            store.increment_limit_count_by_one("test_key", "/test", 1000)
+        store.increment_limit_count_by_one("test_key", "/test", 1001)
+
+        data = store.get("test_key", "/test")
+        assert dict(data.api_counts_by_epoch_time.items()) == {1000: 3, 1001: 1}
+        assert server._cmd_ttl("rl:test_key:/test") > 0
+
+    def test_ttl_codes(self, server):
+        assert server.dispatch(["TTL", "missing"]) == -2
+        server.dispatch(["HINCRBY", "key", "1000", "1"])
+        assert server.dispatch(["TTL", "key"]) == -1
+        server.dispatch(["EXPIRE", "key", "60"])
+        assert 0 < server.dispatch(["TTL", "key"]) <= 60
+        server.dispatch(["HDEL", "key", "1000"])
+        assert server.dispatch(["TTL", "key"]) == -2
+
+    def test_keys_do_not_collide(self, store):
+        store.increment_limit_count_by_one("a:b", "/c", 1000)
+        store.increment_limit_count_by_one("a", "b:/c", 1000)
+        assert store.get("a:b", "/c").api_counts_by_epoch_time[1000] == 1
+        assert store.get("a", "b:/c").api_counts_by_epoch_time[1000] == 1
+
+    def test_check_and_increment_per_second_limit(self, store):
+        results = [
+            store.check_and_increment("test_key", "/test", 1000)
+            for _ in range(DEFAULT_LIMIT_PER_SECOND + 1)
+        ]
+        assert all(results)
+        assert store.get("test_key", "/test").api_counts_by_epoch_time[1000] == (
+            DEFAULT_LIMIT_PER_SECOND + 1
+        )
+
+    def test_check_and_increment_matches_rate_limiter(self, store):
+        rate_limiter = RateLimiter()
+        for burst_num in range(DEFAULT_NUMBER_OF_BURST_PER_MINUTE + 1):
+            epoch_time = 1000 + burst_num
+            for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND + 1):
+                api_data = ApiData("test_key", "/test", epoch_time)
+                expected = rate_limiter.is_request_allowed(api_data)
+                rate_limiter.increase_incoming_request_count(api_data)
+                assert store.check_and_increment("test_key", "/test", epoch_time) is (
+                    expected
+                )
+
+        assert store.check_and_increment("test_key", "/test", 1002) is False
+        assert store.check_and_increment("test_key", "/test", 1061) is True
+
+    def test_decision_is_one_round_trip(self, store, server):
+        store.check_and_increment("test_key", "/test", 1000)
+        before = server.commands_processed
+        store.check_and_increment("test_key", "/test", 1000)
+        assert server.commands_processed - before == 1
+
+    def test_expired_seconds_are_pruned(self, store, server):
+        store.check_and_increment("test_key", "/test", 1000)
+        store.check_and_increment("test_key", "/test", 1100)
+        assert server.hashes["rl:test_key:/test"] == {1100: 1}
+
+    def test_rate_limiter_with_redis_store(self, store):
+        rate_limiter = RateLimiter(store)
+        api_data = ApiData("test_key", "/test", 1000)
+        for _ in range(DEFAULT_LIMIT_PER_SECOND + 1):
+            rate_limiter.increase_incoming_request_count(api_data)
+        assert rate_limiter.is_request_under_per_second_limit(api_data) is False
+
+    def test_fetch_and_increment(self, store):
+        for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND):
+            store.fetch_and_increment("test_key", "/test", 1000)
+        counts = store.fetch_and_increment("test_key", "/test", 1001)
+        assert counts == WindowCounts(count=0, bursts=1)
+
+    def test_acquire_with_redis_store(self, store):
+        rate_limiter = RateLimiter(store)
+        decision = rate_limiter.acquire(ApiData("test_key", "/test", 1000))
+        assert decision.allowed is True
+        assert decision.remaining_per_second == DEFAULT_LIMIT_PER_SECOND
+
+
+def run_scripts(store: RedisLookupStore) -> list:
+    """Drive both scripts through bursts, pruning and window expiry."""
+    keys = [RateLimiterKey("a", "/x"), RateLimiterKey("b", "/y")]
+    limits = [RateLimits(2, 4, 1), RateLimits()]
+    results = []
+    for epoch_time in (1000, 1001, 1002, 1030, 1061, 1062, 1200):
+        for _ in range(6):
+            results.append(store.fetch_and_increment_many(keys, epoch_time, limits))
+            results.append(store.check_and_increment_many(keys, epoch_time, limits))
+            results.append(store.check_and_increment("c", "/z", epoch_time))
+        for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND):
+            results.append(store.check_and_increment("d", "/z", epoch_time))
+    return results
+
+
+class TestRedisScripts:
+    """
+    The stand-in runs Python twins of the Lua scripts, so it can only vouch for
+    the scripts while the two stay in sync. With lupa installed the Lua itself
+    is run against the twins; a real Redis server is used where one is up.
+    """
+
+    def test_scripts_are_pinned(self):
+        # Changing a script changes its SHA. Update the twin in redis_stand_in.py
+        # to match, check it with lupa installed, then update the SHA here.
+        assert CHECK_AND_INCREMENT_SHA == "c4a8f818761f5502200d45afd30b80196df78f29"
+        assert FETCH_AND_INCREMENT_SHA == "d262850216222b94b9c82e300229ae2fbaa633b2"
+        assert (
+            CHECK_AND_INCREMENT_MANY_SHA == "46babf8d72800a45f4e2a9372ef50ad71abb2279"
+        )
+
+    def test_lua_scripts_match_their_python_twins(self):
+        pytest.importorskip("lupa")
+        with InProcessRedisServer() as twins, InProcessRedisServer() as lua:
+            for source in (
+                CHECK_AND_INCREMENT_SCRIPT,
+                FETCH_AND_INCREMENT_SCRIPT,
+                CHECK_AND_INCREMENT_MANY_SCRIPT,
+            ):
+                lua.register_script(source, lua_script_handler(source))
+            stores = [RedisLookupStore(s.host, s.port) for s in (twins, lua)]
+            try:
+                assert run_scripts(stores[0]) == run_scripts(stores[1])
+            finally:
+                for store in stores:
+                    store.close()
+        assert twins.hashes == lua.hashes
+
+    @pytest.fixture
+    def redis_address(self):
+        host, _, port = os.environ.get("REDIS_ADDRESS", "localhost:6379").partition(":")
+        try:
+            socket.create_connection((host, int(port or 6379)), timeout=0.5).close()
+        except OSError:
+            pytest.skip("no Redis server to run the Lua scripts against")
+        return host, int(port or 6379)
+
+    def test_lua_scripts_on_real_redis_match_stand_in(self, redis_address):
+        real = RedisLookupStore(*redis_address, key_prefix=f"rl-test-{uuid.uuid4()}")
+        try:
+            with InProcessRedisServer() as server:
+                stand_in = RedisLookupStore(server.host, server.port)
+                try:
+                    assert run_scripts(real) == run_scripts(stand_in)
+                finally:
+                    stand_in.close()
+        finally:
+            for key in (("a", "/x"), ("b", "/y"), ("c", "/z"), ("d", "/z")):
+                real.connection.execute("DEL", real._key(*key))
+            real.close()
@@ -0,0 +1,130 @@
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .lookup_store import (
+    DEFAULT_BURST_LIMIT_PER_SECOND,
+    DEFAULT_LIMIT_PER_SECOND,
+    LookupStore,
+)
+from .replication import RegionReplica, ReplicationBus, ReplicationDelta
+
+
+class TestRegionReplica:
+    @pytest.fixture
+    def regions(self):
+        r1 = RegionReplica("R1", LookupStore())
+        r2 = RegionReplica("R2", LookupStore())
+        return r1, r2, ReplicationBus([r1, r2])
+
+    def count(self, replica, epoch_time=101):
+        data = replica.get("abc", "/users/:id")
+        return data.api_counts_by_epoch_time.get(epoch_time, 0)
+
+    def test_counts_converge_after_flush(self, regions):
+        r1, r2, bus = regions
+        for _ in range(21):
+            r1.increment_limit_count_by_one("abc", "/users/:id", 101)
+        for _ in range(2):
+            r2.increment_limit_count_by_one("abc", "/users/:id", 101)
+
+        assert (self.count(r1), self.count(r2)) == (21, 2)
+        bus.flush_all()
+        assert (self.count(r1), self.count(r2)) == (23, 23)
+        assert r1.global_count("abc", "/users/:id", 101) == 23
+
+    def test_merge_is_idempotent_and_order_free(self, regions):
+        r1, r2, _ = regions
+        r1.increment_limit_count_by_one("abc", "/users/:id", 101)
+        first = r1.flush()
+        r1.increment_limit_count_by_one("abc", "/users/:id", 101)
+        second = r1.flush()
+
+        # Delivered out of order and duplicated.
+        for delta in (second, first, second, first):
+            r2.merge(delta)
+        assert self.count(r2) == 2
+
+    def test_bursts_merged_out_of_order(self, regions):
+        r1, r2, _ = regions
+        burst = DEFAULT_BURST_LIMIT_PER_SECOND
+        r1.increment_limit_count("abc", "/users/:id", 101, burst)
+        r2.increment_limit_count("abc", "/users/:id", 102, burst)
+        # R1's older burst reaches R2 after R2's own newer one.
+        r2.merge(r1.flush())
+        data = r2.get("abc", "/users/:id")
+        assert list(data.burst_epoch_times) == [101, 102]
+        assert data.bursts_in_window(102) == 2
+
+        r2.increment_limit_count("abc", "/users/:id", 162, burst)
+        data = r2.get("abc", "/users/:id")
+        assert list(data.burst_epoch_times) == [102, 162]
+        assert data.bursts_in_window(162) == 2
+
+    def test_flush_is_in_second_order(self, regions):
+        r1, r2, _ = regions
+        for epoch_time in (103, 101, 102):
+            r1.increment_limit_count_by_one("xyz", "/users/:id", epoch_time)
+            r1.increment_limit_count_by_one("abc", "/users/:id", epoch_time)
+        delta = r1.flush()
+        assert [epoch_time for _, epoch_time in delta.counts] == [
+            101,
+            101,
+            102,
+            102,
+            103,
+            103,
+        ]
+
+    def test_own_delta_is_ignored(self, regions):
+        r1, _, _ = regions
+        r1.increment_limit_count_by_one("abc", "/users/:id", 101)
+        r1.merge(r1.flush())
+        assert self.count(r1) == 1
+
+    def test_flush_only_after_interval(self):
+        replica = RegionReplica("R1", flush_interval_ms=100)
+        replica.increment_limit_count_by_one("abc", "/users/:id", 101)
+        assert replica.maybe_flush(replica.last_flush_ms + 50) is None
+        delta = replica.maybe_flush(replica.last_flush_ms + 100)
+        assert delta is not None
+        assert list(delta.counts.values()) == [1]
+
+    def test_flush_sends_only_changed_buckets(self, regions):
+        r1, _, _ = regions
+        r1.increment_limit_count_by_one("abc", "/users/:id", 101)
+        r1.flush()
+        r1.increment_limit_count_by_one("abc", "/users/:id", 102)
+        assert [epoch for _, epoch in r1.flush().counts] == [102]
+
+    def test_old_buckets_are_pruned(self, regions):
+        r1, r2, _ = regions
+        r1.increment_limit_count_by_one("abc", "/users/:id", 100)
+        stale = r1.flush()
+        r2.increment_limit_count_by_one("abc", "/users/:id", 1000)
+        r2.flush()
+        r1.increment_limit_count_by_one("abc", "/users/:id", 1000)
+        r1.flush()
+
+        assert all(epoch == 1000 for _, epoch in r1.counters)
+        r2.merge(stale)
+        assert all(epoch == 1000 for _, epoch in r2.counters)
+
+    def test_global_key_is_enforced_across_regions(self, regions):
+        r1, r2, bus = regions
+        limiter_r1, limiter_r2 = RateLimiter(r1), RateLimiter(r2)
+        api_data = ApiData("abc", "/users/:id", 101)
+
+        for _ in range(DEFAULT_LIMIT_PER_SECOND):
+            limiter_r1.acquire(api_data)
+        bus.flush_all()
+        limiter_r2.acquire(api_data)
+
+        assert limiter_r2.is_request_under_per_second_limit(api_data) is False
+
+    def test_delta_carries_totals(self):
+        replica = RegionReplica("R1")
+        for _ in range(3):
+            replica.increment_limit_count_by_one("abc", "/users/:id", 101)
+        delta = replica.flush()
+        assert isinstance(delta, ReplicationDelta)
+        assert delta.region == "R1"
+        assert list(delta.counts.values()) == [3]
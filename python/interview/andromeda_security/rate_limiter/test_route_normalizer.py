@@ -0,0 +1,68 @@
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .route_normalizer import UNMATCHED_ROUTE, RouteNormalizer
+
+TEMPLATES = (
+    "/users/:id",
+    "/users/me",
+    "/users/:id/orders",
+    "/users/:id/orders/:order_id",
+    "/health",
+)
+
+
+class TestRouteNormalizer:
+    @pytest.fixture
+    def normalizer(self):
+        return RouteNormalizer(TEMPLATES)
+
+    @pytest.mark.parametrize(
+        "path, expected",
+        [
+            ("/users/123", "/users/:id"),
+            ("/users/me", "/users/me"),
+            ("/users/me/orders", "/users/:id/orders"),
+            ("/users/123/orders/9", "/users/:id/orders/:order_id"),
+            ("/users/123/orders/9/", "/users/:id/orders/:order_id"),
+            ("/users/123?expand=orders", "/users/:id"),
+            ("/health", "/health"),
+            ("/", UNMATCHED_ROUTE),
+            ("/users", UNMATCHED_ROUTE),
+            ("/users/123/orders/9/items", UNMATCHED_ROUTE),
+            ("/random/junk", UNMATCHED_ROUTE),
+        ],
+    )
+    def test_normalize(self, normalizer, path, expected):
+        assert normalizer.normalize(path) == expected
+
+    def test_hot_paths_are_cached(self, normalizer):
+        for _ in range(3):
+            normalizer.normalize("/users/123")
+        assert normalizer.normalize.cache_info().hits == 2
+
+    def test_cache_is_bounded(self):
+        normalizer = RouteNormalizer(TEMPLATES, cache_size=8)
+        for i in range(100):
+            normalizer.normalize(f"/users/{i}")
+        assert normalizer.normalize.cache_info().currsize == 8
+
+    def test_adding_template_clears_cache(self, normalizer):
+        assert normalizer.normalize("/teams/1") == UNMATCHED_ROUTE
+        normalizer.add_template("/teams/:team_id")
+        assert normalizer.normalize("/teams/1") == "/teams/:team_id"
+
+
+class TestRateLimiterWithRouteNormalizer:
+    def test_raw_paths_share_one_key(self):
+        rate_limiter = RateLimiter(route_normalizer=RouteNormalizer(TEMPLATES))
+        for user_id in range(50):
+            rate_limiter.acquire(ApiData("test_key", f"/users/{user_id}", 1000))
+        for i in range(50):
+            rate_limiter.acquire(ApiData("test_key", f"/junk/{i}/path", 1000))
+
+        assert set(rate_limiter.lookup_store) == {
+            ("test_key", "/users/:id"),
+            ("test_key", UNMATCHED_ROUTE),
+        }
+        data = rate_limiter.lookup_store.get("test_key", "/users/:id")
+        assert data.api_counts_by_epoch_time[1000] == 50
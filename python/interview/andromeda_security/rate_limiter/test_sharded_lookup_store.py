@@ -0,0 +1,140 @@
+import sys
+import threading
+
+import pytest
+from .lookup_store import DEFAULT_BURST_LIMIT_PER_SECOND
+from .sharded_lookup_store import ShardedLookupStore
+
+
+class TestShardedLookupStore:
+    @pytest.fixture(autouse=True)
+    def frequent_thread_switches(self):
+        """Switch threads far more often than usual to shake out races."""
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        yield
+        sys.setswitchinterval(interval)
+
+    def test_rejects_zero_stripes(self):
+        with pytest.raises(ValueError):
+            ShardedLookupStore(0)
+
+    def test_keys_are_spread_over_stripes(self):
+        store = ShardedLookupStore(8)
+        for i in range(100):
+            store.increment_limit_count_by_one(f"key_{i}", "/test", 1000)
+
+        assert len(store) == 100
+        assert sum(1 for stripe in store.stripes if stripe.data) > 1
+
+    def test_concurrent_increments_are_exact(self):
+        store = ShardedLookupStore(4)
+        number_of_threads = 16
+        increments_per_thread = 2000
+        keys = [(f"key_{i}", "/test") for i in range(8)]
+        start = threading.Barrier(number_of_threads)
+
+        def worker(thread_index):
+            start.wait()
+            for i in range(increments_per_thread):
+                api_key, api_route = keys[(thread_index + i) % len(keys)]
+                store.increment_limit_count_by_one(api_key, api_route, 1000 + i % 3)
+
+        threads = [
+            threading.Thread(target=worker, args=(i,)) for i in range(number_of_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = sum(
+            sum(store.get(*key).api_counts_by_epoch_time.values()) for key in keys
+        )
+        assert total == number_of_threads * increments_per_thread
+
+    def test_concurrent_bursts_are_recorded_once(self):
+        store = ShardedLookupStore(4)
+        number_of_threads = 8
+        per_thread = DEFAULT_BURST_LIMIT_PER_SECOND
+        start = threading.Barrier(number_of_threads)
+
+        def worker():
+            start.wait()
+            for _ in range(per_thread):
+                store.increment_limit_count_by_one("test_key", "/test", 1000)
+
+        threads = [threading.Thread(target=worker) for _ in range(number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        data = store.get("test_key", "/test")
+        assert data.api_counts_by_epoch_time[1000] == number_of_threads * per_thread
+        assert list(data.burst_epoch_times) == [1000]
+
+    def test_concurrent_fetch_and_increment_sees_every_count_once(self):
+        store = ShardedLookupStore(4)
+        number_of_threads = 8
+        per_thread = 500
+        seen = []
+        start = threading.Barrier(number_of_threads)
+
+        def worker():
+            start.wait()
+            counts = [
+                store.fetch_and_increment("test_key", "/test", 1000).count
+                for _ in range(per_thread)
+            ]
+            seen.extend(counts)
+
+        threads = [threading.Thread(target=worker) for _ in range(number_of_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(seen) == list(range(number_of_threads * per_thread))
+
+    def test_get_returns_a_snapshot(self):
+        store = ShardedLookupStore(4)
+        store.increment_limit_count_by_one("test_key", "/test", 1000)
+        data = store.get("test_key", "/test")
+        store.increment_limit_count_by_one("test_key", "/test", 1000)
+
+        assert data.api_counts_by_epoch_time[1000] == 1
+        assert store.get("test_key", "/test").api_counts_by_epoch_time[1000] == 2
+
+    def test_concurrent_checks_do_not_disturb_bursts(self):
+        store = ShardedLookupStore(4)
+        number_of_seconds = 90
+        done = threading.Event()
+        errors = []
+
+        def writer():
+            for epoch_time in range(1000, 1000 + number_of_seconds):
+                for _ in range(DEFAULT_BURST_LIMIT_PER_SECOND):
+                    store.increment_limit_count_by_one("test_key", "/test", epoch_time)
+            done.set()
+
+        def reader():
+            while not done.is_set():
+                data = store.get("test_key", "/test")
+                try:
+                    for epoch_time in data.burst_epoch_times:
+                        data.bursts_in_window(epoch_time + 60)
+                except Exception as error:
+                    errors.append(error)
+
+        threads = [threading.Thread(target=writer)]
+        threads += [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        last_second = 1000 + number_of_seconds - 1
+        data = store.get("test_key", "/test")
+        assert errors == []
+        assert data.burst_epoch_times == list(range(last_second - 60, last_second + 1))
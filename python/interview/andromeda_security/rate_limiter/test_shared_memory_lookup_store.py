@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .hierarchical_rate_limiter import (
+    HierarchicalRateLimiter,
+    LimitPolicy,
+    RequestContext,
+)
+from .lookup_store import DEFAULT_BURST_LIMIT_PER_SECOND, LookupStore, RateLimits
+from .shared_memory_lookup_store import (
+    SharedMemoryLookupStore,
+    SharedTableFullError,
+)
+
+
+@pytest.fixture
+def store():
+    shared_store = SharedMemoryLookupStore(capacity=1024)
+    yield shared_store
+    shared_store.close()
+    shared_store.unlink()
+
+
+def traffic():
+    """Bursty traffic for a few keys over about two minutes."""
+    for epoch_time in range(1000, 1130):
+        for key_index in range(3):
+            bursting = (epoch_time + key_index) % 17 < 3
+            per_second = DEFAULT_BURST_LIMIT_PER_SECOND + 5 if bursting else 4
+            for _ in range(per_second):
+                yield ApiData(f"key_{key_index}", "/users/:id", epoch_time)
+
+
+# Attaches by name from an unrelated process, with its own resource tracker.
+ATTACH_AND_EXIT = """
+import importlib, sys
+module = importlib.import_module(sys.argv[1])
+store = module.SharedMemoryLookupStore(sys.argv[2])
+store.increment_limit_count_by_one("abc", "/users/:id", 1000)
+store.close()
+"""
+
+
+def hammer(store, requests):
+    for _ in range(requests):
+        store.fetch_and_increment("abc", "/users/:id", 1000)
+
+
+class TestSharedMemoryLookupStore:
+    def test_decisions_match_lookup_store(self, store):
+        expected = RateLimiter(LookupStore())
+        rate_limiter = RateLimiter(store)
+        for api_data in traffic():
+            assert rate_limiter.acquire(api_data) == expected.acquire(api_data)
+
+    def test_check_then_increment_matches_lookup_store(self, store):
+        expected = RateLimiter(LookupStore())
+        rate_limiter = RateLimiter(store)
+        for api_data in traffic():
+            assert rate_limiter.is_request_allowed(
+                api_data
+            ) is expected.is_request_allowed(api_data)
+            rate_limiter.increase_incoming_request_count(api_data)
+            expected.increase_incoming_request_count(api_data)
+
+    def test_hierarchical_decisions_match_lookup_store(self, store):
+        policies = (
+            LimitPolicy("tenant", ("tenant",), 20, 40, 1),
+            LimitPolicy("endpoint", ("api_key", "api_route"), 3, 6, 0),
+        )
+        expected = HierarchicalRateLimiter(policies, LookupStore())
+        rate_limiter = HierarchicalRateLimiter(policies, store)
+        for api_data in traffic():
+            context = RequestContext("acme", "alice", *api_data)
+            assert rate_limiter.acquire(context) == expected.acquire(context)
+        assert store.get("tenant:acme", "*").limits == RateLimits(20, 40, 1)
+
+    def test_attach_by_name_sees_the_same_counters(self, store):
+        store.increment_limit_count("abc", "/users/:id", 1000, 7)
+        attached = SharedMemoryLookupStore(store.name, lock=store.lock)
+        try:
+            data = attached.get("abc", "/users/:id")
+            assert data.api_counts_by_epoch_time[1000] == 7
+            attached.increment_limit_count_by_one("abc", "/users/:id", 1000)
+        finally:
+            attached.close()
+        assert store.get("abc", "/users/:id").api_counts_by_epoch_time[1000] == 8
+
+    def test_other_process_exiting_leaves_the_block(self):
+        owner = SharedMemoryLookupStore(capacity=16)
+        try:
+            # Reading stderr to the end also waits for the process's resource
+            # tracker, which holds it open and would unlink the block on exit.
+            child = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    ATTACH_AND_EXIT,
+                    SharedMemoryLookupStore.__module__,
+                    owner.name,
+                ],
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            assert "leaked" not in child.stderr
+            data = owner.get("abc", "/users/:id")
+            assert data.api_counts_by_epoch_time.count(1000) == 1
+        finally:
+            owner.close()
+            # Raises FileNotFoundError if the other process unlinked the block.
+            owner.unlink()
+
+    def test_unknown_key_is_not_stored(self, store):
+        assert store.get("abc", "/users/:id").api_counts_by_epoch_time == {}
+        assert len(store) == 0
+
+    def test_idle_slots_are_reused(self):
+        small_store = SharedMemoryLookupStore(capacity=2)
+        try:
+            small_store.increment_limit_count_by_one("a", "/x", 1000)
+            small_store.increment_limit_count_by_one("b", "/x", 1000)
+            with pytest.raises(SharedTableFullError):
+                small_store.increment_limit_count_by_one("c", "/x", 1001)
+            # A whole window later "a" and "b" no longer count for anything.
+            small_store.increment_limit_count_by_one("c", "/x", 1061)
+            assert small_store.get("c", "/x").api_counts_by_epoch_time[1061] == 1
+            assert len(small_store) == 2
+        finally:
+            small_store.close()
+            small_store.unlink()
+
+    def test_forked_workers_share_one_limit(self, store):
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=hammer, args=(store, 250)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert all(worker.exitcode == 0 for worker in workers)
+
+        data = store.get("abc", "/users/:id")
+        assert data.api_counts_by_epoch_time[1000] == 1000
+        assert data.burst_epoch_times == [1000]
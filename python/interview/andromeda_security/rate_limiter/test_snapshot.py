@@ -0,0 +1,178 @@
+import os
+import time
+
+import pytest
+from .api_rate_limiter import ApiData, RateLimiter
+from .compact_lookup_store import CompactLookupStore
+from .lookup_store import LookupStore, RateLimiterKey, RateLimits
+from .sharded_lookup_store import ShardedLookupStore
+from .snapshot import (
+    HEADER,
+    SnapshotError,
+    Snapshotter,
+    restore_snapshot,
+    write_snapshot,
+)
+
+STORES = (LookupStore, ShardedLookupStore, CompactLookupStore)
+
+
+def burst(rate_limiter, api_key, epoch_time, requests=101):
+    api_data = ApiData(api_key, "/users/:id", epoch_time)
+    for _ in range(requests):
+        rate_limiter.increase_incoming_request_count(api_data)
+
+
+@pytest.mark.parametrize("make_store", STORES)
+class TestSnapshot:
+    def test_restored_store_keeps_enforcing(self, make_store, tmp_path):
+        path = tmp_path / "store.snapshot"
+        rate_limiter = RateLimiter(make_store())
+        for epoch_time in (1000, 1001, 1002):
+            burst(rate_limiter, "abc", epoch_time)
+        api_data = ApiData("abc", "/users/:id", 1003)
+        burst(rate_limiter, "abc", 1003, requests=11)
+        assert not rate_limiter.is_request_allowed(api_data)
+
+        assert write_snapshot(rate_limiter.lookup_store, path, 1003) == 1
+        restarted = RateLimiter(make_store())
+        assert restore_snapshot(restarted.lookup_store, path) == 1
+        # Three bursts in the window and over the per second limit, so the
+        # restart did not hand the client a fresh allowance.
+        assert not restarted.is_request_allowed(api_data)
+        assert restarted.acquire(api_data) == rate_limiter.acquire(api_data)
+
+    def test_limits_survive_restore(self, make_store, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = make_store()
+        premium = RateLimits(50, 200, 5)
+        store.fetch_and_increment_many(
+            [RateLimiterKey("abc", "/users/:id")], 1000, [premium]
+        )
+        write_snapshot(store, path, 1000)
+        restarted = make_store()
+        restore_snapshot(restarted, path)
+        assert restarted.get("abc", "/users/:id").limits == premium
+
+    def test_idle_keys_are_left_out(self, make_store, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = make_store()
+        store.increment_limit_count_by_one("old", "/users/:id", 1000)
+        store.increment_limit_count_by_one("new", "/users/:id", 1100)
+        assert write_snapshot(store, path, 1100) == 1
+        restarted = make_store()
+        restore_snapshot(restarted, path)
+        assert list(restarted) == [RateLimiterKey("new", "/users/:id")]
+
+
+class TestSnapshotFile:
+    def test_rejects_other_files(self, tmp_path):
+        path = tmp_path / "not_a.snapshot"
+        path.write_bytes(b"x" * HEADER.size)
+        with pytest.raises(SnapshotError):
+            restore_snapshot(LookupStore(), path)
+        path.write_bytes(b"x")
+        with pytest.raises(SnapshotError):
+            restore_snapshot(LookupStore(), path)
+
+    def test_rejects_truncated_file(self, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = LookupStore()
+        store.increment_limit_count_by_one("abc", "/users/:id", 1000)
+        write_snapshot(store, path, 1000)
+        path.write_bytes(path.read_bytes()[:-3])
+        with pytest.raises(SnapshotError):
+            restore_snapshot(LookupStore(), path)
+
+    def test_compact_size(self, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = LookupStore()
+        for i in range(1000):
+            store.increment_limit_count_by_one(f"key_{i:04}", "/users/:id", 1000)
+        write_snapshot(store, path, 1000)
+        # 18 byte record, 8 + 10 bytes of strings and one 5 byte count entry.
+        assert os.path.getsize(path) == HEADER.size + 1000 * 41
+
+    def test_restore_speed(self, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = LookupStore()
+        for i in range(10_000):
+            store.increment_limit_count(f"key_{i}", "/users/:id", 1000, 5)
+        write_snapshot(store, path, 1000)
+        start = time.perf_counter()
+        restore_snapshot(LookupStore(), path)
+        # Generous bound for slow CI machines; locally this is well under 100ms.
+        assert time.perf_counter() - start < 1
+
+
+class TestSnapshotter:
+    def test_cold_start_without_file(self, tmp_path):
+        snapshotter = Snapshotter(LookupStore(), tmp_path / "missing.snapshot")
+        assert snapshotter.restore() == 0
+
+    def test_periodic_snapshots(self, tmp_path):
+        path = tmp_path / "store.snapshot"
+        store = LookupStore()
+        store.increment_limit_count_by_one("abc", "/users/:id", 1000)
+        snapshotter = Snapshotter(store, path, 0.01, clock=lambda: 1000)
+        snapshotter.start()
+        deadline = time.monotonic() + 2
+        while snapshotter.snapshots_taken < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        snapshotter.stop()
+
+        restarted = Snapshotter(LookupStore(), path)
+        assert restarted.restore() == 1
+        assert restarted.store.get("abc", "/users/:id").api_counts_by_epoch_time == {
+            1000: 1
+        }
+
+    @pytest.mark.parametrize("make_store", STORES)
+    def test_snapshots_while_store_is_written(self, make_store, tmp_path):
+        class BusyStore:
+            """Traffic for new keys and routes lands between the snapshot's reads."""
+
+            def __init__(self, store):
+                self.store = store
+                self.writes = 0
+
+            def write(self):
+                self.writes += 1
+                self.store.increment_limit_count_by_one(
+                    f"new_{self.writes}", f"/route_{self.writes % 3}", 1000
+                )
+
+            def __iter__(self):
+                for key in self.store:
+                    self.write()
+                    yield key
+
+            def get(self, api_key, api_route):
+                self.write()
+                return self.store.get(api_key, api_route)
+
+        store = make_store()
+        for i in range(10):
+            store.increment_limit_count_by_one(f"key_{i}", "/test", 1000)
+        path = tmp_path / "store.snapshot"
+        snapshotter = Snapshotter(BusyStore(store), path, clock=lambda: 1000)
+
+        assert snapshotter.snapshot() >= 10
+        assert restore_snapshot(LookupStore(), path) >= 10
+
+    def test_failed_snapshot_is_counted(self, tmp_path):
+        class BrokenStore(LookupStore):
+            def __iter__(self):
+                raise RuntimeError("dictionary changed size during iteration")
+
+        snapshotter = Snapshotter(BrokenStore(), tmp_path / "store.snapshot", 0.001)
+        snapshotter.start()
+        deadline = time.monotonic() + 2
+        while snapshotter.snapshot_errors < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        # The final snapshot on stop is not caught, the caller sees it fail.
+        with pytest.raises(RuntimeError):
+            snapshotter.stop()
+        assert snapshotter.snapshots_taken == 0
@@ -0,0 +1,264 @@
+"""
+Compare calculate_cost (BFS, fewest stops) with cheapest_route (Dijkstra).
+
+Builds random connection graphs with tens of thousands of connections and
+times both searches over the same source/destination pairs, along with how
+often and by how much the BFS route costs more than the cheapest one. The
+same Dijkstra is timed over the CompiledGraph arrays too, and the memory of
+both graph forms is compared. Last, a pricing run of many pairs over few
+sources is timed with calculate_cost per pair, again from its route cache,
+and with calculate_costs. Then loading a feed of that many connections is
+compared between from_str and ShippingFeedReader, by time and peak memory.
+Then cheapest_routes is timed for k best and constrained routes on a
+network of 100k connections, and on the same network cheapest_route's
+Dijkstra, bidirectional and A* searches are compared by time and by the
+stops they expand.
+
+Run from the interview directory:
+    python -m stripe.bench_shipping_cost [number_of_connections ...]
+"""
+
+import gc
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+from .shipping_cost import (
+    SEARCHES,
+    ShippingConnection,
+    ShippingCostCalculator,
+    ShippingFeedReader,
+)
+
+QUERIES = 200
+BATCH_SOURCES = 50
+BATCH_PAIRS = 1_000
+
+
+def random_connections(
+    stops: int, connections: int, seed: int = 42
+) -> list[ShippingConnection]:
+    randomizer = random.Random(seed)
+    names = [f"S{i}" for i in range(stops)]
+    return [
+        ShippingConnection(
+            randomizer.choice(names),
+            randomizer.choice(names),
+            f"Airline{randomizer.randrange(20)}",
+            Decimal(randomizer.randint(1, 100)),
+        )
+        for _ in range(connections)
+    ]
+
+
+def time_queries(search, queries: list[tuple[str, str]]) -> tuple[float, list]:
+    routes = []
+    start = time.perf_counter()
+    for source, destination in queries:
+        try:
+            routes.append(search(source, destination))
+        except LookupError:
+            routes.append(None)
+    return time.perf_counter() - start, routes
+
+
+def allocated_bytes(build):
+    """The object build returns, and the bytes allocated while building it."""
+    gc.collect()
+    tracemalloc.start()
+    built = build()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, used
+
+
+def main(connection_counts: list[int]) -> None:
+    print(
+        f"{'connections':>12}{'stops':>8}{'bfs ms/q':>10}{'dijkstra ms/q':>15}"
+        f"{'compiled ms/q':>15}{'bfs pricier':>13}{'avg overpay':>13}"
+        f"{'graph MB':>10}{'compiled MB':>13}"
+    )
+    for connections in connection_counts:
+        stops = connections // 10
+        # The calculator keeps its ShippingConnection and Decimal objects alive,
+        # so they count towards it; the compiled graph only keeps the names.
+        calculator, graph_bytes = allocated_bytes(
+            lambda: ShippingCostCalculator(
+                random_connections(stops, connections), route_cache_size=0
+            )
+        )
+        compiled, compiled_bytes = allocated_bytes(calculator.compile)
+        randomizer = random.Random(7)
+        queries = [
+            (f"S{randomizer.randrange(stops)}", f"S{randomizer.randrange(stops)}")
+            for _ in range(QUERIES)
+        ]
+        bfs_time, bfs_routes = time_queries(calculator.calculate_cost, queries)
+        dijkstra_time, cheapest_routes = time_queries(
+            calculator.cheapest_route, queries
+        )
+        compiled_time, compiled_routes = time_queries(compiled.cheapest_route, queries)
+        assert [route and route.cost for route in compiled_routes] == [
+            route and route.cost for route in cheapest_routes
+        ]
+
+        overpaid = [
+            bfs.cost - cheapest.cost
+            for bfs, cheapest in zip(bfs_routes, cheapest_routes)
+            if bfs is not None and cheapest is not None and bfs.cost > cheapest.cost
+        ]
+        average_overpay = sum(overpaid) / len(overpaid) if overpaid else 0
+        print(
+            f"{connections:>12,}{stops:>8,}{bfs_time / QUERIES * 1000:>10.2f}"
+            f"{dijkstra_time / QUERIES * 1000:>15.2f}"
+            f"{compiled_time / QUERIES * 1000:>15.2f}"
+            f"{len(overpaid) / QUERIES:>13.0%}{average_overpay:>13.1f}"
+            f"{graph_bytes / 1e6:>10.1f}{compiled_bytes / 1e6:>13.1f}"
+        )
+
+
+def batch(connections: int) -> None:
+    stops = connections // 10
+    calculator = ShippingCostCalculator(
+        random_connections(stops, connections), route_cache_size=BATCH_PAIRS
+    )
+    randomizer = random.Random(11)
+    sources = [f"S{randomizer.randrange(stops)}" for _ in range(BATCH_SOURCES)]
+    pairs = [
+        (randomizer.choice(sources), f"S{randomizer.randrange(stops)}")
+        for _ in range(BATCH_PAIRS)
+    ]
+    per_pair_time, per_pair_routes = time_queries(calculator.calculate_cost, pairs)
+    print(
+        f"\n{BATCH_PAIRS:,} pairs from {BATCH_SOURCES} sources,"
+        f" {connections:,} connections"
+    )
+    print(f"{'calculate_cost per pair':<32}{per_pair_time:>8.3f}s")
+    cached_time, cached_routes = time_queries(calculator.calculate_cost, pairs)
+    assert cached_routes == per_pair_routes
+    print(f"{'calculate_cost again, cached':<32}{cached_time:>8.3f}s")
+    for max_workers in (1, 4):
+        start = time.perf_counter()
+        routes = calculator.calculate_costs(pairs, max_workers)
+        elapsed = time.perf_counter() - start
+        assert routes == per_pair_routes
+        print(f"{f'calculate_costs(max_workers={max_workers})':<32}{elapsed:>8.3f}s")
+
+
+def seconds_and_peak_bytes(load) -> tuple[float, int]:
+    # Timed on its own, since tracemalloc slows every allocation down.
+    gc.collect()
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def loading(connections: int) -> None:
+    feed = ",".join(
+        f"{c.source}:{c.destination}:{c.airline}:{c.cost}"
+        for c in random_connections(connections // 10, connections)
+    )
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as file:
+        file.write(feed)
+        file.flush()
+        del feed
+
+        def from_str():
+            with open(file.name, encoding="utf-8") as text:
+                return ShippingCostCalculator.from_str(text.read())
+
+        def streamed():
+            with open(file.name, "rb") as binary:
+                return ShippingCostCalculator(ShippingFeedReader(binary))
+
+        print(f"\nloading {connections:,} connections")
+        for name, load in (("from_str", from_str), ("ShippingFeedReader", streamed)):
+            elapsed, peak = seconds_and_peak_bytes(load)
+            print(f"{name:<32}{elapsed:>8.3f}s{peak / 1e6:>8.1f} MB peak")
+
+
+def constrained(connections: int = 100_000, queries: int = 20) -> None:
+    stops = connections // 10
+    calculator = ShippingCostCalculator(random_connections(stops, connections))
+    randomizer = random.Random(13)
+    pairs = [
+        (f"S{randomizer.randrange(stops)}", f"S{randomizer.randrange(stops)}")
+        for _ in range(queries)
+    ]
+    half_the_airlines = {f"Airline{i}" for i in range(10)}
+    searches = {
+        "cheapest_route": calculator.cheapest_route,
+        "k=1": lambda s, d: calculator.cheapest_routes(s, d, 1),
+        "k=5": lambda s, d: calculator.cheapest_routes(s, d, 5),
+        "k=10": lambda s, d: calculator.cheapest_routes(s, d, 10),
+        "k=5, max_legs=4": lambda s, d: calculator.cheapest_routes(s, d, 5, max_legs=4),
+        "k=5, half the airlines": lambda s, d: calculator.cheapest_routes(
+            s, d, 5, airlines=half_the_airlines
+        ),
+    }
+    print(f"\n{queries} queries, {connections:,} connections")
+    print(f"{'search':<32}{'ms/q':>8}{'routes/q':>10}")
+    for name, search in searches.items():
+        elapsed, results = time_queries(search, pairs)
+        found = [
+            result if isinstance(result, list) else [result]
+            for result in results
+            if result
+        ]
+        routes = sum(len(result) for result in found) / queries
+        print(f"{name:<32}{elapsed / queries * 1000:>8.1f}{routes:>10.1f}")
+
+
+def search_modes(connections: int = 100_000, queries: int = 50) -> None:
+    stops = connections // 10
+    calculator = ShippingCostCalculator(random_connections(stops, connections))
+    randomizer = random.Random(17)
+    pairs = [
+        (f"S{randomizer.randrange(stops)}", f"S{randomizer.randrange(stops)}")
+        for _ in range(queries)
+    ]
+    # Landmarks are picked on the first A* query; time that separately.
+    start = time.perf_counter()
+    calculator.cheapest_route(*pairs[0], search="astar")
+    landmarks_time = time.perf_counter() - start
+
+    print(f"\n{queries} queries, {connections:,} connections")
+    print(f"{'search':<32}{'ms/q':>8}{'expanded/q':>12}")
+    expected = None
+    for search in SEARCHES:
+        expanded = 0
+
+        def route(source, destination):
+            nonlocal expanded
+            try:
+                return calculator.cheapest_route(source, destination, search)
+            finally:
+                expanded += calculator.expanded_stops
+
+        elapsed, routes = time_queries(route, pairs)
+        costs = [route and route.cost for route in routes]
+        assert expected is None or costs == expected
+        expected = costs
+        print(
+            f"{search:<32}{elapsed / queries * 1000:>8.1f}"
+            f"{expanded / queries:>12,.0f}"
+        )
+    print(f"{'astar landmarks, once':<32}{landmarks_time * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 20_000, 40_000, 80_000]
+    main(counts)
+    batch(counts[-1])
+    loading(counts[-1] * 10)
+    constrained()
+    search_modes()
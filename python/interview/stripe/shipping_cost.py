@@ -10,10 +10,35 @@ and output a route that you can take to reach the destination.
 The output should be in the format: return {'route': 'US -> UK -> FR', 'method': 'RyanAir -> Jet1', 'cost': 10}
 """
 
-from collections import deque
-from collections import defaultdict
-from decimal import Decimal
-from typing import NamedTuple, Sequence
+import bisect
+import heapq
+import math
+import os
+import sys
+from array import array
+from collections import deque, defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from typing import (
+    BinaryIO,
+    Callable,
+    Collection,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Sequence,
+)
+
+DEFAULT_ROUTE_CACHE_SIZE = 4096
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_LANDMARKS = 8
+SEARCHES = ("dijkstra", "bidirectional", "astar")
+# Range of the signed 64 bit "q" arrays CompiledGraph stores costs in.
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+
+# A connection as routes record it: source, destination and airline.
+ConnectionKey = tuple[str, str, str]
 
 
 class ShippingConnection(NamedTuple):
@@ -34,11 +59,329 @@ class Route(NamedTuple):
     cost: Decimal
 
 
-class ShippingCostCalculator:
+class MalformedRecord(NamedTuple):
+    offset: int
+    record: bytes
+    reason: str
+
+
+class ShippingFeedReader:
+    """
+    Streams ShippingConnections out of a large feed, one chunk at a time.
+
+    The feed is a binary file, or anything else with `read(size)` such as an
+    `mmap.mmap`, holding "Source:Destination:Airline:Cost" records separated
+    by commas or newlines. Only one chunk and the record cut off at its end
+    are held at a time, so the feed never has to fit in memory. Stop and
+    airline names are interned and repeated costs share one Decimal, which
+    keeps the connections of a big network small too.
+
+    Malformed records are skipped rather than ending the run: `malformed`
+    keeps the first `max_reported` of them with their byte offsets and
+    `malformed_count` counts them all.
+
+        with open(path, "rb") as feed:
+            reader = ShippingFeedReader(feed)
+            calculator = ShippingCostCalculator(reader)
+    """
+
+    # Costs usually repeat a lot; past this many distinct ones stop caching.
+    MAX_CACHED_COSTS = 4096
+
+    def __init__(
+        self,
+        feed: BinaryIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_reported: int = 100,
+    ):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.feed = feed
+        self.chunk_size = chunk_size
+        self.max_reported = max_reported
+        self.malformed: list[MalformedRecord] = []
+        self.malformed_count = 0
+        self._costs: dict[str, Decimal] = {}
+
+    def __iter__(self) -> Iterator[ShippingConnection]:
+        pending = b""
+        offset = 0
+        while chunk := self.feed.read(self.chunk_size):
+            # Same length replacement, so byte offsets stay right.
+            records = (pending + chunk.replace(b"\n", b",")).split(b",")
+            # The last record may go on in the next chunk.
+            pending = records.pop()
+            for record in records:
+                connection = self._parse(record, offset)
+                offset += len(record) + 1
+                if connection is not None:
+                    yield connection
+        connection = self._parse(pending, offset)
+        if connection is not None:
+            yield connection
+
+    def _parse(self, record: bytes, offset: int) -> ShippingConnection | None:
+        try:
+            text = record.decode().strip()
+        except UnicodeDecodeError:
+            return self._report(offset, record, "not UTF-8")
+        if not text:
+            return None
+        fields = text.split(":")
+        if len(fields) != 4:
+            return self._report(offset, record, f"expected 4 fields, got {len(fields)}")
+        source, destination, airline, cost_text = fields
+        cost = self._costs.get(cost_text)
+        if cost is None:
+            try:
+                cost = Decimal(cost_text)
+            except InvalidOperation:
+                cost = None
+            if cost is None or not cost.is_finite():
+                return self._report(offset, record, "cost is not a finite number")
+            if len(self._costs) < self.MAX_CACHED_COSTS:
+                self._costs[cost_text] = cost
+        return ShippingConnection(
+            sys.intern(source), sys.intern(destination), sys.intern(airline), cost
+        )
+
+    def _report(self, offset: int, record: bytes, reason: str) -> None:
+        self.malformed_count += 1
+        if len(self.malformed) < self.max_reported:
+            self.malformed.append(MalformedRecord(offset, record, reason))
+
+
+class _Landmarks(NamedTuple):
+    """
+    Cheapest costs between a few landmark stops and every other stop, as one
+    list per stop with an entry per landmark, None where there is no route.
+    Stops that no landmark connects with either way are left out.
+    """
+
+    stops: list[str]
+    costs_to: dict[str, list[Decimal | None]]
+    costs_from: dict[str, list[Decimal | None]]
+
+
+class _Bounds(NamedTuple):
+    """What cheapest_routes knows about the way on to its destination."""
+
+    # Cheapest cost to the destination, for the stops the backward search
+    # settled; every other stop is at least `radius` away.
+    cost_to: dict[str, Decimal]
+    radius: Decimal
+    # Fewest legs to the destination, only when legs are limited.
+    legs_to: dict[str, int] | None
+
+
+def _airline_filter(
+    airlines: Collection[str] | None, excluded_airlines: Collection[str]
+) -> Callable[[ShippingConnection], bool]:
+    allowed = None if airlines is None else set(airlines)
+    excluded = set(excluded_airlines)
+
+    def flies(connection: ShippingConnection) -> bool:
+        return (
+            allowed is None or connection.airline in allowed
+        ) and connection.airline not in excluded
+
+    return flies
+
+
+def _cost_of(connections: Iterable[ShippingConnection]) -> Decimal:
+    cost = Decimal(0)
+    for connection in connections:
+        cost += connection.cost
+    return cost
+
+
+def _connection_keys(route: Route | None) -> Iterable[ConnectionKey]:
+    if route is None:
+        return ()
+    return zip(route.stops, route.stops[1:], route.airlines)
+
+
+class CompiledGraph:
+    """
+    Connections compiled into compressed sparse row (CSR) arrays.
+
+    Stops and airlines are interned to integer ids. The connections leaving
+    stop `i` are entries `offsets[i]` to `offsets[i + 1]` of the parallel
+    `targets`, `airline_ids_by_edge` and `costs` arrays, so a search walks flat
+    machine-sized integers instead of dicts of NamedTuples. Costs are fixed
+    point integers in units of 10 ** -cost_places, where cost_places is the
+    most decimal places any cost has, so no precision is lost. When a scaled
+    cost does not fit a signed 64 bit integer, `costs` stays a list of Python
+    ints instead. Names and Decimal costs only come back when the final Route
+    is built.
+    """
 
     def __init__(self, shipping_connections: Sequence[ShippingConnection]):
-        self.shipping_connections = tuple(shipping_connections)
-        self.routes_from = self._build_routes_map(self.shipping_connections)
+        self.stop_names: list[str] = []
+        self.stop_ids: dict[str, int] = {}
+        self.airline_names: list[str] = []
+        self.airline_ids: dict[str, int] = {}
+        self.cost_places = max(
+            (
+                max(0, -connection.cost.as_tuple().exponent)
+                for connection in shipping_connections
+            ),
+            default=0,
+        )
+        self.has_negative_costs = any(
+            connection.cost < 0 for connection in shipping_connections
+        )
+
+        sources = array("i")
+        for connection in shipping_connections:
+            sources.append(self._intern(connection.source))
+            self._intern(connection.destination)
+
+        # Counting sort by source: count, prefix sum, then place each edge.
+        stops = len(self.stop_names)
+        self.offsets = array("q", [0]) * (stops + 1)
+        for source in sources:
+            self.offsets[source + 1] += 1
+        for stop in range(stops):
+            self.offsets[stop + 1] += self.offsets[stop]
+        edges = len(sources)
+        self.targets = array("i", [0]) * edges
+        self.airline_ids_by_edge = array("i", [0]) * edges
+        costs = [0] * edges
+        next_slot = self.offsets[:-1]
+        for source, connection in zip(sources, shipping_connections):
+            edge = next_slot[source]
+            next_slot[source] += 1
+            self.targets[edge] = self.stop_ids[connection.destination]
+            self.airline_ids_by_edge[edge] = self._airline_id(connection.airline)
+            costs[edge] = int(connection.cost.scaleb(self.cost_places))
+        self.costs: array[int] | list[int] = costs
+        if all(INT64_MIN <= cost <= INT64_MAX for cost in costs):
+            self.costs = array("q", costs)
+
+    def _intern(self, stop: str) -> int:
+        stop_id = self.stop_ids.get(stop)
+        if stop_id is None:
+            stop_id = self.stop_ids[stop] = len(self.stop_names)
+            self.stop_names.append(stop)
+        return stop_id
+
+    def _airline_id(self, airline: str) -> int:
+        airline_id = self.airline_ids.get(airline)
+        if airline_id is None:
+            airline_id = self.airline_ids[airline] = len(self.airline_names)
+            self.airline_names.append(airline)
+        return airline_id
+
+    def cheapest_route(self, source: str, destination: str) -> Route:
+        """
+        Cheapest route, as ShippingCostCalculator.cheapest_route finds it.
+
+        Between routes of equal cost either one may be returned.
+        """
+        if self.has_negative_costs:
+            raise ValueError("Dijkstra needs non negative connection costs")
+        if source == destination:
+            return Route((source,), (), Decimal(0))
+        source_id = self.stop_ids.get(source)
+        destination_id = self.stop_ids.get(destination)
+        if source_id is None or destination_id is None:
+            raise LookupError(f"No route found from '{source}' to '{destination}'")
+
+        offsets, targets, costs = self.offsets, self.targets, self.costs
+        # Flat lists indexed by stop id are cheaper to probe than dicts; with
+        # non negative costs a stop's best cost is final once it is popped.
+        best_cost: list[int | float] = [math.inf] * len(self.stop_names)
+        best_cost[source_id] = 0
+        reached_by = [-1] * len(self.stop_names)
+        heap = [(0, source_id)]
+
+        while heap:
+            cost, stop = heapq.heappop(heap)
+            if cost > best_cost[stop]:
+                continue
+            if stop == destination_id:
+                return self._route_to(destination_id, reached_by, cost)
+
+            for edge in range(offsets[stop], offsets[stop + 1]):
+                next_stop = targets[edge]
+                next_cost = cost + costs[edge]
+                if next_cost < best_cost[next_stop]:
+                    best_cost[next_stop] = next_cost
+                    reached_by[next_stop] = edge
+                    heapq.heappush(heap, (next_cost, next_stop))
+
+        raise LookupError(f"No route found from '{source}' to '{destination}'")
+
+    def source_of(self, edge: int) -> int:
+        # The stop whose row holds the edge; rows of stops without any
+        # connections are empty, so bisect_right lands past them.
+        return bisect.bisect_right(self.offsets, edge) - 1
+
+    def _route_to(self, destination_id: int, reached_by: list[int], cost: int) -> Route:
+        edges = []
+        stop = destination_id
+        while reached_by[stop] != -1:
+            edge = reached_by[stop]
+            edges.append(edge)
+            stop = self.source_of(edge)
+        edges.reverse()
+        return Route(
+            (
+                self.stop_names[stop],
+                *(self.stop_names[self.targets[edge]] for edge in edges),
+            ),
+            tuple(self.airline_names[self.airline_ids_by_edge[edge]] for edge in edges),
+            Decimal(cost).scaleb(-self.cost_places),
+        )
+
+
+class ShippingCostCalculator:
+    """
+    Routes over a set of shipping connections.
+
+    Connections can be added, removed or repriced in place. calculate_cost
+    results, including failed lookups, are kept in an LRU cache of up to
+    `route_cache_size` pairs (0 turns it off), indexed by the connections
+    each route uses, so an edit only drops the cached routes it can change:
+
+    - update_cost drops the routes through that connection. BFS ignores
+      cost, so every other route stays the same.
+    - remove_connection drops the routes through that connection. Taking
+      away a connection a BFS route does not use cannot change which route
+      reaches the destination first, nor make an unreachable one reachable.
+    - add_connection clears the cache, as the new connection can give any
+      pair a route with fewer stops.
+    """
+
+    def __init__(
+        self,
+        shipping_connections: Sequence[ShippingConnection],
+        route_cache_size: int = DEFAULT_ROUTE_CACHE_SIZE,
+    ):
+        self._shipping_connections: tuple[ShippingConnection, ...] | None = tuple(
+            shipping_connections
+        )
+        self.routes_from = self._build_routes_map(self._shipping_connections)
+        self.route_cache_size = route_cache_size
+        self.route_cache: OrderedDict[tuple[str, str], Route | None] = OrderedDict()
+        self.pairs_by_connection: dict[ConnectionKey, set[tuple[str, str]]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._routes_into_cache: dict[str, list[ShippingConnection]] | None = None
+        self._landmarks_cache: _Landmarks | None = None
+        self.expanded_stops = 0
+
+    @property
+    def shipping_connections(self) -> tuple[ShippingConnection, ...]:
+        """All connections, in the order given until the first edit, then by source."""
+        if self._shipping_connections is None:
+            self._shipping_connections = tuple(
+                connection
+                for connections in self.routes_from.values()
+                for connection in connections
+            )
+        return self._shipping_connections
 
     def _build_routes_map(
         self, shipping_connections: tuple[ShippingConnection]
@@ -49,6 +392,23 @@ class ShippingCostCalculator:
         return cost_lookup
 
     def calculate_cost(self, source: str, destination: str) -> Route:
+        pair = (source, destination)
+        if pair in self.route_cache:
+            self.route_cache.move_to_end(pair)
+            self.cache_hits += 1
+            route = self.route_cache[pair]
+        else:
+            self.cache_misses += 1
+            try:
+                route = self._fewest_stops_route(source, destination)
+            except LookupError:
+                route = None
+            self._cache_route(pair, route)
+        if route is None:
+            raise LookupError(f"No route found from '{source}' to '{destination}'")
+        return route
+
+    def _fewest_stops_route(self, source: str, destination: str) -> Route:
         connection_queue = deque([Route((source,), (), Decimal(0))])
         visited: set[str] = {source}
 
@@ -75,6 +435,716 @@ class ShippingCostCalculator:
 
         raise LookupError(f"No route found from '{source}' to '{destination}'")
 
+    def add_connection(self, connection: ShippingConnection) -> None:
+        self.routes_from[connection.source].append(connection)
+        self._connections_changed()
+        self.clear_route_cache()
+
+    def remove_connection(
+        self, source: str, destination: str, airline: str
+    ) -> ShippingConnection:
+        """Remove the first matching connection and return it."""
+        connections = self.routes_from.get(source, [])
+        index = self._connection_index(connections, source, destination, airline)
+        connection = connections.pop(index)
+        if not connections:
+            del self.routes_from[source]
+        self._connections_changed()
+        self._invalidate((source, destination, airline))
+        return connection
+
+    def update_cost(
+        self, source: str, destination: str, airline: str, cost: Decimal
+    ) -> None:
+        """Reprice the first matching connection, keeping its place."""
+        connections = self.routes_from.get(source, [])
+        index = self._connection_index(connections, source, destination, airline)
+        connections[index] = connections[index]._replace(cost=cost)
+        self._connections_changed()
+        self._invalidate((source, destination, airline))
+
+    def _connections_changed(self) -> None:
+        """Drop everything derived from the connections, but the route cache."""
+        self._shipping_connections = None
+        self._routes_into_cache = None
+        self._landmarks_cache = None
+
+    def _connection_index(
+        self,
+        connections: list[ShippingConnection],
+        source: str,
+        destination: str,
+        airline: str,
+    ) -> int:
+        for index, connection in enumerate(connections):
+            if connection.destination == destination and connection.airline == airline:
+                return index
+        raise LookupError(f"No connection {source}:{destination}:{airline}")
+
+    def clear_route_cache(self) -> None:
+        self.route_cache.clear()
+        self.pairs_by_connection.clear()
+
+    def _cache_route(self, pair: tuple[str, str], route: Route | None) -> None:
+        if self.route_cache_size <= 0:
+            return
+        self.route_cache[pair] = route
+        for key in _connection_keys(route):
+            self.pairs_by_connection.setdefault(key, set()).add(pair)
+        if len(self.route_cache) > self.route_cache_size:
+            self._uncache(*self.route_cache.popitem(last=False))
+
+    def _uncache(self, pair: tuple[str, str], route: Route | None) -> None:
+        for key in _connection_keys(route):
+            pairs = self.pairs_by_connection.get(key)
+            if pairs is not None:
+                pairs.discard(pair)
+                if not pairs:
+                    del self.pairs_by_connection[key]
+
+    def _invalidate(self, key: ConnectionKey) -> None:
+        for pair in self.pairs_by_connection.pop(key, ()):
+            self._uncache(pair, self.route_cache.pop(pair))
+
+    def calculate_costs(
+        self, pairs: Iterable[tuple[str, str]], max_workers: int | None = None
+    ) -> list[Route | None]:
+        """
+        calculate_cost for many (source, destination) pairs, in their order.
+
+        Pairs are grouped by source and each source gets one BFS that answers
+        all its destinations, instead of one search per pair. Source groups
+        are spread over a pool of `max_workers` processes (the CPU count by
+        default), but never more processes than sources, as each one loads
+        every connection; with one worker or one source it all runs in this
+        process.
+        None stands for a pair calculate_cost would raise LookupError for.
+        """
+        pairs = list(pairs)
+        destinations_by_source: dict[str, list[str]] = defaultdict(list)
+        for source, destination in pairs:
+            destinations_by_source[source].append(destination)
+        sources = list(destinations_by_source)
+        destination_groups = [destinations_by_source[source] for source in sources]
+
+        workers = min(max_workers or os.cpu_count() or 1, len(sources))
+        if workers <= 1:
+            route_groups = map(self._calculate_costs_from, sources, destination_groups)
+        else:
+            with ProcessPoolExecutor(
+                workers,
+                initializer=_start_worker,
+                initargs=(self.shipping_connections,),
+            ) as executor:
+                route_groups = list(
+                    executor.map(
+                        _calculate_costs_from,
+                        sources,
+                        destination_groups,
+                        chunksize=max(1, len(sources) // (8 * workers)),
+                    )
+                )
+
+        routes: dict[tuple[str, str], Route | None] = {}
+        for source, destinations, group in zip(
+            sources, destination_groups, route_groups
+        ):
+            routes.update(
+                ((source, destination), route)
+                for destination, route in zip(destinations, group)
+            )
+        return [routes[pair] for pair in pairs]
+
+    def _calculate_costs_from(
+        self, source: str, destinations: Sequence[str]
+    ) -> list[Route | None]:
+        """
+        calculate_cost from one source to each destination, with a single BFS.
+
+        calculate_cost returns as soon as it scans a connection into the
+        destination, which is the first connection into it in BFS order. So a
+        full BFS that remembers the first connection into every stop gives
+        the same routes. The source is the one exception: it starts out
+        visited, so only a connection back into it ends a route to itself.
+        """
+        reached_by: dict[str, ShippingConnection] = {}
+        back_to_source = None
+        remaining = set(destinations)
+        queue = deque([source])
+        visited = {source}
+
+        while queue and remaining:
+            stop = queue.popleft()
+            for connection in self.routes_from.get(stop, ()):
+                next_stop = connection.destination
+                if next_stop == source:
+                    if back_to_source is None:
+                        back_to_source = connection
+                        remaining.discard(source)
+                elif next_stop not in visited:
+                    visited.add(next_stop)
+                    reached_by[next_stop] = connection
+                    remaining.discard(next_stop)
+                    queue.append(next_stop)
+
+        routes = []
+        for destination in destinations:
+            if destination == source:
+                last = back_to_source
+            else:
+                last = reached_by.get(destination)
+            if last is None:
+                routes.append(None)
+                continue
+            connections = [last]
+            while connections[-1].source != source:
+                connections.append(reached_by[connections[-1].source])
+            connections.reverse()
+            cost = Decimal(0)
+            for connection in connections:
+                cost += connection.cost
+            routes.append(
+                Route(
+                    (source, *(connection.destination for connection in connections)),
+                    tuple(connection.airline for connection in connections),
+                    cost,
+                )
+            )
+        return routes
+
+    def cheapest_route(
+        self,
+        source: str,
+        destination: str,
+        search: str = "dijkstra",
+        heuristic: Callable[[str, str], Decimal | None] | None = None,
+    ) -> Route:
+        """
+        Lowest cost route, using Dijkstra's algorithm in O(E log V).
+
+        Unlike calculate_cost, which returns the route with the fewest stops,
+        this settles stops in order of cost, so the first time the destination
+        comes off the heap its cost is the lowest possible. The heap only holds
+        (cost, stop) entries and each stop remembers the connection that
+        reached it most cheaply; the Route is built once at the end. Costs
+        must not be negative.
+
+        On big networks two other searches expand far fewer stops:
+
+        - "bidirectional" runs Dijkstra forwards from the source and
+          backwards from the destination, over the connections by
+          destination, until the two meet.
+        - "astar" settles stops in order of cost plus `heuristic(stop,
+          destination)`, a lower bound on the rest of the way that must not
+          drop by more than the cost of any connection (admissible and
+          consistent), or None where the destination is out of reach. By
+          default it uses landmark bounds: costs to and from
+          a few far apart stops, found once, give by the triangle inequality
+          d(stop, destination) >= d(stop, L) - d(destination, L) and
+          d(L, destination) - d(L, stop) for every landmark L.
+
+        Both find a route of the same, lowest, cost; when several routes
+        share that cost they may return a different one of them.
+        `expanded_stops` holds how many stops the last search expanded.
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"search must be one of {', '.join(SEARCHES)}")
+        self.expanded_stops = 0
+        if source == destination:
+            return Route((source,), (), Decimal(0))
+        if search == "bidirectional":
+            return self._bidirectional_cheapest(source, destination)
+
+        lower_bound = None
+        if search == "astar":
+            lower_bound = (
+                self._landmark_bounds(destination)
+                if heuristic is None
+                else lambda stop: heuristic(stop, destination)
+            )
+
+        best_cost: dict[str, Decimal] = {source: Decimal(0)}
+        reached_by: dict[str, ShippingConnection] = {}
+        settled: set[str] = set()
+        # (cost plus the lower bound, which is 0 for Dijkstra, cost, stop)
+        heap = [(Decimal(0), Decimal(0), source)]
+
+        while heap:
+            _, cost, stop = heapq.heappop(heap)
+            if stop in settled:
+                # A cheaper entry for this stop was already popped.
+                continue
+            if stop == destination:
+                self.expanded_stops = len(settled)
+                return self._route_to(destination, reached_by, cost)
+            settled.add(stop)
+
+            for connection in self.routes_from.get(stop, ()):
+                if connection.cost < 0:
+                    raise ValueError(f"Negative cost on {connection}")
+                next_cost = cost + connection.cost
+                next_stop = connection.destination
+                if next_stop in settled:
+                    continue
+                known_cost = best_cost.get(next_stop)
+                if known_cost is None or next_cost < known_cost:
+                    best_cost[next_stop] = next_cost
+                    reached_by[next_stop] = connection
+                    priority = next_cost
+                    if lower_bound is not None:
+                        rest = lower_bound(next_stop)
+                        if rest is None:
+                            continue
+                        priority += rest
+                    heapq.heappush(heap, (priority, next_cost, next_stop))
+
+        self.expanded_stops = len(settled)
+        raise LookupError(f"No route found from '{source}' to '{destination}'")
+
+    def _bidirectional_cheapest(self, source: str, destination: str) -> Route:
+        """
+        Dijkstra from both ends at once, always growing the side with fewer
+        stops waiting, so a crowd of cheap stops near one end is left alone
+        while the other side works its way over. Each connection either side
+        scans that reaches a stop the other side has a cost for closes a
+        route, and the cheapest one closed is kept. Once the next stops of
+        both sides together cost at least that much, no route through
+        unexpanded stops can be cheaper.
+        """
+        routes_into = self._routes_into()
+        cost_from: dict[str, Decimal] = {source: Decimal(0)}
+        cost_to: dict[str, Decimal] = {destination: Decimal(0)}
+        # Connection into each stop on the way from the source, and out of
+        # each stop on the way to the destination.
+        reached_by: dict[str, ShippingConnection] = {}
+        leaves_by: dict[str, ShippingConnection] = {}
+        settled_from: set[str] = set()
+        settled_to: set[str] = set()
+        heap_from = [(Decimal(0), source)]
+        heap_to = [(Decimal(0), destination)]
+        best: Decimal | None = None
+        meeting: ShippingConnection | None = None
+
+        while heap_from and heap_to:
+            if best is not None and heap_from[0][0] + heap_to[0][0] >= best:
+                break
+            forwards = len(heap_from) <= len(heap_to)
+            if forwards:
+                cost, stop = heapq.heappop(heap_from)
+                if stop in settled_from:
+                    continue
+                settled_from.add(stop)
+                connections = self.routes_from.get(stop, ())
+            else:
+                cost, stop = heapq.heappop(heap_to)
+                if stop in settled_to:
+                    continue
+                settled_to.add(stop)
+                connections = routes_into.get(stop, ())
+
+            for connection in connections:
+                if connection.cost < 0:
+                    raise ValueError(f"Negative cost on {connection}")
+                next_cost = cost + connection.cost
+                if forwards:
+                    next_stop = connection.destination
+                    known_cost = cost_from.get(next_stop)
+                    if known_cost is None or next_cost < known_cost:
+                        cost_from[next_stop] = next_cost
+                        reached_by[next_stop] = connection
+                        heapq.heappush(heap_from, (next_cost, next_stop))
+                    rest = cost_to.get(next_stop)
+                else:
+                    next_stop = connection.source
+                    known_cost = cost_to.get(next_stop)
+                    if known_cost is None or next_cost < known_cost:
+                        cost_to[next_stop] = next_cost
+                        leaves_by[next_stop] = connection
+                        heapq.heappush(heap_to, (next_cost, next_stop))
+                    rest = cost_from.get(next_stop)
+                if rest is not None and (best is None or next_cost + rest < best):
+                    best = next_cost + rest
+                    meeting = connection
+
+        self.expanded_stops = len(settled_from) + len(settled_to)
+        if meeting is None:
+            raise LookupError(f"No route found from '{source}' to '{destination}'")
+        connections = [meeting]
+        while connections[-1].source != source:
+            connections.append(reached_by[connections[-1].source])
+        connections.reverse()
+        while connections[-1].destination != destination:
+            connections.append(leaves_by[connections[-1].destination])
+        return Route(
+            (source, *(connection.destination for connection in connections)),
+            tuple(connection.airline for connection in connections),
+            _cost_of(connections),
+        )
+
+    def _landmark_bounds(self, destination: str) -> Callable[[str], Decimal | None]:
+        """
+        Lower bounds on the cost from any stop to the destination, or None
+        for a stop that cannot reach it.
+        """
+        if self._landmarks_cache is None:
+            self._landmarks_cache = self._pick_landmarks(DEFAULT_LANDMARKS)
+        landmarks = self._landmarks_cache
+        unknown = [None] * len(landmarks.stops)
+        destination_to = landmarks.costs_to.get(destination, unknown)
+        destination_from = landmarks.costs_from.get(destination, unknown)
+        bounds: dict[str, Decimal | None] = {}
+
+        def lower_bound(stop: str) -> Decimal | None:
+            if stop in bounds:
+                return bounds[stop]
+            bound = Decimal(0)
+            # A stop that cannot reach a landmark the destination reaches
+            # cannot reach the destination either.
+            for stop_cost, destination_cost in zip(
+                landmarks.costs_to.get(stop, unknown), destination_to
+            ):
+                if destination_cost is not None:
+                    if stop_cost is None:
+                        bounds[stop] = None
+                        return None
+                    if stop_cost - destination_cost > bound:
+                        bound = stop_cost - destination_cost
+            for stop_cost, destination_cost in zip(
+                landmarks.costs_from.get(stop, unknown), destination_from
+            ):
+                if stop_cost is not None and destination_cost is not None:
+                    if destination_cost - stop_cost > bound:
+                        bound = destination_cost - stop_cost
+            bounds[stop] = bound
+            return bound
+
+        return lower_bound
+
+    def _pick_landmarks(self, count: int) -> _Landmarks:
+        """
+        Landmarks spread out across the network: each next one is the stop
+        farthest from those picked so far, starting from any stop.
+        """
+        landmarks = _Landmarks([], {}, {})
+        stop = next(iter(self.routes_from), None)
+        closest: dict[str, Decimal] = {}
+        while stop is not None and len(landmarks.stops) < count:
+            index = len(landmarks.stops)
+            landmarks.stops.append(stop)
+            costs_to = self._costs_from(stop, self._routes_into(), forwards=False)
+            costs_from = self._costs_from(stop, self.routes_from, forwards=True)
+            for costs, by_stop in (
+                (costs_to, landmarks.costs_to),
+                (costs_from, landmarks.costs_from),
+            ):
+                for other, cost in costs.items():
+                    if other not in by_stop:
+                        by_stop[other] = [None] * count
+                    by_stop[other][index] = cost
+            for other, cost in costs_from.items():
+                if other not in closest or cost < closest[other]:
+                    closest[other] = cost
+            stop = max(
+                (other for other in closest if other not in landmarks.stops),
+                key=closest.__getitem__,
+                default=None,
+            )
+        # Fewer stops than landmarks asked for: trim the unused entries.
+        for by_stop in (landmarks.costs_to, landmarks.costs_from):
+            for costs in by_stop.values():
+                del costs[len(landmarks.stops) :]
+        return landmarks
+
+    @staticmethod
+    def _costs_from(
+        start: str,
+        connections_by_stop: dict[str, list[ShippingConnection]],
+        forwards: bool,
+    ) -> dict[str, Decimal]:
+        """
+        Cheapest cost between the start and every stop it connects with,
+        leaving it when forwards and arriving at it otherwise.
+        """
+        costs: dict[str, Decimal] = {}
+        best_cost = {start: Decimal(0)}
+        heap = [(Decimal(0), start)]
+        while heap:
+            cost, stop = heapq.heappop(heap)
+            if stop in costs:
+                continue
+            costs[stop] = cost
+            for connection in connections_by_stop.get(stop, ()):
+                if connection.cost < 0:
+                    raise ValueError(f"Negative cost on {connection}")
+                next_stop = connection.destination if forwards else connection.source
+                next_cost = cost + connection.cost
+                known_cost = best_cost.get(next_stop)
+                if known_cost is None or next_cost < known_cost:
+                    best_cost[next_stop] = next_cost
+                    heapq.heappush(heap, (next_cost, next_stop))
+        return costs
+
+    def _route_to(
+        self,
+        destination: str,
+        reached_by: dict[str, ShippingConnection],
+        cost: Decimal,
+    ) -> Route:
+        connections = []
+        stop = destination
+        while stop in reached_by:
+            connection = reached_by[stop]
+            connections.append(connection)
+            stop = connection.source
+        connections.reverse()
+        return Route(
+            (stop, *(connection.destination for connection in connections)),
+            tuple(connection.airline for connection in connections),
+            cost,
+        )
+
+    def cheapest_routes(
+        self,
+        source: str,
+        destination: str,
+        k: int = 1,
+        max_legs: int | None = None,
+        airlines: Collection[str] | None = None,
+        excluded_airlines: Collection[str] = (),
+    ) -> list[Route]:
+        """
+        Up to k cheapest routes, cheapest first, that visit no stop twice.
+
+        Routes have at most `max_legs` connections and only fly `airlines`
+        (any, when None) other than `excluded_airlines`. The constraints are
+        applied inside the search, so connections they rule out are never
+        followed. Yen's algorithm finds the routes: every next route leaves
+        an earlier one at some stop, so for each stop of the last route found
+        it searches for the cheapest way on from there that avoids the stops
+        before it and the connections the routes found so far take next.
+        Those candidates go on a heap and the cheapest becomes the next route.
+
+        Every one of those searches is an A* search. One backward search from
+        the destination first finds, for each stop, the cheapest cost and the
+        fewest legs on to the destination with the allowed airlines. Those
+        are lower bounds for every later search, which only ever has more
+        stops and connections ruled out. So they steer each search straight
+        to the destination and cut off stops that cannot reach it, or cannot
+        reach it within the legs left.
+
+        Identical connections count as one. Costs must not be negative. An
+        empty list means no route at all.
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        if source == destination:
+            return [Route((source,), (), Decimal(0))]
+
+        flies = None
+        if airlines is not None or excluded_airlines:
+            flies = _airline_filter(airlines, excluded_airlines)
+        bounds = self._bounds_to(destination, source, flies, max_legs is not None)
+        if bounds is None:
+            return []
+
+        def search(
+            start: str,
+            legs: int | None,
+            avoid_stops: set[str],
+            avoid_connections: set[ShippingConnection],
+        ) -> list[ShippingConnection] | None:
+            return self._constrained_cheapest(
+                start,
+                destination,
+                legs,
+                lambda connection: (
+                    connection.destination not in avoid_stops
+                    and connection not in avoid_connections
+                    and (flies is None or flies(connection))
+                ),
+                bounds,
+            )
+
+        first = search(source, max_legs, set(), set())
+        if first is None:
+            return []
+        found = [first]
+        candidates: list[tuple[Decimal, int, list[ShippingConnection]]] = []
+        seen = {tuple(first)}
+        while len(found) < k:
+            last = found[-1]
+            for spur in range(len(last)):
+                root = last[:spur]
+                avoid_connections = {
+                    route[spur] for route in found if route[:spur] == root
+                }
+                avoid_stops = {connection.source for connection in root}
+                rest = search(
+                    last[spur].source,
+                    None if max_legs is None else max_legs - spur,
+                    avoid_stops,
+                    avoid_connections,
+                )
+                if rest is None:
+                    continue
+                candidate = root + rest
+                if tuple(candidate) not in seen:
+                    seen.add(tuple(candidate))
+                    heapq.heappush(
+                        candidates,
+                        (_cost_of(candidate), len(seen), candidate),
+                    )
+            if not candidates:
+                break
+            found.append(heapq.heappop(candidates)[2])
+
+        return [
+            Route(
+                (source, *(connection.destination for connection in connections)),
+                tuple(connection.airline for connection in connections),
+                _cost_of(connections),
+            )
+            for connections in found
+        ]
+
+    def _bounds_to(
+        self,
+        destination: str,
+        source: str,
+        flies: Callable[[ShippingConnection], bool] | None,
+        count_legs: bool,
+    ) -> _Bounds | None:
+        """
+        Lower bounds on the cost, and if `count_legs` the legs, from stops to
+        the destination over the connections `flies` accepts (all, if None),
+        or None if the source cannot reach the destination.
+
+        The backward search for costs stops once it reaches the source, so
+        beyond that every stop gets the cost of the stops settled last.
+        """
+        routes_into = self._routes_into()
+        cost_to: dict[str, Decimal] = {}
+        best_cost = {destination: Decimal(0)}
+        heap = [(Decimal(0), destination)]
+        radius = None
+        while heap:
+            cost, stop = heapq.heappop(heap)
+            if stop in cost_to:
+                continue
+            cost_to[stop] = cost
+            if stop == source:
+                radius = cost
+                break
+            for connection in routes_into.get(stop, ()):
+                if connection.cost < 0:
+                    raise ValueError(f"Negative cost on {connection}")
+                next_stop = connection.source
+                next_cost = cost + connection.cost
+                known_cost = best_cost.get(next_stop)
+                if (known_cost is None or next_cost < known_cost) and (
+                    flies is None or flies(connection)
+                ):
+                    best_cost[next_stop] = next_cost
+                    heapq.heappush(heap, (next_cost, next_stop))
+        if radius is None:
+            return None
+
+        legs_to = None
+        if count_legs:
+            legs_to = {destination: 0}
+            queue = deque([destination])
+            while queue:
+                stop = queue.popleft()
+                for connection in routes_into.get(stop, ()):
+                    if connection.source not in legs_to and (
+                        flies is None or flies(connection)
+                    ):
+                        legs_to[connection.source] = legs_to[stop] + 1
+                        queue.append(connection.source)
+        return _Bounds(cost_to, radius, legs_to)
+
+    def _routes_into(self) -> dict[str, list[ShippingConnection]]:
+        """Connections by destination, built on first use and after edits."""
+        if self._routes_into_cache is None:
+            routes_into: dict[str, list[ShippingConnection]] = defaultdict(list)
+            for connections in self.routes_from.values():
+                for connection in connections:
+                    routes_into[connection.destination].append(connection)
+            self._routes_into_cache = routes_into
+        return self._routes_into_cache
+
+    def _constrained_cheapest(
+        self,
+        source: str,
+        destination: str,
+        max_legs: int | None,
+        follow: Callable[[ShippingConnection], bool],
+        bounds: _Bounds,
+    ) -> list[ShippingConnection] | None:
+        """
+        Cheapest connections from source to destination, by label setting.
+
+        A label is a way to reach a stop: its cost, its number of legs and
+        the label it extends. Labels come off the heap in order of their cost
+        plus the stop's lower bound on the rest of the way, which for any one
+        stop is the order of their cost. So a label for a stop already
+        reached in as few legs can never lead anywhere better and is dropped.
+        Without a leg limit that leaves one label per stop, which is A*. Only
+        connections `follow` accepts are taken.
+        """
+        cost_to, radius, legs_to = bounds
+        # Per label: stop, legs, index of the label it extends, connection.
+        labels: list[tuple[str, int, int, ShippingConnection | None]] = [
+            (source, 0, -1, None)
+        ]
+        fewest_legs: dict[str, int] = {}
+        heap = [(cost_to.get(source, radius), Decimal(0), 0)]
+
+        while heap:
+            _, cost, label = heapq.heappop(heap)
+            stop, legs, _, _ = labels[label]
+            known_legs = fewest_legs.get(stop)
+            if known_legs is not None and (max_legs is None or legs >= known_legs):
+                continue
+            fewest_legs[stop] = legs
+            if stop == destination:
+                connections = []
+                while labels[label][3] is not None:
+                    _, _, label, connection = labels[label]
+                    connections.append(connection)
+                connections.reverse()
+                return connections
+
+            for connection in self.routes_from.get(stop, ()):
+                next_stop = connection.destination
+                if max_legs is None:
+                    if next_stop in fewest_legs:
+                        continue
+                else:
+                    # Stops the destination cannot be reached from at all
+                    # are missing from legs_to.
+                    rest_legs = legs_to.get(next_stop)
+                    if rest_legs is None or legs + 1 + rest_legs > max_legs:
+                        continue
+                if not follow(connection):
+                    continue
+                labels.append((next_stop, legs + 1, label, connection))
+                next_cost = cost + connection.cost
+                heapq.heappush(
+                    heap,
+                    (
+                        next_cost + cost_to.get(next_stop, radius),
+                        next_cost,
+                        len(labels) - 1,
+                    ),
+                )
+
+        return None
+
+    def compile(self) -> CompiledGraph:
+        """Compiled form of the connections, for faster searches on big graphs."""
+        return CompiledGraph(self.shipping_connections)
+
     @classmethod
     def from_str(cls, input_data: str) -> ShippingCostCalculator:
         return ShippingCostCalculator(
@@ -85,6 +1155,21 @@ class ShippingCostCalculator:
         )
 
 
+# The calculator each worker process of calculate_costs builds once.
+_worker_calculator: ShippingCostCalculator | None = None
+
+
+def _start_worker(shipping_connections: Sequence[ShippingConnection]) -> None:
+    global _worker_calculator
+    _worker_calculator = ShippingCostCalculator(shipping_connections)
+
+
+def _calculate_costs_from(
+    source: str, destinations: Sequence[str]
+) -> list[Route | None]:
+    return _worker_calculator._calculate_costs_from(source, destinations)
+
+
 if __name__ == "__main__":
     calc = ShippingCostCalculator.from_str(
         "UK:US:FedEx:4,UK:FR:Jet1:2,US:UK:RyanAir:8,CA:UK:CanadaAir:8"
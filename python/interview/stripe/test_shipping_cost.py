@@ -1,6 +1,17 @@
+import io
+import mmap
+import random
 from decimal import Decimal
+
 import pytest
-from .shipping_cost import ShippingConnection, ShippingCostCalculator
+from . import shipping_cost
+from .shipping_cost import (
+    MalformedRecord,
+    Route,
+    ShippingConnection,
+    ShippingCostCalculator,
+    ShippingFeedReader,
+)
 
 
 class TestShippingConnection:
@@ -39,3 +50,518 @@ class TestShippingCostCalculator:
                 source="UK", destination="FR", airline="Jet1", cost=Decimal(2)
             ),
         )
+
+    def test_cheapest_route_prefers_cost_over_stops(self):
+        calculator = ShippingCostCalculator.from_str(
+            "US:FR:Direct:20,US:UK:RyanAir:8,UK:FR:Jet1:3,"
+            "UK:DE:Lufthansa:1,DE:FR:Jet2:1"
+        )
+
+        assert calculator.calculate_cost("US", "FR").cost == Decimal(20)
+        assert calculator.cheapest_route("US", "FR") == Route(
+            ("US", "UK", "DE", "FR"), ("RyanAir", "Lufthansa", "Jet2"), Decimal(10)
+        )
+
+    def test_cheapest_route_finds_path_bfs_visited_too_early(self):
+        # BFS marks C visited when A enqueues it, so the cheaper B -> C never
+        # gets considered on the way to D.
+        calculator = ShippingCostCalculator.from_str(
+            "S:A:X:1,S:B:X:1,A:C:X:10,B:C:X:1,C:D:X:1"
+        )
+
+        assert calculator.calculate_cost("S", "D").cost == Decimal(12)
+        assert calculator.cheapest_route("S", "D").cost == Decimal(3)
+
+    def test_cheapest_route_same_source_and_destination(self):
+        calculator = ShippingCostCalculator.from_str("UK:US:FedEx:4")
+
+        assert calculator.cheapest_route("UK", "UK") == Route(("UK",), (), Decimal(0))
+
+    def test_cheapest_route_not_found(self):
+        calculator = ShippingCostCalculator.from_str("UK:US:FedEx:4,CA:UK:CanadaAir:8")
+
+        with pytest.raises(LookupError):
+            calculator.cheapest_route("US", "CA")
+
+    def test_cheapest_route_rejects_negative_costs(self):
+        calculator = ShippingCostCalculator.from_str("UK:US:FedEx:-4")
+
+        with pytest.raises(ValueError):
+            calculator.cheapest_route("UK", "US")
+
+
+class TestCompiledGraph:
+
+    def test_interned_csr_layout(self):
+        graph = ShippingCostCalculator.from_str(
+            "UK:US:FedEx:4,US:FR:Jet1:2,UK:FR:FedEx:9"
+        ).compile()
+
+        assert graph.stop_names == ["UK", "US", "FR"]
+        assert graph.airline_names == ["FedEx", "Jet1"]
+        # UK has two connections, US one and FR none.
+        assert list(graph.offsets) == [0, 2, 3, 3]
+        assert list(graph.targets) == [1, 2, 2]
+        assert list(graph.airline_ids_by_edge) == [0, 0, 1]
+        assert list(graph.costs) == [4, 9, 2]
+
+    def test_cheapest_route_matches_calculator(self):
+        calculator = ShippingCostCalculator.from_str(
+            "US:FR:Direct:20,US:UK:RyanAir:8,UK:FR:Jet1:3,"
+            "UK:DE:Lufthansa:1,DE:FR:Jet2:1,FR:US:AirFrance:6"
+        )
+        graph = calculator.compile()
+
+        for source in ("US", "UK", "DE", "FR"):
+            for destination in ("US", "UK", "DE", "FR"):
+                assert graph.cheapest_route(
+                    source, destination
+                ) == calculator.cheapest_route(source, destination)
+
+    def test_decimal_costs_are_exact(self):
+        graph = ShippingCostCalculator.from_str(
+            "UK:US:FedEx:2.5,US:FR:Jet1:0.05,UK:FR:Direct:2.56"
+        ).compile()
+
+        assert graph.cost_places == 2
+        assert graph.cheapest_route("UK", "FR") == Route(
+            ("UK", "US", "FR"), ("FedEx", "Jet1"), Decimal("2.55")
+        )
+
+    def test_costs_beyond_64_bits_stay_exact(self):
+        # 10000000000 in units of 10 ** -9 does not fit a signed 64 bit integer.
+        graph = ShippingCostCalculator.from_str(
+            "A:B:Jet1:10000000000,B:C:Jet2:0.000000001"
+        ).compile()
+
+        assert graph.costs == [10**19, 1]
+        assert graph.cheapest_route("A", "C") == Route(
+            ("A", "B", "C"), ("Jet1", "Jet2"), Decimal("10000000000.000000001")
+        )
+
+    def test_unknown_stop_and_no_route(self):
+        graph = ShippingCostCalculator.from_str(
+            "UK:US:FedEx:4,CA:UK:CanadaAir:8"
+        ).compile()
+
+        with pytest.raises(LookupError):
+            graph.cheapest_route("UK", "JP")
+        with pytest.raises(LookupError):
+            graph.cheapest_route("US", "CA")
+
+    def test_rejects_negative_costs(self):
+        graph = ShippingCostCalculator.from_str("UK:US:FedEx:-4").compile()
+
+        with pytest.raises(ValueError):
+            graph.cheapest_route("UK", "US")
+
+
+class TestCalculateCosts:
+
+    connections = (
+        "US:UK:RyanAir:8,US:FR:Direct:20,UK:FR:Jet1:3,UK:DE:Lufthansa:1,"
+        "DE:FR:Jet2:1,FR:US:AirFrance:6,DE:UK:Lufthansa:2,CA:UK:CanadaAir:8"
+    )
+    stops = ("US", "UK", "FR", "DE", "CA", "JP")
+
+    def expected(self, calculator, pairs):
+        routes = []
+        for source, destination in pairs:
+            try:
+                routes.append(calculator.calculate_cost(source, destination))
+            except LookupError:
+                routes.append(None)
+        return routes
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_matches_calculate_cost(self, max_workers):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        pairs = [
+            (source, destination) for source in self.stops for destination in self.stops
+        ]
+
+        assert calculator.calculate_costs(pairs, max_workers) == self.expected(
+            calculator, pairs
+        )
+
+    def test_route_back_to_source(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        assert calculator.calculate_costs([("UK", "UK"), ("CA", "CA")], 1) == [
+            Route(("UK", "DE", "UK"), ("Lufthansa", "Lufthansa"), Decimal(3)),
+            None,
+        ]
+
+    def test_keeps_pair_order_and_duplicates(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        pairs = [("UK", "FR"), ("US", "DE"), ("UK", "FR"), ("US", "UK")]
+
+        assert calculator.calculate_costs(pairs, 2) == self.expected(calculator, pairs)
+
+    def test_pool_is_capped_at_sources(self, monkeypatch):
+        pool_sizes = []
+
+        class RecordingPool(shipping_cost.ProcessPoolExecutor):
+            def __init__(self, max_workers, **kwargs):
+                pool_sizes.append(max_workers)
+                super().__init__(max_workers, **kwargs)
+
+        monkeypatch.setattr(shipping_cost, "ProcessPoolExecutor", RecordingPool)
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        pairs = [("UK", "FR"), ("US", "DE"), ("UK", "DE")]
+
+        assert calculator.calculate_costs(pairs, 8) == self.expected(calculator, pairs)
+        assert pool_sizes == [2]
+
+
+class TestRouteCache:
+
+    connections = (
+        "US:UK:RyanAir:8,US:FR:Direct:20,UK:FR:Jet1:3,UK:DE:Lufthansa:1,"
+        "DE:FR:Jet2:1,FR:US:AirFrance:6"
+    )
+
+    def test_repeated_quotes_are_cache_hits(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        first = calculator.calculate_cost("UK", "US")
+        assert calculator.calculate_cost("UK", "US") is first
+        with pytest.raises(LookupError):
+            calculator.calculate_cost("UK", "CA")
+        with pytest.raises(LookupError):
+            calculator.calculate_cost("UK", "CA")
+        assert (calculator.cache_hits, calculator.cache_misses) == (2, 2)
+
+    def test_least_recently_used_route_is_evicted(self):
+        calculator = ShippingCostCalculator(
+            ShippingCostCalculator.from_str(self.connections).shipping_connections,
+            route_cache_size=2,
+        )
+
+        calculator.calculate_cost("US", "FR")
+        calculator.calculate_cost("UK", "US")
+        calculator.calculate_cost("US", "FR")
+        calculator.calculate_cost("DE", "US")
+
+        assert list(calculator.route_cache) == [("US", "FR"), ("DE", "US")]
+        assert ("UK", "FR", "Jet1") not in calculator.pairs_by_connection
+
+    def test_update_cost_only_drops_routes_through_the_connection(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        calculator.calculate_cost("UK", "US")
+        calculator.calculate_cost("US", "DE")
+
+        calculator.update_cost("FR", "US", "AirFrance", Decimal(1))
+
+        assert list(calculator.route_cache) == [("US", "DE")]
+        assert calculator.calculate_cost("UK", "US") == Route(
+            ("UK", "FR", "US"), ("Jet1", "AirFrance"), Decimal(4)
+        )
+
+    def test_remove_connection_only_drops_routes_through_it(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        calculator.calculate_cost("US", "FR")
+        calculator.calculate_cost("US", "DE")
+
+        removed = calculator.remove_connection("US", "FR", "Direct")
+
+        assert removed == ShippingConnection("US", "FR", "Direct", Decimal(20))
+        assert list(calculator.route_cache) == [("US", "DE")]
+        assert calculator.calculate_cost("US", "FR").stops == ("US", "UK", "FR")
+        assert removed not in calculator.shipping_connections
+        with pytest.raises(LookupError):
+            calculator.remove_connection("US", "FR", "Direct")
+
+    def test_add_connection_clears_the_cache(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+        with pytest.raises(LookupError):
+            calculator.calculate_cost("US", "CA")
+
+        calculator.add_connection(ShippingConnection("DE", "CA", "Jet2", Decimal(5)))
+
+        assert not calculator.route_cache
+        assert calculator.calculate_cost("US", "CA").stops == ("US", "UK", "DE", "CA")
+
+    def test_edits_match_a_rebuilt_calculator(self):
+        randomizer = random.Random(5)
+        stops = [f"S{i}" for i in range(8)]
+
+        def random_connection():
+            return ShippingConnection(
+                randomizer.choice(stops),
+                randomizer.choice(stops),
+                randomizer.choice(("A", "B")),
+                Decimal(randomizer.randint(1, 9)),
+            )
+
+        calculator = ShippingCostCalculator([random_connection() for _ in range(20)])
+        for _ in range(200):
+            connections = calculator.shipping_connections
+            connection = randomizer.choice(connections)
+            edit = randomizer.random()
+            if edit < 0.2:
+                calculator.add_connection(random_connection())
+            elif edit < 0.5 and len(connections) > 1:
+                calculator.remove_connection(*connection[:3])
+            else:
+                cost = Decimal(randomizer.randint(1, 9))
+                calculator.update_cost(*connection[:3], cost)
+
+            rebuilt = ShippingCostCalculator(calculator.shipping_connections)
+            for _ in range(10):
+                source, destination = randomizer.choice(stops), randomizer.choice(stops)
+                try:
+                    expected = rebuilt.calculate_cost(source, destination)
+                except LookupError:
+                    expected = None
+                try:
+                    route = calculator.calculate_cost(source, destination)
+                except LookupError:
+                    route = None
+                assert route == expected
+
+
+class TestShippingFeedReader:
+
+    feed = b"UK:US:FedEx:4,UK:FR:Jet1:2.5,US:UK:RyanAir:8,CA:UK:CanadaAir:8"
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 13, 64, 1 << 20])
+    def test_records_across_chunk_boundaries(self, chunk_size):
+        reader = ShippingFeedReader(io.BytesIO(self.feed), chunk_size)
+
+        assert (
+            tuple(reader)
+            == ShippingCostCalculator.from_str(self.feed.decode()).shipping_connections
+        )
+        assert reader.malformed_count == 0
+
+    def test_newlines_and_blank_records(self):
+        feed = b"UK:US:FedEx:4\r\nUK:FR:Jet1:2,\n\nUS:UK:RyanAir:8\n"
+        connections = list(ShippingFeedReader(io.BytesIO(feed), 4))
+
+        assert [connection.destination for connection in connections] == [
+            "US",
+            "FR",
+            "UK",
+        ]
+
+    def test_malformed_records_are_reported_and_skipped(self):
+        feed = b"UK:US:FedEx:4,UK:FR,US:UK:RyanAir:cheap,CA:UK:CanadaAir:8,X:Y:Z:NaN"
+        reader = ShippingFeedReader(io.BytesIO(feed), 5, max_reported=2)
+
+        assert [connection.source for connection in reader] == ["UK", "CA"]
+        assert reader.malformed_count == 3
+        assert reader.malformed == [
+            MalformedRecord(14, b"UK:FR", "expected 4 fields, got 2"),
+            MalformedRecord(20, b"US:UK:RyanAir:cheap", "cost is not a finite number"),
+        ]
+
+    def test_memory_mapped_feed_builds_calculator(self, tmp_path):
+        path = tmp_path / "feed.txt"
+        path.write_bytes(self.feed)
+
+        with open(path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as feed:
+            calculator = ShippingCostCalculator(ShippingFeedReader(feed, 16))
+
+        assert calculator.calculate_cost("US", "FR") == Route(
+            ("US", "UK", "FR"), ("RyanAir", "Jet1"), Decimal("10.5")
+        )
+
+    def test_names_and_costs_are_shared(self):
+        connections = list(ShippingFeedReader(io.BytesIO(self.feed), 3))
+
+        assert connections[0].source is connections[1].source
+        assert connections[2].cost is connections[3].cost
+
+
+def simple_routes(calculator, source, destination):
+    """Every route that visits no stop twice, by brute force."""
+    routes = set()
+
+    def extend(stops, connections):
+        if stops[-1] == destination:
+            routes.add(tuple(connections))
+            return
+        for connection in calculator.routes_from.get(stops[-1], ()):
+            if connection.destination not in stops:
+                extend(stops + [connection.destination], connections + (connection,))
+
+    extend([source], ())
+    return routes
+
+
+class TestCheapestRoutes:
+
+    connections = (
+        "US:FR:Direct:20,US:UK:RyanAir:8,UK:FR:Jet1:3,UK:FR:FedEx:4,"
+        "UK:DE:Lufthansa:1,DE:FR:Jet2:1,US:DE:Lufthansa:15"
+    )
+
+    def test_ranked_routes(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        assert calculator.cheapest_routes("US", "FR", 4) == [
+            Route(
+                ("US", "UK", "DE", "FR"), ("RyanAir", "Lufthansa", "Jet2"), Decimal(10)
+            ),
+            Route(("US", "UK", "FR"), ("RyanAir", "Jet1"), Decimal(11)),
+            Route(("US", "UK", "FR"), ("RyanAir", "FedEx"), Decimal(12)),
+            Route(("US", "DE", "FR"), ("Lufthansa", "Jet2"), Decimal(16)),
+        ]
+
+    def test_fewer_routes_than_asked(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        assert len(calculator.cheapest_routes("US", "FR", 10)) == 5
+        assert calculator.cheapest_routes("FR", "US", 3) == []
+
+    def test_max_legs(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        routes = calculator.cheapest_routes("US", "FR", 3, max_legs=2)
+
+        assert [route.cost for route in routes] == [11, 12, 16]
+        assert calculator.cheapest_routes("US", "FR", 3, max_legs=1) == [
+            Route(("US", "FR"), ("Direct",), Decimal(20))
+        ]
+
+    def test_airline_constraints(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        allowed = calculator.cheapest_routes(
+            "US", "FR", 5, airlines={"RyanAir", "Jet1", "FedEx"}
+        )
+        excluded = calculator.cheapest_routes(
+            "US", "FR", 5, excluded_airlines={"Lufthansa", "Direct"}
+        )
+
+        assert [route.airlines for route in allowed] == [
+            ("RyanAir", "Jet1"),
+            ("RyanAir", "FedEx"),
+        ]
+        assert excluded == allowed
+
+    def test_invalid_k(self):
+        calculator = ShippingCostCalculator.from_str(self.connections)
+
+        with pytest.raises(ValueError):
+            calculator.cheapest_routes("US", "FR", 0)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_matches_brute_force(self, seed):
+        randomizer = random.Random(seed)
+        stops = [f"S{i}" for i in range(7)]
+        calculator = ShippingCostCalculator(
+            [
+                ShippingConnection(
+                    randomizer.choice(stops),
+                    randomizer.choice(stops),
+                    randomizer.choice(("A", "B", "C")),
+                    Decimal(randomizer.randint(0, 9)),
+                )
+                for _ in range(25)
+            ]
+        )
+        max_legs = randomizer.choice((None, 2, 3))
+        excluded = {randomizer.choice(("A", "B", "C"))}
+        expected = sorted(
+            sum(connection.cost for connection in connections)
+            for connections in simple_routes(calculator, "S0", "S1")
+            if (max_legs is None or len(connections) <= max_legs)
+            and not {connection.airline for connection in connections} & excluded
+        )
+
+        routes = calculator.cheapest_routes(
+            "S0", "S1", 6, max_legs=max_legs, excluded_airlines=excluded
+        )
+
+        assert [route.cost for route in routes] == expected[:6]
+        for route in routes:
+            assert len(set(route.stops)) == len(route.stops)
+            assert not set(route.airlines) & excluded
+
+
+class TestSearchModes:
+
+    def network(self, seed, stops=30, connections=150):
+        # Powers of two as costs give every route its own cost, so the
+        # cheapest route is unique and all searches must agree on it.
+        randomizer = random.Random(seed)
+        names = [f"S{i}" for i in range(stops)]
+        return ShippingCostCalculator(
+            [
+                ShippingConnection(
+                    randomizer.choice(names),
+                    randomizer.choice(names),
+                    "X",
+                    Decimal(2**i),
+                )
+                for i in range(connections)
+            ]
+        )
+
+    @pytest.mark.parametrize("search", ["bidirectional", "astar"])
+    @pytest.mark.parametrize("seed", range(3))
+    def test_same_routes_as_dijkstra(self, search, seed):
+        calculator = self.network(seed)
+
+        for source in ("S0", "S1", "S2"):
+            for i in range(30):
+                destination = f"S{i}"
+                try:
+                    expected = calculator.cheapest_route(source, destination)
+                except LookupError:
+                    with pytest.raises(LookupError):
+                        calculator.cheapest_route(source, destination, search)
+                    continue
+                assert calculator.cheapest_route(source, destination, search) == (
+                    expected
+                )
+
+    def test_custom_heuristic(self):
+        calculator = ShippingCostCalculator.from_str(
+            "US:FR:Direct:20,US:UK:RyanAir:8,UK:FR:Jet1:3"
+        )
+        bounds = {"US": Decimal(11), "UK": Decimal(3), "FR": Decimal(0)}
+
+        route = calculator.cheapest_route(
+            "US", "FR", "astar", lambda stop, destination: bounds[stop]
+        )
+
+        assert route == Route(("US", "UK", "FR"), ("RyanAir", "Jet1"), Decimal(11))
+
+    def test_fewer_stops_expanded(self):
+        # Cheap dead ends all around the source, and the destination at the
+        # end of a dearer chain that Dijkstra only reaches after them.
+        connections = [f"S:D{i}:X:1" for i in range(100)]
+        connections += ["S:A:X:5", "A:B:X:5", "B:T:X:5"]
+        calculator = ShippingCostCalculator.from_str(",".join(connections))
+
+        expanded = {}
+        for search in ("dijkstra", "bidirectional", "astar"):
+            assert calculator.cheapest_route("S", "T", search).cost == 15
+            expanded[search] = calculator.expanded_stops
+
+        assert expanded["dijkstra"] == 103
+        assert expanded["bidirectional"] < 10
+        assert expanded["astar"] < 10
+
+    def test_landmarks_follow_edits(self):
+        calculator = ShippingCostCalculator.from_str(
+            "US:FR:Direct:20,US:UK:RyanAir:8,UK:FR:Jet1:3,FR:US:AirFrance:1"
+        )
+        assert calculator.cheapest_route("US", "FR", "astar").cost == 11
+
+        calculator.update_cost("US", "FR", "Direct", Decimal(2))
+
+        assert calculator.cheapest_route("US", "FR", "astar") == Route(
+            ("US", "FR"), ("Direct",), Decimal(2)
+        )
+
+    def test_unknown_search(self):
+        calculator = ShippingCostCalculator.from_str("UK:US:FedEx:4")
+
+        with pytest.raises(ValueError):
+            calculator.cheapest_route("UK", "US", "bfs")